@@ -0,0 +1,244 @@
+# -*- coding: utf-8 -*-
+"""
+全网批量生成：一次性为 combined_data 中所有监测点生成 (点数, 日期数, 3) 的累计位移张量，
+并直接由数组构建按 日期/点名 排好序的结果表。
+"""
+import numpy as np
+import pandas as pd
+
+import instrument
+from curve_cache import get_cache
+from curve_engine import BASES, scale_basis, split_params
+from curve_rules import load_rules
+from rate_clamp import clamp_rates
+from rng_streams import NetworkStreams
+from writers import AXES, COLUMNS_ORDER, point_sort_key
+
+# 各方向的 本次位移、位移速率、累计位移 列名
+MEASURE_COLUMNS = {
+    'X': ('X_本次位移(mm)', 'X_位移速率(mm/d)', 'X_累计位移(mm)'),
+    'Y': ('Y_本次位移(mm)', 'Y_位移速率(mm/d)', 'Y_累计位移(mm)'),
+    'Z': ('Z_本次下沉(mm)', 'Z_沉降速率(mm/d)', 'Z_累计下沉(mm)'),
+}
+
+# 噪声标准差占总位移的比例
+NOISE_RATIO = 0.005
+
+
+def evaluate_curves(points, totals, days, total_days, building_time, streams, cache=None, rules=None):
+    """
+    按曲线模块和形状参数对监测点分组，每组只计算一次单位曲线，再按各点的总位移和缩放参数
+    （ModuleB 的比例和偏移，逐点不同）缩放，得到所有点的理论累计位移（不含噪声）。
+
+    参数:
+        points (list): 点名列表，长度 P。
+        totals (ndarray): 各点各方向总位移(mm)，形状 (P, 3)。
+        days (ndarray): 各日期距起始日期的天数，形状 (D,)。
+        total_days (int): 起止日期间隔天数。
+        building_time (float): 施工期占总天数的比例。
+        streams (NetworkStreams): 与 points 对应的随机数流。
+        cache (CurveCache): 单位曲线缓存，None 时直接计算。
+        rules (CurveRules): 点名到曲线模块的分配规则，None 时使用默认配置。
+
+    返回:
+        ndarray: 理论累计位移(mm)，形状 (P, D, 3)；streams 的随机偏移带有前置维（如集合实现）时为 (..., P, D, 3)。
+    """
+    totals = np.asarray(totals, dtype=float)
+    days = np.asarray(days)
+
+    # 分派表按 (模块, 全部参数) 分组，这里再按 (模块, 形状参数) 合并，缩放参数逐点展开
+    rules = load_rules() if rules is None else rules
+    groups = {}
+    for (module, params), index in rules.dispatch(points, building_time, total_days).items():
+        shape, scale = split_params(module, dict(params))
+        key = (module, tuple(sorted(shape.items())), tuple(sorted(scale)))
+        groups.setdefault(key, []).append((index, scale))
+
+    jitter = streams.ratio_jitter()
+    base = np.empty(jitter.shape[:-3] + (len(points), len(days), 3))
+    for (module, shape, names), members in groups.items():
+        index = np.concatenate([member_index for member_index, _ in members])
+        instrument.count(f'{module}.calls')
+        instrument.count(f'{module}.points', len(index))
+        shape = dict(shape)
+        if cache is None:
+            basis = BASES[module](days, total_days, **shape)
+        else:
+            basis = cache.basis(module, days, total_days, shape)
+        # 各点的缩放参数，形状 (点数, 1)，与各点各方向的随机偏移对应
+        scale = {name: np.concatenate([np.full(len(member_index), member_scale[name], dtype=float)
+                                       for member_index, member_scale in members])[:, None]
+                 for name in names}
+        if module == 'ModuleB':
+            scale['jitter'] = jitter[..., index, :, :]
+        base[..., index, :, :] = scale_basis(module, basis, totals[index], **scale)
+    return base
+
+
+def add_noise(base, totals, days, total_days, streams):
+    """
+    在理论累计位移上叠加噪声，并固定起止日期的取值。
+
+    参数:
+        base (ndarray): evaluate_curves 的结果，形状 (..., P, D, 3)。
+        totals, days, total_days, streams: 同 evaluate_curves。
+
+    返回:
+        ndarray: 累计位移(mm)，形状同 base。
+    """
+    totals = np.asarray(totals, dtype=float)
+    days = np.asarray(days)
+
+    # 添加噪声（正态分布，标准差为总位移的0.5%）
+    noise = streams.noise(len(days)) * (np.abs(totals) * NOISE_RATIO)[:, None, :]
+    cumulative = base + noise
+
+    # 起始点为0，到达结束日期后为总位移
+    cumulative[..., days == 0, :] = 0
+    at_end = days >= total_days
+    cumulative[..., at_end, :] = totals[:, None, :]
+    return cumulative
+
+
+def build_cumulative(points, totals, days, total_days, building_time, streams, cache=None, rules=None):
+    """
+    批量计算所有点的累计位移：理论曲线（evaluate_curves）加噪声（add_noise）。
+
+    参数同 evaluate_curves。
+
+    返回:
+        ndarray: 累计位移(mm)，形状 (P, D, 3)。
+    """
+    base = evaluate_curves(points, totals, days, total_days, building_time, streams, cache=cache, rules=rules)
+    return add_noise(base, totals, days, total_days, streams)
+
+
+def build_frame(points, dates, starts, cumulative, delta, rate):
+    """
+    由数组直接构建结果表，行顺序为先日期、后点名。
+
+    参数:
+        points (list): 点名列表，长度 P，需已按输出顺序排列。
+        dates (Series): 日期序列，长度 D，需已排序。
+        starts (ndarray): 各点起始坐标(mm)，形状 (P, 3)。
+        cumulative, delta, rate (ndarray): 形状均为 (P, D, 3)。
+
+    返回:
+        DataFrame: 列顺序同 COLUMNS_ORDER；日期为按天的 datetime64，点名为按 points 顺序排列的分类类型。
+    """
+    n_points, n_dates = len(points), len(dates)
+    # 日期只在导出时格式化为字符串，见 writers.format_dates
+    date_values = pd.to_datetime(pd.Series(dates)).to_numpy().astype('datetime64[D]').astype('datetime64[s]')
+
+    # 12 个数值列预先分配为一整块，逐列原地写入，构建 DataFrame 时不再复制
+    value_columns = COLUMNS_ORDER[2:]
+    block = np.empty((n_dates * n_points, len(value_columns)))
+
+    def column(name):
+        # 块中的一列，视为 (D, P)，即日期优先
+        return block[:, value_columns.index(name)].reshape(n_dates, n_points)
+
+    for axis, name in enumerate(AXES):
+        delta_col, rate_col, cumulative_col = MEASURE_COLUMNS[name]
+        coordinate = column(name)
+        # 将坐标转换回米
+        np.subtract(starts[None, :, axis], cumulative[:, :, axis].T, out=coordinate)
+        coordinate /= 1000
+        column(delta_col)[:] = delta[:, :, axis].T
+        column(rate_col)[:] = rate[:, :, axis].T
+        column(cumulative_col)[:] = cumulative[:, :, axis].T
+
+    frame = pd.DataFrame(block, columns=value_columns, copy=False)
+    frame.insert(0, '日期', np.repeat(date_values, n_points))
+    frame.insert(1, '点名', pd.Categorical.from_codes(np.tile(np.arange(n_points), n_dates), categories=points))
+    return frame
+
+
+def prepare_network(combined_data, dates, start_date):
+    """
+    整理全网输入：按点名顺序排列监测点，并计算日期网格。
+
+    参数:
+        combined_data (DataFrame): 含 点名、X_start/Y_start/Z_start、X_total/Y_total/Z_total 列。
+        dates (Series): 已排序的项目时间。
+        start_date (datetime): 起始日期。
+
+    返回:
+        tuple: (点名列表, 起始坐标 (P, 3), 总位移 (P, 3), 日期序列, 天数 (D,))。
+    """
+    # 按点名顺序排列，使结果无需再整体排序
+    names = combined_data['点名'].astype(str).tolist()
+    order = sorted(range(len(names)), key=lambda i: point_sort_key(names[i]))
+    data = combined_data.iloc[order]
+
+    points = [names[i] for i in order]
+    starts = data[['X_start', 'Y_start', 'Z_start']].to_numpy(dtype=float)
+    totals = data[['X_total', 'Y_total', 'Z_total']].to_numpy(dtype=float)
+
+    dates = pd.to_datetime(pd.Series(dates)).dt.normalize().reset_index(drop=True)
+    days = (dates - pd.Timestamp(start_date).normalize()).dt.days.to_numpy()
+    return points, starts, totals, dates, days
+
+
+def simulate(points, totals, days, total_days, building_time, seed=None, cache_dir=None, rules_path=None,
+             cache=None, rules=None, streams=None, keep_raw=False):
+    """
+    计算一组监测点的累计位移、本次位移和位移速率：理论曲线、噪声、速率限制。
+
+    参数:
+        points (list): 点名列表，长度 P。
+        totals (ndarray): 各点各方向总位移(mm)，形状 (P, 3)。
+        days (ndarray): 各日期距起始日期的天数，形状 (D,)。
+        total_days (int): 起止日期间隔天数。
+        building_time (float): 施工期占总天数的比例。
+        seed (int): 随机种子，None 时自动生成。
+        cache_dir (str): 单位曲线缓存的持久化目录，None 时只在本进程内存中缓存。
+        rules_path (str): 曲线分配规则配置文件，None 时使用 curve_rules.json。
+        cache (CurveCache): 单位曲线缓存，给出时不使用 cache_dir。
+        rules (CurveRules): 曲线分配规则，给出时不使用 rules_path。
+        streams (NetworkStreams): 与 points 对应的随机数流，给出时不使用 seed，调用后流的位置停在本次抽取之后。
+        keep_raw (bool): 为 True 时另返回限速前的累计位移（增量生成保存状态时使用）。
+
+    返回:
+        tuple: (累计位移, 本次位移, 位移速率)，keep_raw 时再加上限速前的累计位移，形状均为 (P, D, 3)。
+    """
+    rows = len(points) * len(days)
+    if streams is None:
+        with instrument.stage('streams', len(points)):
+            streams = NetworkStreams(seed, points)
+    cache = get_cache(cache_dir) if cache is None else cache
+    rules = load_rules(rules_path) if rules is None else rules
+    with instrument.stage('curves', rows):
+        base = evaluate_curves(points, totals, days, total_days, building_time, streams, cache=cache, rules=rules)
+    with instrument.stage('noise', rows):
+        raw = add_noise(base, totals, days, total_days, streams)
+    del base
+    with instrument.stage('clamp', rows):
+        arrays = clamp_rates(raw, days, streams.adjustments(len(days)), totals=totals, total_days=total_days)
+    return arrays + (raw,) if keep_raw else arrays
+
+
+def generate_network(combined_data, dates, start_date, total_days, building_time, seed=None, cache_dir=None,
+                     rules_path=None):
+    """
+    批量生成全网所有监测点的预测数据。
+
+    参数:
+        combined_data (DataFrame): 含 点名、X_start/Y_start/Z_start、X_total/Y_total/Z_total 列。
+        dates (Series): 已排序的项目时间。
+        start_date (datetime): 起始日期。
+        total_days (int): 起止日期间隔天数。
+        building_time (float): 施工期占总天数的比例。
+        seed (int): 随机种子，None 时自动生成；同一种子得到相同结果。
+        cache_dir (str): 单位曲线缓存的持久化目录，None 时只在本进程内存中缓存。
+        rules_path (str): 曲线分配规则配置文件，None 时使用 curve_rules.json。
+
+    返回:
+        DataFrame: 按日期、点名排序的预测结果。
+    """
+    with instrument.stage('prepare', len(combined_data)):
+        points, starts, totals, dates, days = prepare_network(combined_data, dates, start_date)
+    cumulative, delta, rate = simulate(points, totals, days, total_days, building_time, seed=seed,
+                                       cache_dir=cache_dir, rules_path=rules_path)
+    with instrument.stage('frame', len(points) * len(dates)):
+        return build_frame(points, dates, starts, cumulative, delta, rate)
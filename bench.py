@@ -0,0 +1,345 @@
+# -*- coding: utf-8 -*-
+"""
+性能基准：合成 Sheet1/Sheet2 格式的原始数据（.xlsx/.csv/.parquet），按不同点数、观测期数和
+项目时间表运行生成流程，分别记录各阶段的耗时、吞吐量和内存峰值，结果写入 JSON 文件。
+
+用法:
+    python bench.py --points 100 1000 --epochs 30 --schedule 30 100 --format xlsx parquet
+    python bench.py --startup    # 只测量解释器启动和各子命令模块的导入耗时
+"""
+import argparse
+import itertools
+import json
+import os
+import platform
+import statistics
+import string
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from batch_generate import build_frame, prepare_network, simulate
+from cli import COMMANDS
+from charts_data import build_chart_tables, write_chart_workbook
+from curve_cache import CurveCache
+from curve_rules import load_rules
+from ingest import combine_epochs, read_epochs, read_schedule
+from instrument import Recorder, recording
+from writers import write_result
+
+RAW_FORMATS = ('xlsx', 'csv', 'parquet')
+
+BENCH_START = datetime(2024, 10, 14)
+BENCH_END = datetime(2025, 5, 13)
+BENCH_BUILDING_DAYS = 98
+
+# 默认分配规则中点名序号超过 82 时 ModuleB 的比例无效，合成点名每 80 个换一个前缀
+POINTS_PER_PREFIX = 80
+
+
+def synthetic_points(n_points, prefix='JC'):
+    """合成点名：JC01-JC80、JCA01-JCA80、JCB01-JCB80 ……"""
+    suffixes = itertools.chain([''], (''.join(letters) for size in itertools.count(1)
+                                     for letters in itertools.product(string.ascii_uppercase, repeat=size)))
+    names = []
+    for suffix in suffixes:
+        names.extend(f'{prefix}{suffix}{i:02d}' for i in range(1, POINTS_PER_PREFIX + 1))
+        if len(names) >= n_points:
+            return names[:n_points]
+
+
+def synthetic_schedule(start_date, end_date, n_dates):
+    """在起止日期之间均匀取 n_dates 个项目时间（含起止日期，按天取整后去重）。"""
+    total_days = (end_date - start_date).days
+    offsets = np.unique(np.round(np.linspace(0, total_days, max(n_dates, 2))).astype(int))
+    return pd.Series(pd.Timestamp(start_date) + pd.to_timedelta(offsets, unit='D'), name='项目时间')
+
+
+def synthesize_raw(path, n_points, n_epochs, n_schedule, start_date=BENCH_START, end_date=BENCH_END, seed=0):
+    """
+    合成原始数据文件。
+
+    Sheet1 为 n_epochs 期观测（含起止日期）的 日期/点名/X/Y/Z，坐标单位为米；Sheet2 为项目时间。
+    .csv/.parquet 没有工作表，项目时间作为单独的 项目时间 列写在同一文件中，多余的行为空。
+
+    参数:
+        path (str): 输出路径，后缀决定格式（.xlsx、.csv 或 .parquet）。
+        n_points (int): 监测点数。
+        n_epochs (int): 观测期数。
+        n_schedule (int): 项目时间个数。
+        start_date, end_date (datetime): 起止日期。
+        seed (int): 随机种子。
+
+    返回:
+        int: Sheet1 的记录数。
+    """
+    rng = np.random.default_rng(seed)
+    points = synthetic_points(n_points)
+    epochs = synthetic_schedule(start_date, end_date, n_epochs)
+    schedule = synthetic_schedule(start_date, end_date, n_schedule)
+
+    # 起始坐标在 3000/500/100 米附近，期间按线性趋势移动至多约 0.5 米，并叠加毫米级观测误差
+    starts = np.array([3000.0, 500.0, 100.0]) + rng.random((n_points, 3))
+    moves = rng.normal(0, 0.2, (n_points, 3))
+    progress = np.linspace(0, 1, len(epochs))
+    coords = starts[None] - progress[:, None, None] * moves[None]
+    coords[1:-1] += rng.normal(0, 0.001, coords[1:-1].shape)
+
+    data = pd.DataFrame({
+        '日期': np.repeat(epochs.to_numpy(), n_points),
+        '点名': np.tile(np.asarray(points, dtype=object), len(epochs)),
+        'X': coords[..., 0].ravel(),
+        'Y': coords[..., 1].ravel(),
+        'Z': coords[..., 2].ravel(),
+    })
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    suffix = path.suffix.lower()
+    if suffix == '.xlsx':
+        from openpyxl import Workbook
+
+        wb = Workbook(write_only=True)
+        sheet1 = wb.create_sheet('Sheet1')
+        sheet1.append(list(data.columns))
+        for row in data.itertuples(index=False, name=None):
+            sheet1.append([row[0].to_pydatetime(), *row[1:]])
+        sheet2 = wb.create_sheet('Sheet2')
+        sheet2.append(['项目时间'])
+        for date in schedule:
+            sheet2.append([date.to_pydatetime()])
+        wb.save(path)
+    elif suffix in ('.csv', '.parquet'):
+        data['项目时间'] = schedule.reindex(range(len(data)))
+        if suffix == '.csv':
+            data.to_csv(path, index=False)
+        else:
+            data.to_parquet(path, index=False)
+    else:
+        raise ValueError(f"不支持的原始数据格式: {suffix}")
+    return len(data)
+
+
+def run_stages(raw_path, workdir, start_date=BENCH_START, end_date=BENCH_END, building_days=BENCH_BUILDING_DAYS,
+               seed=0, output_format='parquet', charts=True, trace_memory=True):
+    """
+    依次运行并计时生成流程的各阶段。
+
+    阶段: ingest（读取起止两期）、merge（合并计算总位移）、schedule（读取项目时间）、
+    sort（按点名排序、计算日期网格）、streams（建立各点随机数流）、curves（曲线求值）、noise（叠加噪声）、
+    clamp（速率限制）、frame（构建结果表）、write（写出结果）、pivot（成图透视）、chart（写出成图工作簿）。
+
+    参数:
+        raw_path (str): 原始数据文件。
+        workdir (str): 结果和成图数据的输出目录。
+        start_date, end_date (datetime): 起止日期。
+        building_days (int): 施工期天数。
+        seed (int): 随机种子。
+        output_format (str): 结果格式，'parquet'、'arrow' 或 'excel'。
+        charts (bool): 是否运行 pivot 和 chart 阶段。
+        trace_memory (bool): 是否用 tracemalloc 记录各阶段的内存峰值（会拖慢纯 Python 部分）。
+
+    返回:
+        Recorder: 各阶段的记录和曲线模块调用计数。
+    """
+    recorder = Recorder(trace_memory=trace_memory)
+    total_days = (end_date - start_date).days
+    building_time = building_days / total_days
+    suffix = {'parquet': '.parquet', 'arrow': '.arrow', 'excel': '.xlsx'}[output_format]
+
+    with recording(recorder):
+        with recorder.stage('ingest') as record:
+            epochs = read_epochs(raw_path, [start_date, end_date])
+            record['rows'] = len(epochs)
+
+        with recorder.stage('merge', len(epochs)):
+            combined_data = combine_epochs(epochs, start_date, end_date)
+
+        with recorder.stage('schedule') as record:
+            schedule = read_schedule(raw_path)
+            record['rows'] = len(schedule)
+
+        n_rows = len(combined_data) * len(schedule)
+        with recorder.stage('sort', len(combined_data)):
+            points, starts, totals, dates, days = prepare_network(combined_data, schedule, start_date)
+
+        # streams、curves、noise、clamp 各阶段由 simulate 记录；
+        # 每个规模使用新的内存缓存，避免前一个规模的结果影响曲线求值的计时
+        cumulative, delta, rate = simulate(points, totals, days, total_days, building_time, seed=seed,
+                                           cache=CurveCache(), rules=load_rules())
+
+        with recorder.stage('frame', n_rows):
+            result_df = build_frame(points, dates, starts, cumulative, delta, rate)
+
+        with recorder.stage('write', n_rows):
+            write_result(result_df, Path(workdir) / f'result{suffix}')
+
+        if charts:
+            with recorder.stage('pivot', n_rows):
+                tables = build_chart_tables(result_df)
+
+            with recorder.stage('chart', n_rows):
+                write_chart_workbook(Path(workdir) / 'charts.xlsx', tables)
+    return recorder
+
+
+def startup_cases():
+    """启动耗时的测量项：名称 -> python 的命令行参数。前两项为解释器本身和 pandas 的导入，作为下限参考。"""
+    cases = {
+        'python': ['-c', 'pass'],
+        'import pandas': ['-c', 'import pandas'],
+        'cli.py --help': ['cli.py', '--help'],
+    }
+    for command, (module, _) in COMMANDS.items():
+        if command != 'bench':
+            cases[f'cli.py {command}: import {module}'] = ['-c', f'import {module}']
+    return cases
+
+
+def measure_startup(repeats=10):
+    """
+    在新的解释器进程中重复运行各测量项，记录墙钟时间。
+
+    参数:
+        repeats (int): 每项的运行次数。
+
+    返回:
+        list: 每项一个字典：name、argv、median_seconds、min_seconds、max_seconds。
+    """
+    root = Path(__file__).resolve().parent
+    results = []
+    for name, argv in startup_cases().items():
+        seconds = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            subprocess.run([sys.executable, *argv], cwd=root, check=True, stdout=subprocess.DEVNULL)
+            seconds.append(time.perf_counter() - start)
+        results.append({'name': name, 'argv': argv, 'median_seconds': statistics.median(seconds),
+                        'min_seconds': min(seconds), 'max_seconds': max(seconds)})
+        print(f"{name:<40s} 中位数 {results[-1]['median_seconds'] * 1000:8.1f}ms  "
+              f"最小 {results[-1]['min_seconds'] * 1000:8.1f}ms")
+    return results
+
+
+def _max_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 以 KB 为单位，macOS 以字节为单位
+    return rss / 2 ** 20 if sys.platform == 'darwin' else rss / 2 ** 10
+
+
+def environment():
+    """运行环境信息，便于比较不同机器上的结果。"""
+    import pyarrow
+
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'processor': platform.processor(),
+        'cpu_count': os.cpu_count(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'pyarrow': pyarrow.__version__,
+    }
+
+
+def run_benchmark(points, epochs, schedules, raw_formats=('xlsx',), output_format='parquet', charts=True,
+                  trace_memory=True, seed=0, workdir=None):
+    """
+    对每个 (原始格式, 点数, 观测期数, 项目时间个数) 组合合成数据并运行 run_stages。
+
+    参数:
+        points, epochs, schedules (list): 点数、观测期数、项目时间个数的取值。
+        raw_formats (list): 原始数据格式，取自 RAW_FORMATS。
+        output_format, charts, trace_memory, seed: 同 run_stages。
+        workdir (str): 合成数据和输出的目录，None 时使用临时目录并在结束后删除。
+
+    返回:
+        dict: 含 environment 和 cases 的结果。
+    """
+    cases = []
+    with tempfile.TemporaryDirectory(prefix='bench_') as tmp:
+        root = Path(workdir) if workdir else Path(tmp)
+        for raw_format, n_points, n_epochs, n_schedule in itertools.product(raw_formats, points, epochs, schedules):
+            if raw_format not in RAW_FORMATS:
+                raise ValueError(f"不支持的原始数据格式: {raw_format}，可选 {RAW_FORMATS}")
+            case_dir = root / f'{raw_format}_p{n_points}_e{n_epochs}_s{n_schedule}'
+            raw_path = case_dir / f'raw.{raw_format}'
+
+            start = time.perf_counter()
+            raw_rows = synthesize_raw(raw_path, n_points, n_epochs, n_schedule, seed=seed)
+            synthesize_seconds = time.perf_counter() - start
+
+            recorder = run_stages(raw_path, case_dir, seed=seed, output_format=output_format, charts=charts,
+                                  trace_memory=trace_memory)
+            stages = recorder.stages
+            case = {
+                'raw_format': raw_format,
+                'points': n_points,
+                'epochs': n_epochs,
+                'schedule': n_schedule,
+                'raw_rows': raw_rows,
+                'raw_bytes': raw_path.stat().st_size,
+                'synthesize_seconds': synthesize_seconds,
+                'total_seconds': sum(stage['wall_seconds'] for stage in stages),
+                'stages': stages,
+                'counters': dict(recorder.counters),
+                'max_rss_mb': _max_rss_mb(),
+            }
+            cases.append(case)
+            print(f"{raw_format:8s} 点数={n_points:<7d} 观测期={n_epochs:<5d} 项目时间={n_schedule:<5d} "
+                  f"合计 {case['total_seconds']:8.2f}s  "
+                  + '  '.join(f"{stage['stage']}={stage['wall_seconds']:.2f}s" for stage in stages))
+    return {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'environment': environment(),
+        'output_format': output_format,
+        'trace_memory': trace_memory,
+        'cases': cases,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='沉降预测生成流程的性能基准')
+    parser.add_argument('--points', type=int, nargs='+', default=[100, 1000], help='监测点数')
+    parser.add_argument('--epochs', type=int, nargs='+', default=[30], help='原始数据的观测期数')
+    parser.add_argument('--schedule', type=int, nargs='+', default=[30], help='项目时间个数（输出的日期数）')
+    parser.add_argument('--format', nargs='+', default=['xlsx'], choices=RAW_FORMATS, help='原始数据格式')
+    parser.add_argument('--output-format', default='parquet', choices=('parquet', 'arrow', 'excel'),
+                        help='结果格式')
+    parser.add_argument('--no-charts', action='store_true', help='不运行成图阶段')
+    parser.add_argument('--no-memory', action='store_true', help='不记录内存峰值')
+    parser.add_argument('--seed', type=int, default=0, help='随机种子')
+    parser.add_argument('--workdir', help='保留合成数据和输出的目录，默认使用临时目录')
+    parser.add_argument('--results', default='./output/bench_results.json', help='结果 JSON 文件')
+    parser.add_argument('--startup', action='store_true', help='只测量启动耗时（解释器启动和各子命令模块的导入）')
+    parser.add_argument('--repeats', type=int, default=10, help='启动耗时每项的运行次数')
+    args = parser.parse_args(argv)
+
+    if args.startup:
+        results = {
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'environment': environment(),
+            'startup': measure_startup(args.repeats),
+        }
+    else:
+        results = run_benchmark(args.points, args.epochs, args.schedule, raw_formats=args.format,
+                                output_format=args.output_format, charts=not args.no_charts,
+                                trace_memory=not args.no_memory, seed=args.seed, workdir=args.workdir)
+    Path(args.results).parent.mkdir(parents=True, exist_ok=True)
+    with open(args.results, 'w', encoding='utf-8') as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print(f"结果已写入 {args.results}")
+
+
+if __name__ == '__main__':
+    main()
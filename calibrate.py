@@ -0,0 +1,330 @@
+# -*- coding: utf-8 -*-
+"""
+曲线标定：用原始数据 Sheet1 中起止日期之间的全部观测期，为每个监测点、每个方向拟合 ModuleA-ModuleD 的
+最佳参数，给出各模块的拟合残差并自动选出最佳模块。
+
+各模块都写成 累计位移 = 总位移 × 单位曲线 的形式（见 curve_engine），拟合在全部点上同时向量化进行:
+    ModuleA: 对数曲线中 log_base 在归一化后约去，只拟合 moving_time（在观测日上逐一尝试）。
+    ModuleB: 折点时间固定时曲线对 r1、r1+r2 线性，在折点时间网格上逐一做批量最小二乘。
+    ModuleC: 曲线对 1/(total_days² - ratio_shift) 线性，先求闭式解，再考虑符号修正在其附近一维搜索。
+    ModuleD: 无参数，只计算残差。
+
+除 X、Y、Z 各方向单独拟合外，还给出三个方向共用一组参数的联合拟合（方向为 'XYZ'），
+生成程序对一个点的三个方向使用同一模块和参数，导出的分配规则取联合拟合的结果。
+"""
+import json
+import re
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import instrument
+import settings
+from batch_generate import AXES, point_sort_key
+from curve_engine import basis_a, basis_b, basis_d
+from ingest import read_epochs
+from parallel_generate import split_points
+
+MODULES = ('ModuleA', 'ModuleB', 'ModuleC', 'ModuleD')
+
+# 各模块拟合的参数
+FIT_PARAMS = {
+    'ModuleA': ('moving_time',),
+    'ModuleB': ('ratio1', 'ratio2', 'time_split1', 'time_split2'),
+    'ModuleC': ('ratio_shift',),
+    'ModuleD': (),
+}
+
+# ModuleB 折点时间网格的步长（占总天数的比例）
+SPLIT_STEP = 0.05
+
+# ModuleC 在闭式解附近一维搜索的各轮相对范围（逐轮缩小）和每轮步数
+C_REFINE_SPANS = (0.5, 0.05, 0.005)
+C_REFINE_STEPS = 21
+
+# 均方根残差与最小值相差在此比例以内的模块视为同样好，取参数较少的模块
+BEST_TOLERANCE = 0.01
+
+# 联合拟合的方向名
+JOINT = 'XYZ'
+
+
+def load_observations(path, start_date, end_date, sheet_name='Sheet1'):
+    """
+    读取起止日期之间的全部观测，换算为各点相对起始日期的累计位移。
+
+    参数:
+        path (str): 原始数据文件。
+        start_date, end_date (datetime): 起止日期，两期都有观测的点才参与标定。
+        sheet_name (str): Excel 工作表名。
+
+    返回:
+        tuple: (点名列表, 天数 (D,), 累计位移(mm) (P, D, 3)，缺测为 NaN)。
+    """
+    epochs = read_epochs(path, None, sheet_name=sheet_name)
+    epochs = epochs[(epochs['日期'] >= start_date) & (epochs['日期'] <= end_date)]
+    coords = epochs.pivot_table(index='点名', columns='日期', values=list(AXES), aggfunc='first')
+
+    # 只保留起止两期都有观测的点
+    complete = coords.xs(pd.Timestamp(start_date), axis=1, level=1).notna().all(axis=1) \
+        & coords.xs(pd.Timestamp(end_date), axis=1, level=1).notna().all(axis=1)
+    coords = coords[complete]
+    points = sorted(coords.index, key=point_sort_key)
+    coords = coords.reindex(points)
+
+    dates = coords[AXES[0]].columns
+    days = (dates - pd.Timestamp(start_date)).days.to_numpy()
+    # (P, 3, D) -> (P, D, 3)，单位转换：米转毫米
+    values = np.stack([coords[axis].to_numpy(dtype=float) for axis in AXES], axis=-1) * 1000
+    observed = values[:, :1, :] - values
+    return points, days, observed
+
+
+def _sse(observed, totals, mask, unit):
+    """
+    残差平方和。
+
+    参数:
+        observed (ndarray): 观测累计位移，形状 (..., G, D)，缺测处已置 0。
+        totals (ndarray): 总位移，形状 (..., G)。
+        mask (ndarray): 有观测为 1，形状 (..., G, D)。
+        unit (ndarray): 单位曲线，形状 (..., D) 或 (D,)。
+    """
+    residual = observed - totals[..., None] * unit[..., None, :]
+    return (residual ** 2 * mask).sum(axis=(-1, -2))
+
+
+def fit_module_a(days, total_days, observed, totals, mask):
+    """在观测日上逐一尝试 moving_time，返回 (参数 (...,1), 残差平方和 (...))。"""
+    candidates = np.unique(np.concatenate([[0.0], days[(days > 0) & (days < total_days)]]))
+    best_sse = np.full(observed.shape[:-2], np.inf)
+    best = np.zeros(observed.shape[:-2])
+    for moving_time in candidates:
+        sse = _sse(observed, totals, mask, basis_a(days, total_days, moving_time=moving_time)[:, 0])
+        better = sse < best_sse
+        best_sse = np.where(better, sse, best_sse)
+        best = np.where(better, moving_time, best)
+    return best[..., None], best_sse
+
+
+def fit_module_b(days, total_days, observed, totals, mask, split_step=SPLIT_STEP):
+    """
+    在折点时间网格上做批量最小二乘，返回 (参数 (..., 4)，依次为 ratio1、ratio2、time_split1、time_split2,
+    残差平方和 (...))。比例限制在 0 <= r1 <= r1 + r2 <= 1 内。
+    """
+    grid = np.round(np.arange(split_step, 1, split_step), 10)
+    best_sse = np.full(observed.shape[:-2], np.inf)
+    best = np.full(observed.shape[:-2] + (4,), np.nan)
+    for split1 in grid:
+        for split2 in grid[grid > split1]:
+            basis = basis_b(days, total_days, split1, split2)
+            # 残差 = y - tot * (B0 * w0 + B1 * w1 + B2)，对 (w0, w1) 的正规方程
+            design = basis[:, :2]
+            target = observed - totals[..., None] * basis[:, 2]
+            gram = np.einsum('...g,...gd,di,dj->...ij', totals ** 2, mask, design, design)
+            rhs = np.einsum('...g,...gd,di->...i', totals, mask * target, design)
+            w = np.einsum('...ij,...j->...i', np.linalg.pinv(gram), rhs)
+            w0 = np.clip(w[..., 0], 0, 1)
+            w1 = np.clip(w[..., 1], w0, 1)
+            unit = basis[:, 0] * w0[..., None] + basis[:, 1] * w1[..., None] + basis[:, 2]
+            sse = _sse(observed, totals, mask, unit)
+            better = sse < best_sse
+            best_sse = np.where(better, sse, best_sse)
+            params = np.stack([w0, w1 - w0, np.full_like(w0, split1), np.full_like(w0, split2)], axis=-1)
+            best = np.where(better[..., None], params, best)
+    return best, best_sse
+
+
+def fit_module_c(days, total_days, observed, totals, mask):
+    """闭式最小二乘加一维搜索，返回 (参数 (..., 1)，即 ratio_shift, 残差平方和 (...))。"""
+    # 单位曲线 = 1 - c * (t - T)²，c = 1 / (T² - ratio_shift)
+    x = (days - total_days) ** 2.0
+    numerator = np.einsum('...g,...gd,d->...', totals, mask * (totals[..., None] - observed), x)
+    denominator = np.einsum('...g,...gd,d->...', totals ** 2, mask, x ** 2)
+    c = np.divide(numerator, denominator, out=np.zeros_like(numerator), where=denominator > 0)
+
+    # 单位曲线为负（与总位移符号不一致）时，生成程序改用接近 0 的小数值，线性解未考虑这一点，
+    # 在闭式解附近按截断后的曲线搜索
+    best_sse = np.full(c.shape, np.inf)
+    best = np.full(c.shape, np.nan)
+    center = c
+    for span in C_REFINE_SPANS:
+        for factor in np.linspace(1 - span, 1 + span, C_REFINE_STEPS):
+            candidate = center * factor
+            sse = _sse(observed, totals, mask, np.maximum(1 - candidate[..., None] * x, 0))
+            better = (candidate > 0) & (sse < best_sse)
+            best_sse = np.where(better, sse, best_sse)
+            best = np.where(better, candidate, best)
+        center = np.where(np.isfinite(best), best, center)
+    ratio_shift = total_days ** 2 - 1 / best
+    return ratio_shift[..., None], best_sse
+
+
+def fit_module_d(days, total_days, observed, totals, mask):
+    """无参数，返回 (空参数 (..., 0), 残差平方和 (...))。"""
+    sse = _sse(observed, totals, mask, basis_d(days, total_days)[:, 0])
+    return np.empty(observed.shape[:-2] + (0,)), sse
+
+
+FITTERS = {
+    'ModuleA': fit_module_a,
+    'ModuleB': fit_module_b,
+    'ModuleC': fit_module_c,
+    'ModuleD': fit_module_d,
+}
+
+
+def fit_observations(days, total_days, observed, split_step=SPLIT_STEP):
+    """
+    对一组监测点拟合各模块。
+
+    参数:
+        days (ndarray): 观测日距起始日期的天数，形状 (D,)，最后一期为结束日期。
+        total_days (int): 起止日期间隔天数。
+        observed (ndarray): 观测累计位移(mm)，形状 (P, D, 3)，缺测为 NaN。
+        split_step (float): ModuleB 折点时间网格的步长。
+
+    返回:
+        dict: 模块名 -> (参数 (P, 4, 参数个数), 均方根残差(mm) (P, 4))，第二维依次为 X、Y、Z 和联合拟合。
+    """
+    mask = np.isfinite(observed).transpose(0, 2, 1).astype(float)  # (P, 3, D)
+    values = np.nan_to_num(observed).transpose(0, 2, 1)
+    totals = values[:, :, -1]
+
+    # 单方向拟合为 (P, 3, 1, D)，联合拟合为 (P, 1, 3, D)
+    cases = [
+        (values[:, :, None, :], totals[:, :, None], mask[:, :, None, :]),
+        (values[:, None], totals[:, None], mask[:, None]),
+    ]
+    counts = np.concatenate([mask.sum(axis=-1), mask.sum(axis=(-1, -2))[:, None]], axis=1)
+
+    results = {}
+    for module, fitter in FITTERS.items():
+        kwargs = {'split_step': split_step} if module == 'ModuleB' else {}
+        fits = [fitter(days, total_days, *case, **kwargs) for case in cases]
+        params = np.concatenate([fit[0] for fit in fits], axis=1)
+        sse = np.concatenate([fit[1] for fit in fits], axis=1)
+        rmse = np.sqrt(np.divide(sse, counts, out=np.full_like(sse, np.inf), where=counts > 0))
+        results[module] = (params, rmse)
+    return results
+
+
+def build_fit_frame(points, results):
+    """
+    整理拟合结果：每个点、每个方向一行。
+
+    返回:
+        DataFrame: 点名、方向、各模块的均方根残差和参数、最佳模块。
+    """
+    directions = list(AXES) + [JOINT]
+    data = {
+        '点名': np.repeat(np.asarray(points, dtype=object), len(directions)),
+        '方向': np.tile(np.asarray(directions, dtype=object), len(points)),
+    }
+    rmse = []
+    for module in MODULES:
+        params, module_rmse = results[module]
+        data[f'{module}_rmse(mm)'] = module_rmse.reshape(-1)
+        for i, name in enumerate(FIT_PARAMS[module]):
+            data[f'{module}_{name}'] = params[..., i].reshape(-1)
+        rmse.append(module_rmse.reshape(-1))
+    data['最佳模块'] = best_modules(np.stack(rmse, axis=1))
+    return pd.DataFrame(data)
+
+
+def best_modules(rmse):
+    """
+    按均方根残差选出最佳模块；与最小值相差在 BEST_TOLERANCE 以内时取参数较少的模块。
+
+    参数:
+        rmse (ndarray): 形状 (行数, 模块数)，列顺序同 MODULES。
+    """
+    # 按参数个数排序，个数相同时保持 MODULES 中的顺序
+    order = sorted(range(len(MODULES)), key=lambda i: len(FIT_PARAMS[MODULES[i]]))
+    ranked = rmse[:, order]
+    good = ranked <= ranked.min(axis=1, keepdims=True) * (1 + BEST_TOLERANCE)
+    return np.asarray(MODULES, dtype=object)[np.asarray(order)[np.argmax(good, axis=1)]]
+
+
+def calibrate(raw_path, start_date, end_date, workers=1, split_step=SPLIT_STEP, sheet_name='Sheet1'):
+    """
+    用起止日期之间的全部观测标定各点的曲线模块和参数。
+
+    参数:
+        raw_path (str): 原始数据文件。
+        start_date, end_date (datetime): 起止日期。
+        workers (int): 进程数，大于 1 时按监测点分片并行拟合。
+        split_step (float): ModuleB 折点时间网格的步长。
+        sheet_name (str): Excel 工作表名。
+
+    返回:
+        DataFrame: 见 build_fit_frame。
+    """
+    total_days = (end_date - start_date).days
+    with instrument.stage('observations') as record:
+        points, days, observed = load_observations(raw_path, start_date, end_date, sheet_name=sheet_name)
+        record['rows'] = observed.shape[0] * observed.shape[1]
+
+    with instrument.stage('fit', len(points)):
+        if workers > 1 and len(points) > 1:
+            parts = split_points(len(points), workers)
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                futures = [executor.submit(fit_observations, days, total_days, observed[part], split_step)
+                           for part in parts]
+                shards = [future.result() for future in futures]
+            results = {module: tuple(np.concatenate([shard[module][i] for shard in shards]) for i in range(2))
+                       for module in MODULES}
+        else:
+            results = fit_observations(days, total_days, observed, split_step)
+    return build_fit_frame(points, results)
+
+
+def fitted_rules(fit_df, building_time=None):
+    """
+    由联合拟合的结果生成分配规则（格式见 curve_rules），每个点一条规则，使用该点的最佳模块和参数。
+
+    参数:
+        fit_df (DataFrame): calibrate 的结果。
+        building_time (float): 施工期占比；给出时折点时间写成相对 building_time 的表达式，便于调整施工期。
+
+    返回:
+        dict: 可直接保存为 JSON 的规则配置。
+    """
+    rules = []
+    for row in fit_df[fit_df['方向'] == JOINT].itertuples(index=False):
+        row = row._asdict()
+        module = row['最佳模块']
+        params = {name: float(row[f'{module}_{name}']) for name in FIT_PARAMS[module]}
+        if module == 'ModuleB':
+            params['offset'] = 0.0
+            if building_time:
+                for name in ('time_split1', 'time_split2'):
+                    params[name] = f"{params[name] / building_time!r} * building_time"
+        rules.append({'pattern': f'^{re.escape(str(row["点名"]))}$', 'module': module, 'params': params})
+    return {'rules': rules}
+
+
+def main():
+    from writers import write_result
+
+    report = instrument.report_path(settings.REPORT_DIR, 'calibrate', settings.REPORT_FORMAT)
+    with instrument.session(report, trace_memory=settings.TRACE_MEMORY):
+        fit_df = calibrate(settings.RAW_PATH, settings.START_DATE, settings.END_DATE,
+                           workers=settings.WORKERS)
+        with instrument.stage('write', len(fit_df)):
+            write_result(fit_df, settings.CALIBRATION_PATH)
+            building_time = settings.BUILDING_DAYS / (settings.END_DATE - settings.START_DATE).days
+            rules_path = Path(settings.CALIBRATED_RULES_PATH)
+            rules_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(rules_path, 'w', encoding='utf-8') as f:
+                json.dump(fitted_rules(fit_df, building_time), f, ensure_ascii=False, indent=4)
+
+    best = fit_df[fit_df['方向'] == JOINT]['最佳模块'].value_counts()
+    print('最佳模块（三方向联合）: ' + ', '.join(f'{module}={n}' for module, n in best.items()))
+
+
+# 多进程拟合时子进程会重新导入本模块，主流程只在直接运行时执行
+if __name__ == '__main__':
+    main()
@@ -1,88 +1,94 @@
+# -*- coding: utf-8 -*-
 import pandas as pd
-from openpyxl import load_workbook
-from openpyxl.utils.dataframe import dataframe_to_rows
-
-# 定义 Excel 文件路径
-file_path = './output/花垣沉降预测数据_汇总_0512.xlsx'
-
-# 读取 Excel 文件
-data = pd.ExcelFile(file_path).parse(['Sheet1', 'Sheet2', 'Sheet3', 'Sheet4'])
-
-# 加载工作簿
-wb = load_workbook(file_path)
-
-# 获取工作表
-sheet1 = wb['Sheet1']
-sheet2 = wb['Sheet2']
-sheet3 = wb['Sheet3']
-sheet4 = wb['Sheet4']
-
-#X操作
-sheet2.cell(row=1, column=1).value = '日期'
-# 获取 Sheet1 中 JC01 范围的日期列的数据并转置复制到 Sheet2 第一行，从第二列开始复制
-jc01_dates = data['Sheet1'][data['Sheet1']['点名'] == 'JC01']['日期'].tolist()
-for col, value in enumerate(jc01_dates, start=2):
-    sheet2.cell(row=1, column=col).value = value
-
-# 写入点名 JC01 - JC12 到 Sheet2 的 A2 - A13 单元格
-for row, point_name in enumerate([f'JC{i:02}' for i in range(1, 13)], start=2):
-    sheet2.cell(row=row, column=1).value = point_name
-
-# 提取 Sheet1 中 JC01 - JC12 对应的 X_累计位移(mm)数据
-selected_data = data['Sheet1'][data['Sheet1']['点名'].isin([f'JC{i:02}' for i in range(1, 13)])][['点名', '日期', 'X_累计位移(mm)']]
-
-# 使用 pivot_table 方法创建透视表
-pivot_table = selected_data.pivot_table(index='点名', columns='日期', values='X_累计位移(mm)', aggfunc='first').reset_index()
-
-# 将数据按行写入 Sheet2 从第 2 行 B 列开始
-for r_idx, row in enumerate(dataframe_to_rows(pivot_table, index=False, header=False), 2):
-    for c_idx, value in enumerate(row[1:], start=2):
-        sheet2.cell(row=r_idx, column=c_idx).value = value
-
-#Y操作
-sheet3.cell(row=1, column=1).value = '日期'
-# 获取 Sheet1 中 JC01 范围的日期列的数据并转置复制到 Sheet2 第一行，从第二列开始复制
-jc01_dates = data['Sheet1'][data['Sheet1']['点名'] == 'JC01']['日期'].tolist()
-for col, value in enumerate(jc01_dates, start=2):
-    sheet3.cell(row=1, column=col).value = value
-
-# 写入点名 JC01 - JC12 到 Sheet2 的 A2 - A13 单元格
-for row, point_name in enumerate([f'JC{i:02}' for i in range(1, 13)], start=2):
-    sheet3.cell(row=row, column=1).value = point_name
-
-# 提取 Sheet1 中 JC01 - JC12 对应的 Y_累计位移(mm)数据
-selected_data = data['Sheet1'][data['Sheet1']['点名'].isin([f'JC{i:02}' for i in range(1, 13)])][['点名', '日期', 'Y_累计位移(mm)']]
-
-# 使用 pivot_table 方法创建透视表
-pivot_table = selected_data.pivot_table(index='点名', columns='日期', values='Y_累计位移(mm)', aggfunc='first').reset_index()
-
-# 将数据按行写入 Sheet2 从第 2 行 B 列开始
-for r_idx, row in enumerate(dataframe_to_rows(pivot_table, index=False, header=False), 2):
-    for c_idx, value in enumerate(row[1:], start=2):
-        sheet3.cell(row=r_idx, column=c_idx).value = value
-
-#Z操作
-sheet4.cell(row=1, column=1).value = '日期'
-# 获取 Sheet1 中 JC01 范围的日期列的数据并转置复制到 Sheet2 第一行，从第二列开始复制
-jc01_dates = data['Sheet1'][data['Sheet1']['点名'] == 'JC01']['日期'].tolist()
-for col, value in enumerate(jc01_dates, start=2):
-    sheet4.cell(row=1, column=col).value = value
-
-# 写入点名 JC01 - JC12 到 Sheet2 的 A2 - A13 单元格
-for row, point_name in enumerate([f'JC{i:02}' for i in range(1, 13)], start=2):
-    sheet4.cell(row=row, column=1).value = point_name
-
-# 提取 Sheet1 中 JC01 - JC12 对应的 Z_累计下沉(mm)数据
-selected_data = data['Sheet1'][data['Sheet1']['点名'].isin([f'JC{i:02}' for i in range(1, 13)])][['点名', '日期', 'Z_累计下沉(mm)']]
-
-# 使用 pivot_table 方法创建透视表
-pivot_table = selected_data.pivot_table(index='点名', columns='日期', values='Z_累计下沉(mm)', aggfunc='first').reset_index()
-
-# 将数据按行写入 Sheet2 从第 2 行 B 列开始
-for r_idx, row in enumerate(dataframe_to_rows(pivot_table, index=False, header=False), 2):
-    for c_idx, value in enumerate(row[1:], start=2):
-        sheet4.cell(row=r_idx, column=c_idx).value = value
-
-# 保存修改后的 Excel 文件
-wb.save('./output/花垣沉降_成图数据_0512.xlsx')
-    
+
+import instrument
+import settings
+from writers import COLUMNS_ORDER, format_dates, point_sort_key, read_result
+
+# 成图数据各工作表对应的累计量
+CHART_SHEETS = {
+    'Sheet2': 'X_累计位移(mm)',
+    'Sheet3': 'Y_累计位移(mm)',
+    'Sheet4': 'Z_累计下沉(mm)',
+}
+
+
+def build_chart_tables(result_df):
+    """
+    一次透视得到各工作表的成图数据：行为点名，列为日期。
+
+    参数:
+        result_df (DataFrame): 预测结果，含 日期、点名 及 CHART_SHEETS 中的累计量列。
+
+    返回:
+        dict: 工作表名 -> DataFrame。
+    """
+    pivot = result_df.pivot_table(index='点名', columns='日期', values=list(CHART_SHEETS.values()),
+                                  aggfunc='first', observed=True)
+    # 点名顺序取自数据本身
+    points = sorted(pivot.index.astype(str), key=point_sort_key)
+    pivot = pivot.set_axis(pivot.index.astype(str), axis=0).reindex(points)
+    return {sheet: pivot[measure] for sheet, measure in CHART_SHEETS.items()}
+
+
+def _rows(table):
+    # 空值写为空单元格
+    values = table.astype(object).where(table.notna(), None)
+    for point, row in zip(table.index, values.to_numpy().tolist()):
+        yield [point] + row
+
+
+def write_chart_workbook(path, tables, result_df=None):
+    """
+    以只写模式逐行写出成图数据工作簿。
+
+    参数:
+        path (str): 输出文件路径。
+        tables (dict): build_chart_tables 的结果。
+        result_df (DataFrame): 预测结果，给出时原样写入 Sheet1（见 settings.CHART_RESULT_SHEET），None 时不写 Sheet1。
+    """
+    from openpyxl import Workbook
+
+    wb = Workbook(write_only=True)
+
+    if result_df is not None:
+        sheet1 = wb.create_sheet('Sheet1')
+        sheet1.append(list(result_df.columns))
+        if '日期' in result_df.columns:
+            result_df = result_df.assign(日期=format_dates(result_df['日期']))
+        for row in result_df.itertuples(index=False, name=None):
+            sheet1.append(list(row))
+
+    for sheet_name, table in tables.items():
+        sheet = wb.create_sheet(sheet_name)
+        # 第一行为日期，A 列为点名
+        sheet.append(['日期'] + list(format_dates(pd.Series(table.columns))))
+        for row in _rows(table):
+            sheet.append(row)
+
+    wb.save(path)
+
+
+def main():
+    report = instrument.report_path(settings.REPORT_DIR, 'charts_data', settings.REPORT_FORMAT)
+    with instrument.session(report, trace_memory=settings.TRACE_MEMORY):
+        # 读取预测结果（可以是 .parquet/.arrow/.xlsx），不附带 Sheet1 时只读取成图用到的列
+        columns = COLUMNS_ORDER if settings.CHART_RESULT_SHEET else ['日期', '点名'] + list(CHART_SHEETS.values())
+        with instrument.stage('read') as record:
+            result_df = read_result(settings.OUTPUT_PATH, columns=columns)
+            record['rows'] = len(result_df)
+
+        # 生成 X、Y、Z 累计量的成图数据并保存
+        with instrument.stage('pivot', len(result_df)):
+            tables = build_chart_tables(result_df)
+        with instrument.stage('chart', len(result_df)):
+            write_chart_workbook(settings.CHART_PATH, tables, result_df if settings.CHART_RESULT_SHEET else None)
+
+        # 可选绘制曲线图
+        if settings.RENDER_DIR:
+            from charts_render import render_charts
+            render_charts(tables, settings.RENDER_DIR, fmt=settings.RENDER_FORMAT, workers=settings.RENDER_WORKERS)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,285 @@
+# -*- coding: utf-8 -*-
+"""
+沉降曲线成图：由成图数据（charts_data.build_chart_tables 的透视结果）直接绘制
+各点各方向的累计位移曲线，以及每个方向的总览图（每页若干个点的小图），输出 PNG 或 SVG。
+
+绘图使用无界面的 Agg 后端，每个进程只创建一次图形对象，之后只替换曲线数据；
+任务按批分给进程池。每张图按其数据、标题和样式计算内容摘要，记录在输出目录的
+render_manifest.json 中，再次运行时只重绘数据有变化的图。
+
+输出目录结构:
+    <目录>/X/<点名>.png、<目录>/Y/<点名>.png、<目录>/Z/<点名>.png
+    <目录>/overview_X_01.png ……
+"""
+import hashlib
+import json
+import os
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+import instrument
+import settings
+from charts_data import CHART_SHEETS, build_chart_tables
+from parallel_generate import split_points
+from writers import COLUMNS_ORDER, read_result
+
+FORMATS = ('png', 'svg')
+
+# 成图数据工作表对应的方向
+SHEET_AXES = {'Sheet2': 'X', 'Sheet3': 'Y', 'Sheet4': 'Z'}
+
+MANIFEST_NAME = 'render_manifest.json'
+# 样式变化时修改版本号，使全部图重绘
+STYLE_VERSION = 1
+
+# 单点图和总览图的尺寸(英寸)、分辨率
+FIGURE_SIZE = (8, 4.5)
+OVERVIEW_GRID = (3, 4)
+OVERVIEW_SIZE = (16, 10)
+DPI = 100
+
+# 每批交给子进程的图数
+BATCH_SIZE = 64
+
+# 中文字体，按顺序取第一个可用的
+CJK_FONTS = ['SimHei', 'Microsoft YaHei', 'Noto Sans CJK SC', 'WenQuanYi Micro Hei', 'DejaVu Sans']
+
+
+def _import_pyplot():
+    try:
+        import matplotlib
+    except ImportError:
+        raise ImportError("曲线成图需要安装 matplotlib") from None
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    plt.rcParams['font.sans-serif'] = CJK_FONTS
+    plt.rcParams['axes.unicode_minus'] = False
+    # 缺少中文字体时只是显示为方框，不逐字警告
+    warnings.filterwarnings('ignore', message='Glyph .* missing from')
+    return plt
+
+
+def _digest(*parts):
+    h = hashlib.sha1(f'v{STYLE_VERSION}'.encode('utf-8'))
+    for part in parts:
+        h.update(np.ascontiguousarray(part).tobytes() if isinstance(part, np.ndarray) else repr(part).encode('utf-8'))
+    return h.hexdigest()
+
+
+def plan_figures(tables, fmt='png'):
+    """
+    列出全部图及其数据。
+
+    参数:
+        tables (dict): 工作表名 -> DataFrame（行为点名，列为日期），见 charts_data.build_chart_tables。
+        fmt (str): 'png' 或 'svg'。
+
+    返回:
+        list: 每张图一个字典：name（相对输出目录的文件名）、kind（'point' 或 'overview'）、title、
+              dates（datetime64 数组）、series（[(点名, 取值数组), ...]）、ylabel、digest。
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"不支持的图片格式: {fmt}，可选 {FORMATS}")
+    per_page = OVERVIEW_GRID[0] * OVERVIEW_GRID[1]
+    figures = []
+    for sheet, table in tables.items():
+        axis, measure = SHEET_AXES[sheet], CHART_SHEETS[sheet]
+        dates = np.asarray(table.columns, dtype='datetime64[s]')
+        # 按结果文件的存储精度（float32，见 writers）取值，内存中的结果和读回的结果得到相同的摘要
+        values = table.to_numpy(dtype=np.float32)
+        points = [str(point) for point in table.index]
+        for point, row in zip(points, values):
+            title = f'{point} {measure}'
+            figures.append({
+                'name': f'{axis}/{point}.{fmt}', 'kind': 'point', 'title': title, 'ylabel': measure,
+                'dates': dates, 'series': [(point, row)], 'digest': _digest('point', title, dates, row),
+            })
+        for page, start in enumerate(range(0, len(points), per_page), 1):
+            stop = start + per_page
+            title = f'{measure} 总览 ({page})'
+            figures.append({
+                'name': f'overview_{axis}_{page:02d}.{fmt}', 'kind': 'overview', 'title': title, 'ylabel': measure,
+                'dates': dates, 'series': list(zip(points[start:stop], values[start:stop])),
+                'digest': _digest('overview', title, dates, points[start:stop], values[start:stop]),
+            })
+    return figures
+
+
+class _Canvas:
+    """
+    子进程中复用的图形对象：单点图一个、总览图一个，每张图只替换曲线数据和标题。
+
+    参数:
+        fmt (str): 'png' 或 'svg'。
+    """
+
+    def __init__(self, fmt='png'):
+        plt = _import_pyplot()
+        # 绘图时间主要花在刻度文字上，刻度数量控制在必要范围内；PNG 使用低压缩级别
+        self.save_kwargs = {'pil_kwargs': {'compress_level': 1}} if fmt == 'png' else {}
+
+        self.point_figure, self.point_axes = plt.subplots(figsize=FIGURE_SIZE, dpi=DPI)
+        self.point_line, = self.point_axes.plot([], [], marker='o', markersize=2, linewidth=1)
+        self._style(self.point_axes, max_ticks=6)
+        self.point_figure.autofmt_xdate()
+
+        rows, columns = OVERVIEW_GRID
+        self.overview_figure, axes = plt.subplots(rows, columns, figsize=OVERVIEW_SIZE, dpi=DPI, sharex=True)
+        self.overview_axes = list(axes.ravel())
+        self.overview_lines = []
+        for ax in self.overview_axes:
+            self.overview_lines.append(ax.plot([], [], linewidth=1)[0])
+            self._style(ax, max_ticks=4)
+            ax.tick_params(labelsize=7)
+        self.overview_figure.autofmt_xdate()
+
+    @staticmethod
+    def _style(ax, max_ticks):
+        import matplotlib.dates as mdates
+        from matplotlib.ticker import MaxNLocator
+
+        ax.grid(True, linestyle=':', linewidth=0.5)
+        ax.xaxis.set_major_locator(mdates.AutoDateLocator(minticks=2, maxticks=max_ticks))
+        ax.xaxis.set_major_formatter(mdates.DateFormatter('%Y-%m-%d'))
+        ax.yaxis.set_major_locator(MaxNLocator(max_ticks))
+
+    @staticmethod
+    def _update(ax, line, dates, values, title):
+        line.set_data(dates, values)
+        ax.set_title(title, fontsize=10)
+        ax.relim()
+        ax.autoscale_view()
+
+    def render(self, figure, path):
+        if figure['kind'] == 'point':
+            (point, values), = figure['series']
+            self._update(self.point_axes, self.point_line, figure['dates'], values, figure['title'])
+            self.point_axes.set_ylabel(figure['ylabel'])
+            self.point_figure.savefig(path, **self.save_kwargs)
+            return
+        for i, (ax, line) in enumerate(zip(self.overview_axes, self.overview_lines)):
+            if i < len(figure['series']):
+                point, values = figure['series'][i]
+                self._update(ax, line, figure['dates'], values, point)
+                ax.set_visible(True)
+            else:
+                ax.set_visible(False)
+        self.overview_figure.suptitle(figure['title'])
+        self.overview_figure.savefig(path, **self.save_kwargs)
+
+
+# 每个进程按图片格式各一个画布
+_canvases = {}
+
+
+def render_batch(figures, directory, fmt='png'):
+    """
+    在当前进程中绘制一批图。
+
+    返回:
+        list: 已写出的 (文件名, 摘要)。
+    """
+    canvas = _canvases.get(fmt)
+    if canvas is None:
+        canvas = _canvases[fmt] = _Canvas(fmt)
+    done = []
+    for figure in figures:
+        path = Path(directory) / figure['name']
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # 先写临时文件再替换，中断时不会留下半张图
+        tmp = path.with_name(f'{path.stem}.{os.getpid()}.tmp{path.suffix}')
+        canvas.render(figure, tmp)
+        tmp.replace(path)
+        done.append((figure['name'], figure['digest']))
+    return done
+
+
+def _load_manifest(path):
+    if not path.exists():
+        return {}
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        # 清单损坏时全部重绘
+        return {}
+
+
+def _save_manifest(manifest, path):
+    tmp = path.with_name(path.name + '.tmp')
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=0, sort_keys=True)
+    tmp.replace(path)
+
+
+def render_charts(tables, directory, fmt='png', workers=None, force=False):
+    """
+    绘制各点各方向的曲线图和总览图，只重绘数据有变化的图。
+
+    参数:
+        tables (dict): 成图数据，见 charts_data.build_chart_tables。
+        directory (str): 输出目录。
+        fmt (str): 'png' 或 'svg'。
+        workers (int): 绘图进程数，默认为 CPU 核数；1 时在当前进程中绘制。
+        force (bool): 为 True 时忽略清单，全部重绘。
+
+    返回:
+        dict: {'rendered': 重绘的图数, 'skipped': 未变化而跳过的图数, 'removed': 删除的过期图数}。
+    """
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    manifest_path = directory / MANIFEST_NAME
+    manifest = {} if force else _load_manifest(manifest_path)
+
+    with instrument.stage('plan') as record:
+        figures = plan_figures(tables, fmt)
+        record['rows'] = len(figures)
+    pending = [figure for figure in figures
+               if manifest.get(figure['name']) != figure['digest'] or not (directory / figure['name']).exists()]
+
+    # 点位减少后不再需要的图（只删除清单中记录过的文件）
+    current = {figure['name'] for figure in figures}
+    removed = [name for name in manifest if name not in current]
+    for name in removed:
+        (directory / name).unlink(missing_ok=True)
+    manifest = {name: digest for name, digest in manifest.items() if name in current}
+
+    workers = workers or os.cpu_count()
+    with instrument.stage('render', len(pending)):
+        batches = [pending[part] for part in split_points(len(pending), -(-len(pending) // BATCH_SIZE))] \
+            if pending else []
+        if workers > 1 and len(batches) > 1:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                results = executor.map(render_batch, batches, [directory] * len(batches), [fmt] * len(batches))
+                for done in results:
+                    manifest.update(done)
+                    # 每批完成后保存清单，中断后再次运行可以继续
+                    _save_manifest(manifest, manifest_path)
+        else:
+            for batch in batches:
+                manifest.update(render_batch(batch, directory, fmt))
+                _save_manifest(manifest, manifest_path)
+    _save_manifest(manifest, manifest_path)
+    instrument.count('render.figures', len(pending))
+    return {'rendered': len(pending), 'skipped': len(figures) - len(pending), 'removed': len(removed)}
+
+
+def main():
+    report = instrument.report_path(settings.REPORT_DIR, 'charts_render', settings.REPORT_FORMAT)
+    with instrument.session(report, trace_memory=settings.TRACE_MEMORY):
+        with instrument.stage('read') as record:
+            result_df = read_result(settings.OUTPUT_PATH, columns=COLUMNS_ORDER)
+            record['rows'] = len(result_df)
+        with instrument.stage('pivot', len(result_df)):
+            tables = build_chart_tables(result_df)
+        summary = render_charts(tables, settings.RENDER_DIR, fmt=settings.RENDER_FORMAT,
+                                workers=settings.RENDER_WORKERS)
+    print(f"重绘 {summary['rendered']} 张，未变化 {summary['skipped']} 张，删除 {summary['removed']} 张")
+
+
+# 多进程绘图时子进程会重新导入本模块，主流程只在直接运行时执行
+if __name__ == '__main__':
+    main()
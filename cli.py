@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+"""
+命令行入口，各工具共用一个启动脚本:
+
+    python cli.py generate [参数]    生成预测数据（同 dataBuild_all.py）
+    python cli.py charts [参数]      由预测结果生成成图数据（同 charts_data.py）
+    python cli.py pipeline [参数]    生成并成图一体化（同 pipeline.py）
+    python cli.py bench [参数]       性能基准，参数原样交给 bench.py
+
+参数默认取自 settings.py，命令行给出的值覆盖对应设置。会被忽略的组合（如 --incremental 与 --workers、
+--streaming 与 --incremental）直接报错，另一方来自 settings.py 时也一样。子命令只在执行时导入对应模块，
+查看帮助和参数有误时不导入 pandas/numpy；启动耗时可用 python cli.py bench --startup 测量。
+"""
+import argparse
+import importlib
+import sys
+from datetime import datetime
+from pathlib import Path
+
+import settings
+
+# 子命令 -> (模块, 说明)
+COMMANDS = {
+    'generate': ('dataBuild_all', '生成预测数据'),
+    'charts': ('charts_data', '由预测结果生成成图数据'),
+    'pipeline': ('pipeline', '生成预测数据并在内存中生成成图数据'),
+    'bench': ('bench', '性能基准，其余参数原样交给 bench.py'),
+}
+
+# 关闭某项输出的开关 -> 对应的设置
+_DISABLE = {'no_screen': 'SCREEN_PATH'}
+
+# 不能同时生效的选项（后者会被忽略）：(选项, 设置名, 选项, 设置名, 原因)
+_CONFLICTS = (
+    ('--incremental', 'INCREMENTAL', '--workers', 'WORKERS', '增量计算在单进程中进行'),
+    ('--streaming', 'STREAMING', '--incremental', 'INCREMENTAL', '分块生成总是全量写出'),
+    ('--streaming', 'STREAMING', '--workers', 'WORKERS', '分块生成在单进程中逐块进行'),
+    ('--streaming', 'STREAMING', '--excel', 'EXCEL_PATH', '分块生成不导出 Excel'),
+)
+
+
+def _date(value):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d')
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"日期格式应为 YYYY-MM-DD: {value!r}") from None
+
+
+def _add_input_arguments(parser):
+    group = parser.add_argument_group('输入')
+    group.add_argument('--raw', dest='RAW_PATH', help='原始数据文件')
+    group.add_argument('--start', dest='START_DATE', type=_date, help='起始日期 YYYY-MM-DD')
+    group.add_argument('--end', dest='END_DATE', type=_date, help='结束日期 YYYY-MM-DD')
+    group.add_argument('--building-days', dest='BUILDING_DAYS', type=int, help='施工期天数')
+    group.add_argument('--rules', dest='CURVE_RULES_PATH', help='曲线分配规则配置文件')
+    group.add_argument('--seed', dest='SEED', type=int, help='随机种子')
+    group.add_argument('--workers', dest='WORKERS', type=int, help='并行进程数')
+    group.add_argument('--incremental', dest='INCREMENTAL', action='store_const', const=True,
+                       help='只计算并追加新增日期')
+    return group
+
+
+def _add_output_arguments(parser, excel=True, chart=False, screen=True, render=False):
+    group = parser.add_argument_group('输出')
+    group.add_argument('--output', dest='OUTPUT_PATH', help='预测结果路径（.parquet/.arrow/.xlsx）')
+    if excel:
+        group.add_argument('--excel', dest='EXCEL_PATH', nargs='?', const='',
+                           help='导出预测结果的 Excel（默认不导出），不给路径时与结果同名，后缀为 .xlsx')
+    if chart:
+        group.add_argument('--chart', dest='CHART_PATH', help='成图数据工作簿路径')
+        group.add_argument('--chart-result-sheet', dest='CHART_RESULT_SHEET', action='store_const', const=True,
+                           help='成图数据工作簿的 Sheet1 附带完整的预测结果（默认不附带）')
+    if screen:
+        group.add_argument('--screen', dest='SCREEN_PATH', help='异常筛查表路径')
+        group.add_argument('--no-screen', action='store_true', help='不做异常筛查')
+    if render:
+        group.add_argument('--render-dir', dest='RENDER_DIR', help='曲线图输出目录')
+        group.add_argument('--render-format', dest='RENDER_FORMAT', choices=('png', 'svg'), help='曲线图格式')
+    group.add_argument('--report-dir', dest='REPORT_DIR', help='运行报告目录')
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='cli.py', description='沉降监测数据预测')
+    subparsers = parser.add_subparsers(dest='command', metavar='子命令', required=True)
+
+    generate = subparsers.add_parser('generate', help=COMMANDS['generate'][1], description=COMMANDS['generate'][1])
+    _add_input_arguments(generate).add_argument('--streaming', dest='STREAMING', action='store_const', const=True,
+                                                help='分块生成并写入按日期分区的目录')
+    _add_output_arguments(generate)
+
+    charts = subparsers.add_parser('charts', help=COMMANDS['charts'][1], description=COMMANDS['charts'][1])
+    _add_output_arguments(charts, excel=False, chart=True, screen=False, render=True)
+
+    pipeline = subparsers.add_parser('pipeline', help=COMMANDS['pipeline'][1], description=COMMANDS['pipeline'][1])
+    _add_input_arguments(pipeline)
+    _add_output_arguments(pipeline, chart=True, render=True)
+
+    # bench 的参数由 bench.py 自己解析
+    subparsers.add_parser('bench', help=COMMANDS['bench'][1], add_help=False)
+    return parser
+
+
+def _enabled(args, name):
+    # 命令行给出的值优先，否则取 settings.py 中的值
+    value = getattr(args, name, None)
+    value = getattr(settings, name) if value is None else value
+    if name == 'WORKERS':
+        return (value or 1) > 1
+    return value is not None and value is not False
+
+
+def check_conflicts(parser, args):
+    """拒绝会被忽略的选项组合；两个选项都只来自 settings.py 时不检查。"""
+    given = {name for name, value in vars(args).items() if name.isupper() and value is not None}
+    for first, first_name, second, second_name, reason in _CONFLICTS:
+        if not given & {first_name, second_name}:
+            continue
+        if _enabled(args, first_name) and _enabled(args, second_name):
+            labels = [option if name in given else f'settings.{name}'
+                      for option, name in ((first, first_name), (second, second_name))]
+            parser.error(f"{labels[0]} 与 {labels[1]} 不能同时使用：{reason}")
+
+
+def apply_settings(args):
+    """把命令行给出的值写入 settings，各模块运行时读取的即为覆盖后的设置。"""
+    for name, value in vars(args).items():
+        if name.isupper() and value is not None:
+            setattr(settings, name, value)
+    for flag, name in _DISABLE.items():
+        if getattr(args, flag, False):
+            setattr(settings, name, None)
+    if settings.EXCEL_PATH == '':
+        settings.EXCEL_PATH = str(Path(settings.OUTPUT_PATH).with_suffix('.xlsx'))
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else list(argv)
+    parser = build_parser()
+    args, extra = parser.parse_known_args(argv)
+    if extra and args.command != 'bench':
+        parser.error(f"无法识别的参数: {' '.join(extra)}")
+    check_conflicts(parser, args)
+    module = importlib.import_module(COMMANDS[args.command][0])
+    if args.command == 'bench':
+        module.main(extra)
+        return
+    apply_settings(args)
+    module.main()
+
+
+# 多进程生成时子进程会重新导入本模块，主流程只在直接运行时执行
+if __name__ == '__main__':
+    main()
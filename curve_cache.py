@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+"""
+单位曲线缓存：按 (曲线版本, 模块, 形状参数, 总天数, 日期网格) 缓存与总位移无关的单位曲线，
+各点、各方向只需按总位移缩放。内存中按最近最少使用(LRU)淘汰，可选持久化到磁盘，
+重新运行（新增点位、调整个别参数）时大部分曲线直接从缓存读取。
+
+curve_engine.BASIS_VERSION 变化后旧版本的曲线不再命中；磁盘上的文件数超过上限时按修改时间
+（读取时更新）淘汰最久未用的，旧版本和旧日期网格的文件随之清理。
+"""
+import hashlib
+import os
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+
+from curve_engine import BASES, BASIS_VERSION
+
+# 默认内存缓存条数
+DEFAULT_MAXSIZE = 256
+# 默认磁盘缓存文件数上限
+DEFAULT_MAX_FILES = 4096
+
+
+def grid_digest(days):
+    """日期网格的摘要，用作缓存键的一部分。"""
+    days = np.ascontiguousarray(days, dtype=np.float64)
+    return hashlib.sha1(days.tobytes()).hexdigest()
+
+
+class CurveCache:
+    """
+    单位曲线的 LRU 缓存。
+
+    参数:
+        maxsize (int): 内存中最多保留的曲线条数。
+        directory (str): 持久化目录，None 时只缓存在内存中。
+        max_files (int): 持久化目录中最多保留的曲线文件数。
+    """
+
+    def __init__(self, maxsize=DEFAULT_MAXSIZE, directory=None, max_files=DEFAULT_MAX_FILES):
+        self.maxsize = maxsize
+        self.directory = Path(directory) if directory else None
+        self.max_files = max_files
+        self.hits = 0
+        self.misses = 0
+        self._curves = OrderedDict()
+
+    def __len__(self):
+        return len(self._curves)
+
+    @staticmethod
+    def key(module, days, total_days, shape_params):
+        return (BASIS_VERSION, module, tuple(sorted(shape_params.items())), float(total_days), grid_digest(days))
+
+    def _path(self, key):
+        name = hashlib.sha1(repr(key).encode('utf-8')).hexdigest()
+        return self.directory / f'{key[1]}_v{key[0]}_{name}.npy'
+
+    def _load(self, key):
+        if self.directory is None:
+            return None
+        path = self._path(key)
+        if not path.exists():
+            return None
+        try:
+            basis = np.load(path)
+        except (OSError, ValueError):
+            # 文件损坏或写入未完成时视为未命中
+            return None
+        try:
+            # 修改时间记为最近使用时间，淘汰时保留常用的曲线
+            os.utime(path)
+        except OSError:
+            pass
+        return basis
+
+    def _save(self, key, basis):
+        if self.directory is None:
+            return
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self._path(key)
+        # 先写临时文件再替换，多进程同时写入时不会读到半个文件
+        tmp = path.with_name(f'{path.stem}.{os.getpid()}.tmp.npy')
+        np.save(tmp, basis)
+        os.replace(tmp, path)
+        self._prune()
+
+    def _prune(self):
+        # 文件数超过上限时按修改时间删除最久未用的；其他进程同时删除时忽略
+        files = []
+        for path in self.directory.glob('*.npy'):
+            if path.name.endswith('.tmp.npy'):
+                continue
+            try:
+                files.append((path.stat().st_mtime_ns, path))
+            except OSError:
+                pass
+        if len(files) <= self.max_files:
+            return
+        files.sort()
+        for _, path in files[:len(files) - self.max_files]:
+            try:
+                path.unlink()
+            except OSError:
+                pass
+
+    def _remember(self, key, basis):
+        basis.setflags(write=False)
+        self._curves[key] = basis
+        self._curves.move_to_end(key)
+        while len(self._curves) > self.maxsize:
+            self._curves.popitem(last=False)
+
+    def basis(self, module, days, total_days, shape_params):
+        """
+        取单位曲线，未命中时计算并写入缓存。
+
+        参数:
+            module (str): 模块名。
+            days (ndarray): 各日期距起始日期的天数。
+            total_days (int): 起止日期间隔天数。
+            shape_params (dict): 形状参数，见 curve_engine.split_params。
+
+        返回:
+            ndarray: 只读的单位曲线。
+        """
+        key = self.key(module, days, total_days, shape_params)
+        basis = self._curves.get(key)
+        if basis is not None:
+            self._curves.move_to_end(key)
+            self.hits += 1
+            return basis
+
+        basis = self._load(key)
+        if basis is not None:
+            self.hits += 1
+        else:
+            self.misses += 1
+            basis = BASES[module](days, total_days, **shape_params)
+            self._save(key, basis)
+        self._remember(key, basis)
+        return basis
+
+    def clear(self):
+        """清空内存缓存（不删除磁盘文件）。"""
+        self._curves.clear()
+
+
+# 每个进程按持久化目录共用一个缓存
+_caches = {}
+
+
+def get_cache(directory=None):
+    """返回当前进程中与 directory 对应的共用缓存。"""
+    key = str(directory) if directory else None
+    if key not in _caches:
+        _caches[key] = CurveCache(directory=directory)
+    return _caches[key]
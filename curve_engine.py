@@ -0,0 +1,310 @@
+# -*- coding: utf-8 -*-
+"""
+沉降曲线向量化计算引擎。
+
+与 dataBuild_all.py 中原有的 ModuleA-ModuleD 曲线语义一致，但不再依赖模块级全局变量，
+一次调用即可对整段日期序列、X/Y/Z 三个方向同时求值。
+
+每条曲线拆成两步：先由日期网格和形状参数算出与总位移无关的单位曲线（基函数），
+再按各点、各方向的总位移缩放。基函数可以在总位移不同的点之间共用，见 curve_cache。
+
+约定:
+    days:   一维数组，各日期距起始日期的天数，形状 (日期数,)。
+    totals: 各方向总位移(mm)，形状 (..., 3)，最后一维依次为 X、Y、Z。
+    返回值: 理论累计位移(mm)，形状 (..., 日期数, 3)。
+"""
+import numpy as np
+
+# 单位曲线的版本：basis_* 的计算方式变化时递增，持久化缓存中旧版本的曲线不再命中（见 curve_cache）
+BASIS_VERSION = 1
+
+# ModuleC 中符号不一致时各方向使用的小数值（X、Y、Z）
+MODULE_C_FALLBACK = np.array([0.03, 0.04, 0.05])
+
+# 各模块决定曲线形状的参数及默认值（None 表示必须给出）；其余参数只影响缩放
+SHAPE_PARAMS = {
+    'ModuleA': {'moving_time': 0, 'log_base': 4, 'epsilon': 1e-6},
+    'ModuleB': {'time_split1': None, 'time_split2': None},
+    'ModuleC': {'ratio_shift': 2000},
+    'ModuleD': {},
+}
+
+
+def _as_days(days):
+    days = np.asarray(days, dtype=float)
+    if days.ndim != 1:
+        raise ValueError("days必须是一维数组")
+    return days[:, None]
+
+
+def _as_totals(totals):
+    totals = np.asarray(totals, dtype=float)
+    if totals.shape[-1:] != (3,):
+        raise ValueError("totals最后一维必须为3（X、Y、Z）")
+    return totals
+
+
+def diff_sign(a, b):
+    return (a >= 0) != (b >= 0)
+
+
+def basis_a(days, total_days, moving_time=0, log_base=4, epsilon=1e-6):
+    """ModuleA 的单位曲线，形状 (日期数, 1)。参数见 module_a。"""
+    # 确保参数有效
+    if log_base <= 1:
+        raise ValueError("log_base必须大于1")
+    if epsilon <= 0 or epsilon >= 0.1:
+        raise ValueError("epsilon必须在0到0.1之间")
+
+    t = _as_days(days)
+
+    # t<=moving_time 的位置结果会被置零，这里截断负值只是为了避免对数的无效运算
+    adjusted_time = epsilon + np.maximum(t, 0)
+    max_log = np.log(total_days + epsilon) / np.log(log_base)
+    current_log = np.log(adjusted_time + 1) / np.log(log_base)
+    log_factor = current_log / max_log
+
+    value = np.where(t >= total_days, 1.0, log_factor)
+    return np.where(t <= moving_time, 0.0, value)
+
+
+def basis_b(days, total_days, time_split1, time_split2):
+    """
+    ModuleB 的三段线性基函数，形状 (日期数, 3)。
+
+    三列依次对应第一折点、第二折点和终点（占总位移的比例分别为 r1、r1+r2、1），
+    曲线为三列按这三个比例加权求和。参数见 module_b。
+    """
+    if not (0 < time_split1 < time_split2 < 1):
+        raise ValueError("时间分割点必须满足: 0 < time_split1 < time_split2 < 1")
+
+    t = _as_days(days)[:, 0]
+
+    # 计算各段的时间范围
+    t1_end = time_split1 * total_days
+    t2_end = time_split2 * total_days
+
+    s = (t - t1_end) / (t2_end - t1_end)
+    u = (t - t2_end) / (total_days - t2_end)
+    first = t <= t1_end
+    second = ~first & (t <= t2_end)
+    third = ~first & ~second
+
+    basis = np.zeros((len(t), 3))
+    # 第一段：0到t1_end
+    basis[first, 0] = t[first] / t1_end
+    # 第二段：t1_end到t2_end
+    basis[second, 0] = 1 - s[second]
+    basis[second, 1] = s[second]
+    # 第三段：t2_end到结束
+    basis[third, 1] = 1 - u[third]
+    basis[third, 2] = u[third]
+    return basis
+
+
+def basis_c(days, total_days, ratio_shift=2000):
+    """ModuleC 的单位曲线（符号修正前），形状 (日期数, 1)。参数见 module_c。"""
+    t = _as_days(days)
+    return 1 - (t - total_days) ** 2 / (total_days ** 2 - ratio_shift)
+
+
+def basis_d(days, total_days):
+    """ModuleD 的单位曲线，形状 (日期数, 1)。参数见 module_d。"""
+    t = _as_days(days)
+    return 1 - (t - total_days) ** 2 / total_days ** 2
+
+
+BASES = {
+    'ModuleA': basis_a,
+    'ModuleB': basis_b,
+    'ModuleC': basis_c,
+    'ModuleD': basis_d,
+}
+
+
+def ratio_weights(ratio1, ratio2, offset, jitter):
+    """
+    ModuleB 各点、各方向的折点比例，形状 (..., 3, 3)，最后一维为 [r1, r1+r2, 1]。
+
+    参数:
+        ratio1, ratio2, offset: 见 module_b；也可以是逐点取值的数组，形状 (..., 1)，与 jitter 的前置维对应。
+        jitter (array): 两个比例的随机偏移系数，形状 (..., 3, 2)。
+    """
+    ratio1, ratio2, offset = (np.asarray(value, dtype=float) for value in (ratio1, ratio2, offset))
+    # 确保输入参数有效
+    if not np.all((0 <= ratio1) & (ratio1 <= 1) & (0 <= ratio2) & (ratio2 <= 1) & ((ratio1 + ratio2) <= 1)):
+        raise ValueError("比例参数必须满足: 0 <= ratio1 <= 1, 0 <= ratio2 <= 1, ratio1 + ratio2 <= 1")
+    if np.any((offset < 0) | (offset > 0.3)):
+        raise ValueError("offset参数必须在0到0.3之间")
+
+    jitter = np.asarray(jitter, dtype=float)
+
+    # 添加随机偏移
+    random_ratio1 = ratio1 * (1 + offset * jitter[..., 0])
+    random_ratio2 = ratio2 * (1 + offset * jitter[..., 1])
+
+    # 确保随机调整后的比例仍有效
+    total_ratio = random_ratio1 + random_ratio2
+    scale = np.where(total_ratio > 1, 1 / total_ratio, 1.0)
+    random_ratio1 = random_ratio1 * scale
+    random_ratio2 = random_ratio2 * scale
+
+    return np.stack([random_ratio1, random_ratio1 + random_ratio2, np.ones_like(random_ratio1)], axis=-1)
+
+
+def scale_basis(module, basis, totals, ratio1=None, ratio2=None, offset=None, jitter=None, rng=None):
+    """
+    将单位曲线按总位移缩放为理论累计位移。
+
+    参数:
+        module (str): 模块名。
+        basis (ndarray): BASES 中对应函数的结果。
+        totals (array): 各方向总位移，形状 (..., 3)。
+        ratio1, ratio2, offset, jitter, rng: 仅 ModuleB 使用，见 module_b；比例和偏移可以是逐点取值的数组，
+                                            见 ratio_weights。
+
+    返回:
+        ndarray: 理论累计位移，形状 (..., 日期数, 3)。
+    """
+    totals = _as_totals(totals)
+
+    if module == 'ModuleB':
+        if jitter is None:
+            rng = np.random if rng is None else rng
+            jitter = rng.uniform(-1, 1, size=totals.shape[:-1] + (3, 2))
+        weights = ratio_weights(ratio1, ratio2, offset, jitter)
+        return totals[..., None, :] * np.einsum('dk,...ak->...da', basis, weights)
+
+    value = totals[..., None, :] * basis
+    if module == 'ModuleC':
+        # 与总位移符号不一致时，保持符号一致的小数值
+        sign = np.broadcast_to(totals[..., None, :], value.shape)
+        value = np.where(diff_sign(value, sign), np.sign(sign) * MODULE_C_FALLBACK, value)
+    return value
+
+
+# 对数函数曲线，前期斜率大，中后期斜率小
+def module_a(days, totals, total_days, moving_time=0, log_base=4, epsilon=1e-6):
+    """
+    计算沉降预测的理论累计位移，使用对数函数曲线，前期斜率大，中后期斜率小。
+
+    参数:
+        days (array): 各日期距起始日期的天数。
+        totals (array): 各方向总位移，形状 (..., 3)。
+        total_days (int): 起止日期间隔天数。
+        moving_time(float): 开始沉降时间，默认为0，范围0-total_days。
+        log_base (float): 对数函数的底数，控制曲线形状。默认值为4，推荐范围为2-10。
+        epsilon (float): 避免对数函数在t=0时无定义的小偏移量。默认值为1e-6，通常不需要调整。
+
+    返回:
+        ndarray: 理论累计位移，形状 (..., 日期数, 3)。
+    """
+    return scale_basis('ModuleA', basis_a(days, total_days, moving_time, log_base, epsilon), totals)
+
+
+# 修正的一次函数曲线，添加两个折点
+def module_b(days, totals, total_days, ratio1, ratio2, time_split1, time_split2, offset, jitter=None, rng=None):
+    """
+    修正的一次函数曲线，添加两个折点，计算沉降预测的理论累计位移。
+
+    每个点、每个方向的折点比例只随机偏移一次，整条曲线使用同一组比例。
+
+    参数:
+        days (array): 各日期距起始日期的天数。
+        totals (array): 各方向总位移，形状 (..., 3)。
+        total_days (int): 起止日期间隔天数。
+        ratio1 (float): 第一段的比例，范围 0 到 1。
+        ratio2 (float): 第二段的比例，范围 0 到 1，且 ratio1 + ratio2 <= 1。
+        time_split1 (float): 第一个时间分割点，范围 0 到 1。
+        time_split2 (float): 第二个时间分割点，范围 0 到 1，且 time_split1 < time_split2。
+        offset (float): 随机偏移的范围，范围 0 到 0.3。
+        jitter (array): 两个比例的随机偏移系数，取值 [-1, 1]，形状 (..., 3, 2)，乘以 offset 后作用于比例。
+                        未给出时由 rng 抽取。
+        rng (numpy.random.Generator): 随机数发生器，默认使用 numpy 全局随机状态。
+
+    返回:
+        ndarray: 理论累计位移，形状 (..., 日期数, 3)。
+    """
+    basis = basis_b(days, total_days, time_split1, time_split2)
+    return scale_basis('ModuleB', basis, totals, ratio1=ratio1, ratio2=ratio2, offset=offset, jitter=jitter, rng=rng)
+
+
+# 修正的二次函数曲线，添加X轴初始偏移
+def module_c(days, totals, total_days, ratio_shift=2000):
+    """
+    修正的二次函数曲线，添加X轴初始偏移，计算沉降预测的理论累计位移。
+
+    参数:
+        days (array): 各日期距起始日期的天数。
+        totals (array): 各方向总位移，形状 (..., 3)。
+        total_days (int): 起止日期间隔天数。
+        ratio_shift: 斜率调整，推荐范围：（-4000,4000）
+
+    返回:
+        ndarray: 理论累计位移，形状 (..., 日期数, 3)。
+    """
+    return scale_basis('ModuleC', basis_c(days, total_days, ratio_shift), totals)
+
+
+# 二次函数曲线
+def module_d(days, totals, total_days):
+    """
+    二次函数曲线，计算沉降预测的理论累计位移。
+
+    参数:
+        days (array): 各日期距起始日期的天数。
+        totals (array): 各方向总位移，形状 (..., 3)。
+        total_days (int): 起止日期间隔天数。
+
+    返回:
+        ndarray: 理论累计位移，形状 (..., 日期数, 3)。
+    """
+    return scale_basis('ModuleD', basis_d(days, total_days), totals)
+
+
+MODULES = {
+    'ModuleA': module_a,
+    'ModuleB': module_b,
+    'ModuleC': module_c,
+    'ModuleD': module_d,
+}
+
+
+def split_params(module, params):
+    """
+    将曲线参数拆分为形状参数（补全默认值）和缩放参数。
+
+    返回:
+        tuple: (形状参数字典, 缩放参数字典)。
+    """
+    if module not in SHAPE_PARAMS:
+        raise ValueError(f"未知的曲线模块: {module}")
+    shape = dict(SHAPE_PARAMS[module])
+    scale = {}
+    for name, value in params.items():
+        (shape if name in shape else scale)[name] = value
+    missing = [name for name, value in shape.items() if value is None]
+    if missing:
+        raise ValueError(f"{module} 缺少参数: {missing}")
+    return shape, scale
+
+
+def evaluate(module, days, totals, total_days, cache=None, **params):
+    """
+    按模块名计算理论累计位移。
+
+    参数:
+        module (str): 模块名，'ModuleA'、'ModuleB'、'ModuleC' 或 'ModuleD'。
+        days, totals, total_days: 见模块说明。
+        cache (CurveCache): 单位曲线缓存，None 时直接计算。
+        **params: 传给对应模块的曲线参数。
+
+    返回:
+        ndarray: 理论累计位移，形状 (..., 日期数, 3)。
+    """
+    shape, scale = split_params(module, params)
+    if cache is None:
+        basis = BASES[module](days, total_days, **shape)
+    else:
+        basis = cache.basis(module, days, total_days, shape)
+    return scale_basis(module, basis, totals, **scale)
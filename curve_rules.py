@@ -0,0 +1,227 @@
+# -*- coding: utf-8 -*-
+"""
+点名到曲线模块的分配规则。
+
+规则写在 JSON 配置文件中（默认为同目录下的 curve_rules.json），启动时编译一次，
+再按点名生成分派表，批量引擎按表中的 (模块, 参数) 对监测点分组。
+
+配置格式:
+    {
+        "rules": [
+            {
+                "pattern": "^JC(?P<n>\\d+)$",      # 点名正则，命名分组可在 range 和参数表达式中使用
+                "range": {"n": [null, 3]},         # 可选，分组取值的闭区间，null 表示不限
+                "module": "ModuleB",
+                "params": {"ratio1": "0.01 * (71 + n)", "offset": 0.03, ...}
+            },
+            ...
+        ]
+    }
+
+规则按顺序匹配，第一条命中的规则生效。参数可以是数值，也可以是算术表达式字符串，
+表达式中只能使用数字、+ - * / // % **、min/max/abs、命名分组以及
+building_time（施工期占比）和 total_days（起止间隔天数）。
+"""
+import ast
+import hashlib
+import json
+import operator
+import re
+from pathlib import Path
+
+from curve_engine import MODULES
+
+DEFAULT_RULES_PATH = Path(__file__).with_name('curve_rules.json')
+
+# 表达式中可用的全局变量
+EXPRESSION_VARIABLES = ('building_time', 'total_days')
+
+_FUNCTIONS = {'min': min, 'max': max, 'abs': abs}
+
+_BINARY = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+    ast.FloorDiv: operator.floordiv,
+    ast.Mod: operator.mod,
+    ast.Pow: operator.pow,
+}
+
+_UNARY = {
+    ast.UAdd: operator.pos,
+    ast.USub: operator.neg,
+}
+
+
+def compile_expression(text, names):
+    """
+    将参数表达式编译为求值函数。
+
+    参数:
+        text (str): 算术表达式，如 '0.01 * (71 + n)'。
+        names (set): 表达式中允许出现的变量名。
+
+    返回:
+        callable: 接收变量字典、返回数值的函数。
+    """
+    try:
+        tree = ast.parse(text, mode='eval').body
+    except SyntaxError:
+        raise ValueError(f"参数表达式语法错误: {text!r}") from None
+
+    def build(node):
+        if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)) \
+                and not isinstance(node.value, bool):
+            value = node.value
+            return lambda env: value
+        if isinstance(node, ast.Name):
+            if node.id not in names:
+                raise ValueError(f"参数表达式 {text!r} 中的变量 {node.id!r} 未定义，可用变量: {sorted(names)}")
+            name = node.id
+            return lambda env: env[name]
+        if isinstance(node, ast.BinOp) and type(node.op) in _BINARY:
+            op, left, right = _BINARY[type(node.op)], build(node.left), build(node.right)
+            return lambda env: op(left(env), right(env))
+        if isinstance(node, ast.UnaryOp) and type(node.op) in _UNARY:
+            op, operand = _UNARY[type(node.op)], build(node.operand)
+            return lambda env: op(operand(env))
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id in _FUNCTIONS \
+                and not node.keywords:
+            func, args = _FUNCTIONS[node.func.id], [build(arg) for arg in node.args]
+            return lambda env: func(*(arg(env) for arg in args))
+        raise ValueError(f"参数表达式 {text!r} 中包含不支持的语法: {ast.dump(node)}")
+
+    return build(tree)
+
+
+def _group_value(value):
+    # 数字分组按整数参与区间判断和表达式计算
+    return int(value) if value.isdigit() else value
+
+
+class CurveRule:
+    """
+    一条编译后的分配规则。
+
+    参数:
+        pattern (str): 点名正则，须完整匹配点名。
+        module (str): 曲线模块名。
+        params (dict): 参数名 -> 数值或表达式字符串。
+        range (dict): 命名分组 -> [下限, 上限]，闭区间，None 表示不限。
+    """
+
+    def __init__(self, pattern, module, params=None, range=None):
+        if module not in MODULES:
+            raise ValueError(f"未知的曲线模块: {module}，可选 {sorted(MODULES)}")
+        self.pattern = re.compile(pattern)
+        self.module = module
+
+        groups = set(self.pattern.groupindex)
+        self.range = {}
+        for name, bounds in (range or {}).items():
+            if name not in groups:
+                raise ValueError(f"range 中的 {name!r} 不是 {pattern!r} 的命名分组")
+            low, high = bounds
+            self.range[name] = (low, high)
+
+        names = groups | set(EXPRESSION_VARIABLES)
+        self.params = {}
+        for name, value in (params or {}).items():
+            if isinstance(value, str):
+                self.params[name] = compile_expression(value, names)
+            elif isinstance(value, (int, float)) and not isinstance(value, bool):
+                self.params[name] = (lambda constant: lambda env: constant)(value)
+            else:
+                raise ValueError(f"参数 {name!r} 只能是数值或表达式字符串")
+
+    def match(self, point):
+        """点名符合规则时返回命名分组的取值，否则返回 None。"""
+        found = self.pattern.fullmatch(point)
+        if found is None:
+            return None
+        groups = {name: _group_value(value) for name, value in found.groupdict().items() if value is not None}
+        for name, (low, high) in self.range.items():
+            value = groups.get(name)
+            if not isinstance(value, int):
+                return None
+            if (low is not None and value < low) or (high is not None and value > high):
+                return None
+        return groups
+
+    def resolve(self, groups, building_time, total_days):
+        """计算参数表达式，返回参数字典。"""
+        env = dict(groups, building_time=building_time, total_days=total_days)
+        return {name: expression(env) for name, expression in self.params.items()}
+
+
+class CurveRules:
+    """
+    按顺序匹配的分配规则表。
+
+    参数:
+        rules (list): 规则字典列表，格式见模块说明。
+
+    属性:
+        digest (str): 规则内容的摘要，与配置文件的格式和键的顺序无关，增量生成时用来判断规则是否改动。
+    """
+
+    def __init__(self, rules):
+        if not rules:
+            raise ValueError("分配规则不能为空")
+        self.digest = hashlib.sha256(json.dumps(rules, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()
+        self.rules = []
+        for i, rule in enumerate(rules):
+            try:
+                self.rules.append(CurveRule(rule['pattern'], rule['module'], rule.get('params'), rule.get('range')))
+            except KeyError as missing:
+                raise ValueError(f"第 {i + 1} 条规则缺少 {missing}") from None
+
+    @classmethod
+    def from_file(cls, path):
+        with open(path, encoding='utf-8') as f:
+            return cls(json.load(f)['rules'])
+
+    def assign(self, point, building_time, total_days):
+        """
+        根据点名选择曲线模块及参数。
+
+        返回:
+            tuple: (模块名, 参数字典)。
+        """
+        for rule in self.rules:
+            groups = rule.match(point)
+            if groups is not None:
+                return rule.module, rule.resolve(groups, building_time, total_days)
+        raise ValueError(f"点名 {point!r} 没有匹配的曲线分配规则")
+
+    def dispatch(self, points, building_time, total_days):
+        """
+        生成分派表：按 (模块, 参数) 对监测点分组。
+
+        参数:
+            points (list): 点名列表。
+            building_time (float): 施工期占总天数的比例。
+            total_days (int): 起止日期间隔天数。
+
+        返回:
+            dict: (模块名, 排序后的参数元组) -> 点在 points 中的下标列表。
+        """
+        groups = {}
+        for i, point in enumerate(points):
+            module, params = self.assign(point, building_time, total_days)
+            groups.setdefault((module, tuple(sorted(params.items()))), []).append(i)
+        return groups
+
+
+# 每个进程按配置文件路径共用编译结果
+_rules = {}
+
+
+def load_rules(path=None):
+    """读取并编译分配规则，path 为 None 时使用 DEFAULT_RULES_PATH。"""
+    path = Path(path) if path else DEFAULT_RULES_PATH
+    key = str(path.resolve())
+    if key not in _rules:
+        _rules[key] = CurveRules.from_file(path)
+    return _rules[key]
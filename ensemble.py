@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+"""
+蒙特卡洛集合：为每个监测点生成 N 个实现（ModuleB 折点比例偏移、测量噪声和速率调整量各自独立抽取），
+在最前面增加一维实现后一次性向量化计算，输出各日期的累计位移分位数带和速率超限概率。
+
+分位数需要同一个值的全部 N 个实现，因此按监测点分块（每块包含全部实现），块大小由内存上限决定；
+各点的随机数流与分块方式无关，同一种子得到相同结果。
+"""
+import numpy as np
+import pandas as pd
+
+import instrument
+import settings
+from batch_generate import AXES, MEASURE_COLUMNS, add_noise, evaluate_curves, prepare_network
+from curve_cache import get_cache
+from curve_rules import load_rules
+from rate_clamp import MAX_RATES, clamp_rates
+from rng_streams import EnsembleStreams, resolve_seed
+
+DEFAULT_MEMBERS = 1000
+DEFAULT_PERCENTILES = (5, 50, 95)
+# 每块的内存上限（字节）
+DEFAULT_MAX_BYTES = 512 * 2 ** 20
+# 每个 (实现, 点, 日期, 方向) 同时存在的 float64 数组个数的估计（曲线、噪声、调整量、本次位移、累计位移等）
+_ARRAYS_PER_VALUE = 8
+
+
+def band_column(axis, percentile):
+    """累计量分位数列名，如 'X_累计位移(mm)_P5'。"""
+    return f'{MEASURE_COLUMNS[axis][2]}_P{percentile:g}'
+
+
+def exceedance_column(axis):
+    """速率超限概率列名，如 'X_速率超限概率'。"""
+    return f'{axis}_速率超限概率'
+
+
+def chunk_points(n_points, n_members, n_dates, max_bytes=DEFAULT_MAX_BYTES):
+    """
+    按内存上限划分监测点块。
+
+    返回:
+        list: slice 列表，每块至少一个点。
+    """
+    per_point = n_members * n_dates * 3 * 8 * _ARRAYS_PER_VALUE
+    size = max(1, int(max_bytes // per_point))
+    return [slice(lo, min(lo + size, n_points)) for lo in range(0, n_points, size)]
+
+
+def simulate_ensemble(points, totals, days, total_days, building_time, n_members, seed, percentiles=DEFAULT_PERCENTILES,
+                      max_rates=MAX_RATES, cache=None, rules=None):
+    """
+    计算一组监测点的集合统计。
+
+    参数:
+        points (list): 点名列表，长度 P。
+        totals (ndarray): 各点各方向总位移(mm)，形状 (P, 3)。
+        days (ndarray): 各日期距起始日期的天数，形状 (D,)。
+        total_days (int): 起止日期间隔天数。
+        building_time (float): 施工期占总天数的比例。
+        n_members (int): 实现数 N。
+        seed (int): 随机种子。
+        percentiles (tuple): 分位数（0-100）。
+        max_rates (array): 最大速率(mm/d)，形状 (3,) 或 (P, 3)。
+        cache (CurveCache): 单位曲线缓存。
+        rules (CurveRules): 曲线分配规则。
+
+    返回:
+        tuple: (累计位移分位数，形状 (分位数个数, P, D, 3)；速率超限概率，形状 (P, D, 3))。
+               超限概率为限速前的本次位移速率超过 max_rates 的实现所占比例。
+    """
+    streams = EnsembleStreams(seed, points, n_members)
+    base = evaluate_curves(points, totals, days, total_days, building_time, streams, cache=cache, rules=rules)
+    raw = add_noise(base, totals, days, total_days, streams)
+    del base
+
+    # 限速前的速率是否超限
+    interval = np.diff(days, prepend=days[:1])[:, None]
+    max_rates = np.asarray(max_rates, dtype=float)
+    limit = (max_rates[:, None, :] if max_rates.ndim == 2 else max_rates) * interval
+    delta = np.diff(raw, axis=-2, prepend=raw[..., :1, :])
+    exceedance = ((np.abs(delta) > limit) & (interval > 0)).mean(axis=0)
+    del delta
+
+    # 速率限制按 (N * P, D, 3) 计算，逐点限值随实现重复
+    n_points, n_dates = len(points), len(days)
+    if max_rates.ndim == 2:
+        max_rates = np.tile(max_rates, (n_members, 1))
+    cumulative, _, _ = clamp_rates(raw.reshape(-1, n_dates, 3), days,
+                                   streams.adjustments(n_dates).reshape(-1, n_dates, 3), max_rates=max_rates,
+                                   totals=np.tile(totals, (n_members, 1)), total_days=total_days)
+    cumulative = cumulative.reshape(n_members, n_points, n_dates, 3)
+    bands = np.percentile(cumulative, percentiles, axis=0)
+    return bands, exceedance
+
+
+def build_ensemble_frame(points, dates, bands, exceedance, percentiles=DEFAULT_PERCENTILES):
+    """
+    由集合统计构建结果表，行顺序为先日期、后点名。
+
+    返回:
+        DataFrame: 日期、点名，以及各方向的分位数列（band_column）和超限概率列（exceedance_column）。
+    """
+    n_points, n_dates = len(points), len(dates)
+    date_values = pd.to_datetime(pd.Series(dates)).to_numpy().astype('datetime64[D]').astype('datetime64[s]')
+
+    def column(array):
+        # (P, D) -> 日期优先展平
+        return array.T.reshape(-1)
+
+    data = {}
+    for axis, name in enumerate(AXES):
+        for i, percentile in enumerate(percentiles):
+            data[band_column(name, percentile)] = column(bands[i, :, :, axis])
+        data[exceedance_column(name)] = column(exceedance[:, :, axis])
+    frame = pd.DataFrame(data)
+    frame.insert(0, '日期', np.repeat(date_values, n_points))
+    frame.insert(1, '点名', pd.Categorical.from_codes(np.tile(np.arange(n_points), n_dates), categories=points))
+    return frame
+
+
+def generate_ensemble(combined_data, dates, start_date, total_days, building_time, n_members=DEFAULT_MEMBERS,
+                      percentiles=DEFAULT_PERCENTILES, seed=None, cache_dir=None, rules_path=None,
+                      max_rates=MAX_RATES, max_bytes=DEFAULT_MAX_BYTES):
+    """
+    生成全网所有监测点的集合统计。
+
+    参数:
+        combined_data, dates, start_date, total_days, building_time, seed, cache_dir, rules_path:
+            同 batch_generate.generate_network。
+        n_members (int): 每个点的实现数。
+        percentiles (tuple): 累计位移分位数（0-100），默认 P5/P50/P95。
+        max_rates (array): 计算超限概率的最大速率(mm/d)，形状 (3,) 或 (P, 3)（按点名排序后的顺序）。
+        max_bytes (int): 每个点块的内存上限（字节）。
+
+    返回:
+        DataFrame: 按日期、点名排序的集合统计，见 build_ensemble_frame。
+    """
+    if n_members < 1:
+        raise ValueError("n_members 必须为正整数")
+    seed = resolve_seed(seed)
+    points, starts, totals, dates, days = prepare_network(combined_data, dates, start_date)
+    cache, rules = get_cache(cache_dir), load_rules(rules_path)
+    max_rates = np.asarray(max_rates, dtype=float)
+
+    bands = np.empty((len(percentiles), len(points), len(days), 3))
+    exceedance = np.empty((len(points), len(days), 3))
+    for part in chunk_points(len(points), n_members, len(days), max_bytes):
+        with instrument.stage('ensemble', (part.stop - part.start) * len(days) * n_members):
+            bands[:, part], exceedance[part] = simulate_ensemble(
+                points[part], totals[part], days, total_days, building_time, n_members, seed,
+                percentiles=percentiles, max_rates=max_rates[part] if max_rates.ndim == 2 else max_rates,
+                cache=cache, rules=rules)
+    return build_ensemble_frame(points, dates, bands, exceedance, percentiles)
+
+
+def main():
+    from pipeline import load_inputs
+    from writers import write_result
+
+    report = instrument.report_path(settings.REPORT_DIR, 'ensemble', settings.REPORT_FORMAT)
+    with instrument.session(report, trace_memory=settings.TRACE_MEMORY):
+        combined_data, schedule, total_days, building_time = load_inputs(
+            settings.RAW_PATH, settings.START_DATE, settings.END_DATE, settings.BUILDING_DAYS)
+        if settings.STREAMING:
+            from streaming import generate_ensemble_store
+            generate_ensemble_store(combined_data, schedule, settings.START_DATE, total_days, building_time,
+                                    settings.ENSEMBLE_PATH, n_members=settings.ENSEMBLE_MEMBERS,
+                                    percentiles=settings.ENSEMBLE_PERCENTILES, seed=settings.SEED,
+                                    cache_dir=settings.CURVE_CACHE_DIR, rules_path=settings.CURVE_RULES_PATH,
+                                    max_bytes=settings.STREAM_MAX_BYTES)
+            return
+        ensemble_df = generate_ensemble(combined_data, schedule, settings.START_DATE, total_days, building_time,
+                                        n_members=settings.ENSEMBLE_MEMBERS,
+                                        percentiles=settings.ENSEMBLE_PERCENTILES, seed=settings.SEED,
+                                        cache_dir=settings.CURVE_CACHE_DIR, rules_path=settings.CURVE_RULES_PATH)
+        with instrument.stage('write', len(ensemble_df)):
+            write_result(ensemble_df, settings.ENSEMBLE_PATH)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+"""
+增量生成：项目时间表新增日期时，只计算新增的观测期并追加到已有结果。
+
+每次生成后在结果旁保存状态文件（<输出路径>.state.json），记录种子、已生成的日期、
+各点最后一期的累计位移（限速前、后）以及噪声和调整量随机数流的位置。增量运行时从该状态继续，
+结果与包含全部日期的一次性生成一致（仅有浮点舍入差异）。
+
+状态中还记录各点起始坐标和总位移的摘要以及分配规则的摘要，原始数据的起止两期被修订或规则文件改动后，
+增量运行报错，需要全量重新生成，不会在按旧数据生成的结果后追加。
+"""
+import hashlib
+import json
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from batch_generate import build_cumulative, build_frame, prepare_network, simulate
+from curve_cache import get_cache
+from curve_rules import load_rules
+from rate_clamp import clamp_rates
+from rng_streams import NetworkStreams
+from writers import append_result, write_result
+
+# 各点随机数流的派生方式或状态的内容变化时递增，旧状态文件需要全量重新生成
+STATE_VERSION = 3
+
+
+def state_path_for(output_path):
+    """结果对应的状态文件路径。"""
+    output_path = Path(output_path)
+    return output_path.with_name(output_path.name + '.state.json')
+
+
+def inputs_digest(points, starts, totals):
+    """各点点名、起始坐标和总位移的摘要（prepare_network 整理后的顺序）。"""
+    digest = hashlib.sha256('\n'.join(points).encode('utf-8'))
+    for array in (starts, totals):
+        digest.update(np.ascontiguousarray(array, dtype=np.float64).tobytes())
+    return digest.hexdigest()
+
+
+def _make_state(streams, start_date, total_days, building_time, dates, raw, cumulative, inputs, rules):
+    stream_state = streams.get_state(purposes=('noise', 'adjust'))
+    return {
+        'version': STATE_VERSION,
+        'seed': streams.seed,
+        'inputs': inputs,
+        'rules': rules,
+        'start_date': pd.Timestamp(start_date).strftime('%Y-%m-%d'),
+        'total_days': int(total_days),
+        'building_time': float(building_time),
+        'dates': [date.strftime('%Y-%m-%d') for date in dates],
+        'points': {
+            point: {
+                'raw': raw[i, -1].tolist(),
+                'cumulative': cumulative[i, -1].tolist(),
+                'streams': stream_state[point],
+            }
+            for i, point in enumerate(streams.points)
+        },
+    }
+
+
+def load_state(path):
+    with open(path, encoding='utf-8') as f:
+        state = json.load(f)
+    if state.get('version') != STATE_VERSION:
+        raise ValueError(f"状态文件版本不匹配: {path}")
+    return state
+
+
+def save_state(state, path):
+    path = Path(path)
+    tmp = path.with_name(path.name + '.tmp')
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(state, f, ensure_ascii=False)
+    tmp.replace(path)
+
+
+def generate_with_state(combined_data, dates, start_date, total_days, building_time, seed=None, cache_dir=None,
+                        rules_path=None):
+    """
+    全量生成预测结果，同时返回供增量运行继续使用的状态。
+
+    参数同 batch_generate.generate_network。
+
+    返回:
+        tuple: (预测结果, 状态字典)。
+    """
+    points, starts, totals, dates, days = prepare_network(combined_data, dates, start_date)
+    rules = load_rules(rules_path)
+    streams = NetworkStreams(seed, points)
+    cumulative, delta, rate, raw = simulate(points, totals, days, total_days, building_time, streams=streams,
+                                            cache=get_cache(cache_dir), rules=rules, keep_raw=True)
+
+    state = _make_state(streams, start_date, total_days, building_time, dates, raw, cumulative,
+                        inputs_digest(points, starts, totals), rules.digest)
+    return build_frame(points, dates, starts, cumulative, delta, rate), state
+
+
+def generate_increment(combined_data, dates, state, cache_dir=None, rules_path=None):
+    """
+    只计算状态之后新增日期的预测结果。
+
+    参数:
+        combined_data (DataFrame): 同 generate_network，点位须与状态中一致。
+        dates (Series): 完整的项目时间表。
+        state (dict): 上次生成保存的状态。
+        cache_dir (str): 单位曲线缓存的持久化目录。
+        rules_path (str): 曲线分配规则配置文件，须与上次生成时一致。
+
+    返回:
+        tuple: (新增日期的预测结果，无新增日期时为 None, 更新后的状态)。
+    """
+    start_date = pd.Timestamp(state['start_date'])
+    total_days = state['total_days']
+    building_time = state['building_time']
+
+    points, starts, totals, dates, days = prepare_network(combined_data, dates, start_date)
+    if set(points) != set(state['points']):
+        raise ValueError("监测点与上次生成不一致，需要全量重新生成")
+    if inputs_digest(points, starts, totals) != state['inputs']:
+        raise ValueError("各点起始坐标或总位移与上次生成不一致，需要全量重新生成")
+    rules = load_rules(rules_path)
+    if rules.digest != state['rules']:
+        raise ValueError("曲线分配规则与上次生成不一致，需要全量重新生成")
+
+    done = pd.to_datetime(pd.Series(state['dates']))
+    last_date = done.iloc[-1]
+    known = dates.isin(done)
+    if (~known & (dates <= last_date)).any():
+        raise ValueError("新增日期早于上次生成的最后日期，需要全量重新生成")
+    new = (~known).to_numpy()
+    if not new.any():
+        return None, state
+
+    new_dates = dates[new].reset_index(drop=True)
+    new_days = days[new]
+
+    # 从上次的位置继续抽取噪声和调整量；ModuleB 的比例偏移由新建的流重新得到相同的值
+    streams = NetworkStreams(state['seed'], points)
+    streams.set_state({point: state['points'][point]['streams'] for point in points})
+
+    last_raw = np.array([state['points'][point]['raw'] for point in points])
+    last_cumulative = np.array([state['points'][point]['cumulative'] for point in points])
+    last_day = (last_date - start_date).days
+
+    raw = build_cumulative(points, totals, new_days, total_days, building_time, streams, cache=get_cache(cache_dir),
+                           rules=rules)
+    adjustments = streams.adjustments(len(new_days))
+
+    # 以上次最后一期作为第一期，保证新增第一期的本次位移相对上次结果计算
+    raw = np.concatenate([last_raw[:, None, :], raw], axis=1)
+    adjustments = np.concatenate([np.zeros_like(last_raw)[:, None, :], adjustments], axis=1)
+    cumulative, delta, rate = clamp_rates(raw, np.concatenate([[last_day], new_days]), adjustments,
+                                          initial=last_cumulative, totals=totals, total_days=total_days)
+
+    all_dates = pd.concat([done, new_dates], ignore_index=True)
+    new_state = _make_state(streams, start_date, total_days, building_time, all_dates, raw, cumulative,
+                            state['inputs'], state['rules'])
+    new_df = build_frame(points, new_dates, starts, cumulative[:, 1:], delta[:, 1:], rate[:, 1:])
+    return new_df, new_state
+
+
+def update(combined_data, dates, start_date, total_days, building_time, output_path, seed=None, cache_dir=None,
+           rules_path=None, partition_by=None):
+    """
+    增量更新预测结果：没有已有结果或状态文件时全量生成，否则只追加新增日期。
+
+    参数:
+        combined_data, dates, start_date, total_days, building_time, seed, cache_dir, rules_path: 同 generate_network。
+        output_path (str): 结果路径，状态文件保存在其旁边。
+        partition_by (str): Parquet 分区列；按 '日期' 分区时增量只写出新增分区。
+
+    返回:
+        DataFrame: 本次新写出的记录（全量生成时为全部记录，无新增日期时为 None）。
+    """
+    state_path = state_path_for(output_path)
+    if not (state_path.exists() and Path(output_path).exists()):
+        result_df, state = generate_with_state(combined_data, dates, start_date, total_days, building_time,
+                                               seed=seed, cache_dir=cache_dir, rules_path=rules_path)
+        write_result(result_df, output_path, partition_by=partition_by)
+        save_state(state, state_path)
+        return result_df
+
+    state = load_state(state_path)
+    if seed is not None and int(seed) != state['seed']:
+        raise ValueError("随机种子与上次生成不一致，需要全量重新生成")
+    if (state['start_date'] != pd.Timestamp(start_date).strftime('%Y-%m-%d')
+            or state['total_days'] != total_days or not np.isclose(state['building_time'], building_time)):
+        raise ValueError("起止日期或施工期与上次生成不一致，需要全量重新生成")
+
+    new_df, state = generate_increment(combined_data, dates, state, cache_dir=cache_dir, rules_path=rules_path)
+    if new_df is not None:
+        append_result(new_df, output_path, partition_by=partition_by)
+        save_state(state, state_path)
+    return new_df
@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+"""
+原始数据读取：逐行流式读取原始数据，只保留所需观测日期的 点名/X/Y/Z，不把整张表读入内存。
+
+支持 .xlsx/.xlsm（openpyxl 只读模式逐行读取）、.csv（分块读取）和 .parquet（按列、按条件读取）。
+"""
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+
+RAW_COLUMNS = ['日期', '点名', 'X', 'Y', 'Z']
+
+# CSV 分块读取的行数
+CSV_CHUNK_SIZE = 200_000
+
+
+def _to_datetime(value):
+    """将单元格中的日期（datetime 或字符串）转换为 datetime，无法识别时返回 None。"""
+    if isinstance(value, datetime):
+        return value
+    if value is None:
+        return None
+    try:
+        return pd.Timestamp(value).to_pydatetime()
+    except (TypeError, ValueError):
+        return None
+
+
+def _column_index(header, columns):
+    header = [str(name).strip() if name is not None else '' for name in header]
+    missing = [name for name in columns if name not in header]
+    if missing:
+        raise ValueError(f"缺少列: {missing}")
+    return [header.index(name) for name in columns]
+
+
+def _iter_xlsx_rows(path, sheet_name, columns):
+    """逐行读取工作表，只返回指定列的值。"""
+    from openpyxl import load_workbook
+
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = wb[sheet_name].iter_rows(values_only=True)
+        index = _column_index(next(rows, ()), columns)
+        for row in rows:
+            yield [row[i] if i < len(row) else None for i in index]
+    finally:
+        wb.close()
+
+
+def _read_epochs_xlsx(path, dates, sheet_name):
+    targets = None if dates is None else set(dates)
+    records = []
+    for date, point, x, y, z in _iter_xlsx_rows(path, sheet_name, RAW_COLUMNS):
+        date = _to_datetime(date)
+        if date is not None and (targets is None or date in targets) and point is not None:
+            records.append((date, point, x, y, z))
+    return pd.DataFrame.from_records(records, columns=RAW_COLUMNS)
+
+
+def _read_epochs_csv(path, dates):
+    targets = None if dates is None else pd.DatetimeIndex(dates)
+    parts = []
+    for chunk in pd.read_csv(path, usecols=RAW_COLUMNS, chunksize=CSV_CHUNK_SIZE):
+        chunk['日期'] = pd.to_datetime(chunk['日期'])
+        chunk = chunk.dropna(subset=['日期'])
+        parts.append(chunk if targets is None else chunk[chunk['日期'].isin(targets)])
+    if not parts:
+        return pd.DataFrame(columns=RAW_COLUMNS)
+    return pd.concat(parts, ignore_index=True)[RAW_COLUMNS]
+
+
+def _read_epochs_parquet(path, dates):
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError("读取 Parquet 原始数据需要安装 pyarrow") from None
+
+    filters = None if dates is None else [('日期', 'in', list(dates))]
+    table = pq.read_table(path, columns=RAW_COLUMNS, filters=filters)
+    return table.to_pandas()[RAW_COLUMNS].dropna(subset=['日期'])
+
+
+def read_epochs(path, dates, sheet_name='Sheet1'):
+    """
+    读取原始数据中指定观测日期的记录。
+
+    参数:
+        path (str): 原始数据文件，.xlsx/.xlsm、.csv 或 .parquet。
+        dates (list): 需要的观测日期（datetime），None 时读取全部观测期。
+        sheet_name (str): Excel 工作表名，默认为 'Sheet1'。
+
+    返回:
+        DataFrame: 列为 日期、点名、X、Y、Z，只包含指定日期的记录。
+    """
+    if dates is not None:
+        dates = [pd.Timestamp(date).to_pydatetime() for date in dates]
+    suffix = Path(path).suffix.lower()
+    if suffix in ('.xlsx', '.xlsm'):
+        data = _read_epochs_xlsx(path, dates, sheet_name)
+    elif suffix == '.csv':
+        data = _read_epochs_csv(path, dates)
+    elif suffix == '.parquet':
+        data = _read_epochs_parquet(path, dates)
+    else:
+        raise ValueError(f"不支持的原始数据格式: {suffix}")
+
+    data['日期'] = pd.to_datetime(data['日期'])
+    data['点名'] = data['点名'].astype(str).str.strip()
+    data[['X', 'Y', 'Z']] = data[['X', 'Y', 'Z']].astype(float)
+    return data
+
+
+def read_schedule(path, sheet_name='Sheet2', column='项目时间'):
+    """
+    读取项目时间表并排序。
+
+    参数:
+        path (str): 项目时间所在文件，.xlsx/.xlsm、.csv 或 .parquet。
+        sheet_name (str): Excel 工作表名，默认为 'Sheet2'。
+        column (str): 时间列名，默认为 '项目时间'。
+
+    返回:
+        Series: 排序后的项目时间。
+    """
+    suffix = Path(path).suffix.lower()
+    if suffix in ('.xlsx', '.xlsm'):
+        values = [row[0] for row in _iter_xlsx_rows(path, sheet_name, [column])]
+    elif suffix == '.csv':
+        values = pd.read_csv(path, usecols=[column])[column]
+    elif suffix == '.parquet':
+        values = pd.read_parquet(path, columns=[column])[column]
+    else:
+        raise ValueError(f"不支持的项目时间格式: {suffix}")
+
+    schedule = pd.to_datetime(pd.Series(values, name=column)).dropna()
+    return schedule.sort_values().reset_index(drop=True)
+
+
+def combine_epochs(epochs, start_date, end_date):
+    """
+    合并起始和结束两期数据，计算各方向总位移。
+
+    参数:
+        epochs (DataFrame): read_epochs 读出的两期记录，坐标单位为米。
+        start_date (datetime): 起始日期。
+        end_date (datetime): 结束日期。
+
+    返回:
+        DataFrame: 含 点名、X_start/Y_start/Z_start、X_end/Y_end/Z_end、X_total/Y_total/Z_total 列，单位 mm。
+    """
+    epochs = epochs.copy()
+    # 单位转换：米转毫米
+    epochs[['X', 'Y', 'Z']] *= 1000
+
+    start_data = epochs[epochs['日期'] == start_date]
+    end_data = epochs[epochs['日期'] == end_date]
+
+    # 合并起始和结束数据
+    combined_data = pd.merge(start_data, end_data, on='点名', suffixes=('_start', '_end'))
+
+    # 计算各方向总位移
+    for axis in ('X', 'Y', 'Z'):
+        combined_data[f'{axis}_total'] = combined_data[f'{axis}_start'] - combined_data[f'{axis}_end']
+    return combined_data
+
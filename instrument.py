@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+"""
+运行插桩：记录各阶段的耗时（墙钟、CPU）、行数和 tracemalloc 内存峰值，以及曲线模块的调用计数，
+输出 JSON/CSV 运行报告和控制台摘要；可选用 cProfile 记录生成过程。
+
+各模块通过 stage() 和 count() 打点，没有激活的记录器时二者不做任何事，开销可以忽略。
+多进程生成时子进程中的阶段和计数不汇总，只记录主进程中的整体阶段。
+
+用法:
+    with instrument.session('./output/run_report.json', trace_memory=True):
+        ...
+"""
+import cProfile
+import csv
+import itertools
+import json
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+STAGE_FIELDS = ['stage', 'wall_seconds', 'cpu_seconds', 'rows', 'rows_per_second', 'peak_mb']
+
+
+class Recorder:
+    """
+    阶段和计数的记录器。
+
+    参数:
+        trace_memory (bool): 是否用 tracemalloc 记录各阶段的内存峰值（会拖慢纯 Python 部分）。
+    """
+
+    def __init__(self, trace_memory=False):
+        self.trace_memory = trace_memory
+        self.counters = Counter()
+        self.started = datetime.now()
+        self._entries = []
+        self._sequence = itertools.count()
+        self._stack = []
+        self._owns_tracemalloc = False
+
+    @property
+    def stages(self):
+        """各阶段的记录，按开始顺序排列（外层阶段在其内层之前）。"""
+        return [record for _, record in sorted(self._entries, key=lambda entry: entry[0])]
+
+    def start(self):
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._owns_tracemalloc = True
+
+    def stop(self):
+        if self._owns_tracemalloc:
+            tracemalloc.stop()
+            self._owns_tracemalloc = False
+
+    @contextmanager
+    def stage(self, name, rows=None):
+        """
+        记录一个阶段；嵌套阶段的名称以 '/' 连接。阶段结束前才知道行数时，可在 with 块内设置 record['rows']。
+        """
+        path = '/'.join([frame['record']['stage'] for frame in self._stack] + [name])
+        record = {'stage': path, 'rows': rows}
+        frame = {'record': record, 'peak': 0}
+        if self.trace_memory and tracemalloc.is_tracing():
+            # 内层阶段会重置峰值，先把外层到目前为止的峰值记下
+            if self._stack:
+                outer = self._stack[-1]
+                outer['peak'] = max(outer['peak'], tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+        self._stack.append(frame)
+        sequence = next(self._sequence)
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield record
+        finally:
+            record['wall_seconds'] = wall_seconds = time.perf_counter() - wall
+            record['cpu_seconds'] = time.process_time() - cpu
+            record['rows_per_second'] = record['rows'] / wall_seconds if record['rows'] and wall_seconds > 0 else None
+            self._stack.pop()
+            if self.trace_memory and tracemalloc.is_tracing():
+                peak = max(frame['peak'], tracemalloc.get_traced_memory()[1])
+                record['peak_mb'] = peak / 2 ** 20
+                if self._stack:
+                    self._stack[-1]['peak'] = max(self._stack[-1]['peak'], peak)
+            self._entries.append((sequence, record))
+
+    def count(self, name, n=1):
+        self.counters[name] += n
+
+    def report(self):
+        """返回运行报告字典。"""
+        return {
+            'started': self.started.isoformat(timespec='seconds'),
+            'trace_memory': self.trace_memory,
+            'stages': self.stages,
+            'counters': dict(sorted(self.counters.items())),
+        }
+
+    def write_report(self, path):
+        """写出运行报告，.csv 写成阶段表（计数以 'count:名称' 行追加在后），其余写成 JSON。"""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        report = self.report()
+        if path.suffix.lower() == '.csv':
+            with open(path, 'w', encoding='utf-8-sig', newline='') as f:
+                writer = csv.DictWriter(f, fieldnames=STAGE_FIELDS, extrasaction='ignore')
+                writer.writeheader()
+                writer.writerows(report['stages'])
+                for name, value in report['counters'].items():
+                    writer.writerow({'stage': f'count:{name}', 'rows': value})
+        else:
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+
+    def summary(self):
+        """控制台摘要：每个阶段一行，随后为计数。"""
+        report = self.report()
+        # 表头中的汉字占两个字符宽度，宽度按显示对齐
+        lines = [f"{'阶段':<28s}{'墙钟(s)':>8s}{'CPU(s)':>10s}{'行数':>12s}{'峰值(MB)':>10s}"]
+        for record in report['stages']:
+            rows = '' if record['rows'] is None else f"{record['rows']:d}"
+            peak = f"{record['peak_mb']:.1f}" if 'peak_mb' in record else ''
+            lines.append(f"{record['stage']:<30s}{record['wall_seconds']:>10.3f}{record['cpu_seconds']:>10.3f}"
+                         f"{rows:>14s}{peak:>12s}")
+        if report['counters']:
+            lines.append('计数: ' + ', '.join(f'{name}={value}' for name, value in report['counters'].items()))
+        return '\n'.join(lines)
+
+
+# 当前激活的记录器
+_active = None
+
+
+@contextmanager
+def recording(recorder):
+    """在 with 块内激活记录器。"""
+    global _active
+    previous, _active = _active, recorder
+    recorder.start()
+    try:
+        yield recorder
+    finally:
+        recorder.stop()
+        _active = previous
+
+
+@contextmanager
+def stage(name, rows=None):
+    """记录一个阶段，没有激活的记录器时只返回一个空记录。"""
+    if _active is None:
+        yield {'stage': name, 'rows': rows}
+    else:
+        with _active.stage(name, rows=rows) as record:
+            yield record
+
+
+def count(name, n=1):
+    """累加计数，没有激活的记录器时忽略。"""
+    if _active is not None:
+        _active.count(name, n)
+
+
+@contextmanager
+def profiled(path=None):
+    """path 不为 None 时用 cProfile 记录 with 块并保存到 path（可用 pstats 或 snakeviz 查看）。"""
+    if path is None:
+        yield None
+        return
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield profiler
+    finally:
+        profiler.disable()
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        profiler.dump_stats(path)
+
+
+def report_path(directory, name, fmt='json'):
+    """运行报告路径 <directory>/<name>_report.<fmt>，directory 为 None 时返回 None。"""
+    if directory is None:
+        return None
+    if fmt not in ('json', 'csv'):
+        raise ValueError("运行报告格式只能是 'json' 或 'csv'")
+    return Path(directory) / f'{name}_report.{fmt}'
+
+
+@contextmanager
+def session(report_path=None, trace_memory=False, summary=True):
+    """
+    一次运行的插桩：激活新的记录器，结束时打印摘要并写出报告。
+
+    参数:
+        report_path (str): 运行报告路径（.json 或 .csv），None 时不写出。
+        trace_memory (bool): 是否记录内存峰值。
+        summary (bool): 是否在控制台打印摘要。
+    """
+    recorder = Recorder(trace_memory=trace_memory)
+    with recording(recorder):
+        yield recorder
+    if summary:
+        print(recorder.summary())
+    if report_path:
+        recorder.write_report(report_path)
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+"""
+多进程并行生成：将监测点分片交给进程池，子进程只接收各自分片的点名、总位移和共用的日期网格，
+结果按 日期/点名 顺序合并。多个项目共用进程池的调度见 projects.py。
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from batch_generate import build_frame, prepare_network, simulate
+from rng_streams import resolve_seed
+
+
+def split_points(n_points, n_shards):
+    """
+    将 n_points 个监测点划分为至多 n_shards 段连续区间。
+
+    返回:
+        list: slice 列表，按点名顺序排列。
+    """
+    n_shards = max(1, min(n_shards, n_points))
+    bounds = np.linspace(0, n_points, n_shards + 1).astype(int)
+    return [slice(lo, hi) for lo, hi in zip(bounds[:-1], bounds[1:]) if hi > lo]
+
+
+def submit_network(executor, combined_data, dates, start_date, total_days, building_time, shards, seed=None,
+                   cache_dir=None, rules_path=None):
+    """
+    将一个项目按监测点分片提交到进程池。
+
+    参数:
+        executor (Executor): 进程池。
+        combined_data, dates, start_date, total_days, building_time: 同 generate_network。
+        shards (int): 分片数。
+        seed (int): 随机种子，None 时自动生成；各分片使用同一种子，结果与分片方式无关。
+        cache_dir (str): 单位曲线缓存的持久化目录，各进程共用。
+        rules_path (str): 曲线分配规则配置文件，各进程分别读取，None 时使用 curve_rules.json。
+
+    返回:
+        tuple: 交给 collect_network 的任务句柄。
+    """
+    points, starts, totals, dates, days = prepare_network(combined_data, dates, start_date)
+    seed = resolve_seed(seed)
+    futures = [
+        executor.submit(simulate, points[part], totals[part], days, total_days, building_time, seed, cache_dir,
+                        rules_path)
+        for part in split_points(len(points), shards)
+    ]
+    return points, starts, dates, futures
+
+
+def collect_network(job):
+    """
+    等待一个项目的全部分片完成，按点名顺序拼接后构建结果表。
+
+    返回:
+        DataFrame: 按日期、点名排序的预测结果。
+    """
+    points, starts, dates, futures = job
+    parts = [future.result() for future in futures]
+    cumulative, delta, rate = (np.concatenate(arrays, axis=0) for arrays in zip(*parts))
+    return build_frame(points, dates, starts, cumulative, delta, rate)
+
+
+def generate_parallel(combined_data, dates, start_date, total_days, building_time, workers=None, shards=None,
+                      seed=None, cache_dir=None, rules_path=None):
+    """
+    多进程批量生成全网所有监测点的预测数据，结果与 generate_network 的行顺序一致。
+
+    参数:
+        combined_data, dates, start_date, total_days, building_time: 同 generate_network。
+        workers (int): 进程数，默认为 CPU 核数。
+        shards (int): 分片数，默认与进程数相同。
+        seed (int): 随机种子，同一种子的结果与进程数、分片数无关。
+        cache_dir (str): 单位曲线缓存的持久化目录，各进程共用。
+        rules_path (str): 曲线分配规则配置文件，None 时使用 curve_rules.json。
+
+    返回:
+        DataFrame: 按日期、点名排序的预测结果。
+    """
+    workers = workers or os.cpu_count()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        job = submit_network(executor, combined_data, dates, start_date, total_days, building_time,
+                             shards or workers, seed=seed, cache_dir=cache_dir, rules_path=rules_path)
+        return collect_network(job)
+
@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+"""
+预测与成图一体化流程：生成的结果表在内存中直接交给成图透视，每个文件只在最后写出一次，
+不再经过 Excel 写出再读回。多进程生成、增量更新和曲线图只在用到时导入。
+"""
+import instrument
+import settings
+from batch_generate import generate_network
+from charts_data import build_chart_tables, write_chart_workbook
+from ingest import combine_epochs, read_epochs, read_schedule
+from screening import DEFAULT_WINDOW_DAYS, screen_result
+from writers import read_result, write_result
+
+
+def load_inputs(raw_path, start_date, end_date, building_days):
+    """
+    读取原始数据和项目时间表。
+
+    返回:
+        tuple: (combined_data, 排序后的项目时间, 起止间隔天数, 施工期占比)。
+    """
+    total_days = (end_date - start_date).days
+    building_time = building_days / total_days  # 施工期占比
+
+    # 逐行读取Sheet1，只保留起始和结束两期数据，合并后计算各方向总位移(mm)
+    with instrument.stage('ingest') as record:
+        epochs = read_epochs(raw_path, [start_date, end_date])
+        record['rows'] = len(epochs)
+    with instrument.stage('merge', len(epochs)):
+        combined_data = combine_epochs(epochs, start_date, end_date)
+    # 处理Sheet2时间点并排序
+    with instrument.stage('schedule') as record:
+        schedule = read_schedule(raw_path)
+        record['rows'] = len(schedule)
+    return combined_data, schedule, total_days, building_time
+
+
+def generate(raw_path, start_date, end_date, building_days, workers=1, seed=None, cache_dir=None, rules_path=None,
+             profile_path=None):
+    """
+    读取原始数据并生成全网预测结果。
+
+    参数:
+        raw_path (str): 原始数据文件。
+        start_date (datetime): 起始日期。
+        end_date (datetime): 结束日期。
+        building_days (int): 施工期天数。
+        workers (int): 并行进程数，1 表示单进程生成。
+        seed (int): 随机种子，None 时自动生成。
+        cache_dir (str): 单位曲线缓存的持久化目录，None 时只在内存中缓存。
+        rules_path (str): 曲线分配规则配置文件，None 时使用 curve_rules.json。
+        profile_path (str): 生成过程的 cProfile 结果保存路径，None 时不记录。
+
+    返回:
+        DataFrame: 按日期、点名排序的预测结果。
+    """
+    combined_data, schedule, total_days, building_time = load_inputs(raw_path, start_date, end_date, building_days)
+
+    # 批量生成所有监测点的预测数据，结果已按日期和点名排序
+    with instrument.stage('generate', len(combined_data) * len(schedule)), instrument.profiled(profile_path):
+        if workers > 1:
+            from parallel_generate import generate_parallel
+            return generate_parallel(combined_data, schedule, start_date, total_days, building_time,
+                                     workers=workers, seed=seed, cache_dir=cache_dir, rules_path=rules_path)
+        return generate_network(combined_data, schedule, start_date, total_days, building_time, seed=seed,
+                                cache_dir=cache_dir, rules_path=rules_path)
+
+
+def update(raw_path, start_date, end_date, building_days, output_path, seed=None, cache_dir=None, rules_path=None):
+    """
+    增量更新预测结果文件，只计算并追加项目时间表中新增的日期，见 incremental.update。
+
+    返回:
+        DataFrame: 本次新写出的记录，无新增日期时为 None。
+    """
+    import incremental
+
+    combined_data, schedule, total_days, building_time = load_inputs(raw_path, start_date, end_date, building_days)
+    with instrument.stage('update') as record:
+        new_df = incremental.update(combined_data, schedule, start_date, total_days, building_time, output_path,
+                                    seed=seed, cache_dir=cache_dir, rules_path=rules_path)
+        record['rows'] = 0 if new_df is None else len(new_df)
+    return new_df
+
+
+def run_pipeline(raw_path, start_date, end_date, building_days, output_path, chart_path,
+                 excel_path=None, workers=1, seed=None, cache_dir=None, rules_path=None, incremental_mode=False,
+                 profile_path=None, screen_path=None, screen_window_days=DEFAULT_WINDOW_DAYS, render_dir=None,
+                 render_format='png', render_workers=None, chart_result_sheet=False):
+    """
+    生成预测结果并在内存中透视为成图数据，最后一次性写出各文件。
+
+    参数:
+        raw_path, start_date, end_date, building_days, workers, seed, cache_dir, rules_path, profile_path: 同 generate。
+        output_path (str): 预测结果输出路径（.parquet/.arrow/.xlsx）。
+        chart_path (str): 成图数据工作簿路径。
+        excel_path (str): 预测结果的 Excel 导出路径，None 时不导出。
+        incremental_mode (bool): 为 True 时只追加新增日期（见 update），成图数据仍按完整结果生成。
+        screen_path (str): 异常筛查表的输出路径，None 时不筛查，见 screening。
+        screen_window_days (int): 滑动速率的窗口天数。
+        render_dir (str): 曲线图输出目录，None 时不绘制，见 charts_render。
+        render_format (str): 曲线图格式，'png' 或 'svg'。
+        render_workers (int): 绘图进程数，None 为 CPU 核数。
+        chart_result_sheet (bool): 为 True 时成图数据工作簿的 Sheet1 附带完整的预测结果。
+
+    返回:
+        tuple: (预测结果, 成图数据字典)。
+    """
+    if incremental_mode:
+        update(raw_path, start_date, end_date, building_days, output_path, seed=seed, cache_dir=cache_dir,
+               rules_path=rules_path)
+        with instrument.stage('read') as record:
+            result_df = read_result(output_path)
+            record['rows'] = len(result_df)
+    else:
+        result_df = generate(raw_path, start_date, end_date, building_days, workers=workers, seed=seed,
+                             cache_dir=cache_dir, rules_path=rules_path, profile_path=profile_path)
+        with instrument.stage('write', len(result_df)):
+            write_result(result_df, output_path)
+    tables = export_results(result_df, chart_path, excel_path=excel_path, screen_path=screen_path,
+                            screen_window_days=screen_window_days, render_dir=render_dir,
+                            render_format=render_format, render_workers=render_workers,
+                            chart_result_sheet=chart_result_sheet)
+    return result_df, tables
+
+
+def export_results(result_df, chart_path=None, excel_path=None, screen_path=None,
+                   screen_window_days=DEFAULT_WINDOW_DAYS, render_dir=None, render_format='png', render_workers=None,
+                   chart_result_sheet=False):
+    """
+    由内存中的预测结果写出成图数据、异常筛查表、Excel 导出和曲线图。
+
+    参数:
+        result_df (DataFrame): 预测结果。
+        chart_path (str): 成图数据工作簿路径，None 时不写出。
+        excel_path, screen_path, screen_window_days, render_dir, render_format, render_workers, chart_result_sheet:
+            同 run_pipeline。
+
+    返回:
+        dict: 成图数据，不需要透视时为 None。
+    """
+    tables = None
+    if chart_path or render_dir:
+        with instrument.stage('pivot', len(result_df)):
+            tables = build_chart_tables(result_df)
+
+    if screen_path:
+        screen_result(result_df, screen_path, window_days=screen_window_days)
+    if excel_path:
+        with instrument.stage('excel', len(result_df)):
+            write_result(result_df, excel_path)
+    if chart_path:
+        with instrument.stage('chart', len(result_df)):
+            write_chart_workbook(chart_path, tables, result_df if chart_result_sheet else None)
+    if render_dir:
+        from charts_render import render_charts
+        render_charts(tables, render_dir, fmt=render_format, workers=render_workers)
+    return tables
+
+
+def main():
+    report = instrument.report_path(settings.REPORT_DIR, 'pipeline', settings.REPORT_FORMAT)
+    with instrument.session(report, trace_memory=settings.TRACE_MEMORY):
+        run_pipeline(settings.RAW_PATH, settings.START_DATE, settings.END_DATE, settings.BUILDING_DAYS,
+                     settings.OUTPUT_PATH, settings.CHART_PATH, excel_path=settings.EXCEL_PATH,
+                     workers=settings.WORKERS, seed=settings.SEED, cache_dir=settings.CURVE_CACHE_DIR,
+                     rules_path=settings.CURVE_RULES_PATH, incremental_mode=settings.INCREMENTAL,
+                     profile_path=settings.PROFILE_PATH, screen_path=settings.SCREEN_PATH,
+                     screen_window_days=settings.SCREEN_WINDOW_DAYS, render_dir=settings.RENDER_DIR,
+                     render_format=settings.RENDER_FORMAT, render_workers=settings.RENDER_WORKERS,
+                     chart_result_sheet=settings.CHART_RESULT_SHEET)
+
+
+# 多进程生成时子进程会重新导入本模块，主流程只在直接运行时执行
+if __name__ == '__main__':
+    main()
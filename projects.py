@@ -0,0 +1,348 @@
+# -*- coding: utf-8 -*-
+"""
+多项目批量运行：按项目清单依次读取各项目的原始数据，在同一个进程池中调度各项目的生成和成图，
+并按内存上限控制同时运行的项目，最后汇总各项目的耗时。
+
+清单为 JSON 文件（默认为同目录下的 projects.json）:
+    {
+        "defaults": {                                   # 可选，各项目的默认值
+            "output_path": "./output/{name}/预测数据.parquet",
+            "chart_path": "./output/{name}/成图数据.xlsx"
+        },
+        "projects": [
+            {
+                "name": "花垣",
+                "raw_path": "./data/花垣沉降原始数据_汇总_0512.xlsx",
+                "start_date": "2024-10-14",
+                "end_date": "2025-05-13",
+                "building_days": 98
+            },
+            ...
+        ]
+    }
+
+路径中的 {name} 替换为项目名，相对路径相对于清单所在目录。可用的键见 PROJECT_KEYS。
+
+调度分两步：先在进程池中读取各项目的原始数据，得到点数和日期数后估计生成和成图的内存峰值，
+再在已占用的估计内存加上该项目不超过内存上限时提交生成任务（没有其他项目运行时总是提交）。
+单个项目的估计超过内存上限时改用分块生成（见 streaming，增量项目除外），写出时逐块筛查，成图时只读回
+累计量列，预留的内存按分块和成图实际占用估计（见 plan_memory）。
+某个项目失败不影响其他项目，失败原因记录在汇总中。
+"""
+import argparse
+import json
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import datetime
+from pathlib import Path
+
+import incremental
+import instrument
+import settings
+from batch_generate import generate_network
+from charts_data import CHART_SHEETS
+from pipeline import export_results, load_inputs
+from rng_streams import resolve_seed
+from screening import DEFAULT_WINDOW_DAYS, concat_exceptions, screen_chunks, write_exceptions
+from streaming import DEFAULT_MAX_BYTES, iter_network, write_store
+from writers import read_result, write_result
+
+DEFAULT_MANIFEST_PATH = Path(__file__).with_name('projects.json')
+
+# 项目的键及默认值（None 表示必须给出）
+PROJECT_KEYS = {
+    'name': None,
+    'raw_path': None,
+    'start_date': None,
+    'end_date': None,
+    'building_days': None,
+    'output_path': None,
+    'chart_path': None,
+    'excel_path': None,
+    'screen_path': None,
+    'screen_window_days': DEFAULT_WINDOW_DAYS,
+    'render_dir': None,
+    'render_format': 'png',
+    'rules_path': None,
+    'seed': None,
+    'incremental': False,
+}
+_REQUIRED = ('name', 'raw_path', 'start_date', 'end_date', 'building_days', 'output_path')
+_PATH_KEYS = ('raw_path', 'output_path', 'chart_path', 'excel_path', 'screen_path', 'render_dir', 'rules_path')
+
+# 每个 (点, 日期) 在生成、写出、筛查和成图工作簿写出时的内存峰值估计（字节，由 tracemalloc 实测）
+BYTES_PER_ROW = 800
+# 分块生成时，每个 (点, 日期) 读回成图列、透视并写出成图工作簿的内存峰值估计（字节，由 tracemalloc 实测）
+CHART_BYTES_PER_ROW = 200
+# 默认内存上限（字节）
+DEFAULT_MEMORY_BUDGET = 4 * 2 ** 30
+
+
+def _resolve_project(entry, defaults, base):
+    project = dict(PROJECT_KEYS)
+    project.update(defaults)
+    project.update(entry)
+    unknown = sorted(set(project) - set(PROJECT_KEYS))
+    if unknown:
+        raise ValueError(f"项目 {project.get('name')!r} 中有未知的键: {unknown}")
+    missing = [key for key in _REQUIRED if project[key] is None]
+    if missing:
+        raise ValueError(f"项目 {project.get('name')!r} 缺少 {missing}")
+
+    name = str(project['name'])
+    for key in _PATH_KEYS:
+        if project[key] is not None:
+            path = Path(str(project[key]).format(name=name))
+            project[key] = str(path if path.is_absolute() else base / path)
+    for key in ('start_date', 'end_date'):
+        try:
+            project[key] = datetime.strptime(str(project[key]), '%Y-%m-%d')
+        except ValueError:
+            raise ValueError(f"项目 {name!r} 的 {key} 不是 YYYY-MM-DD 格式的日期: {project[key]!r}") from None
+    if project['end_date'] <= project['start_date']:
+        raise ValueError(f"项目 {name!r} 的结束日期必须晚于起始日期")
+    project['name'] = name
+    return project
+
+
+def load_manifest(path=None):
+    """
+    读取项目清单。
+
+    参数:
+        path (str): 清单文件，None 时使用 DEFAULT_MANIFEST_PATH。
+
+    返回:
+        list: 各项目的参数字典，键见 PROJECT_KEYS，日期已转换为 datetime，路径已展开。
+    """
+    path = Path(path) if path else DEFAULT_MANIFEST_PATH
+    with open(path, encoding='utf-8') as f:
+        manifest = json.load(f)
+    defaults = manifest.get('defaults', {})
+    projects = [_resolve_project(entry, defaults, path.parent) for entry in manifest.get('projects', [])]
+    if not projects:
+        raise ValueError(f"项目清单中没有项目: {path}")
+    names = [project['name'] for project in projects]
+    duplicated = sorted({name for name in names if names.count(name) > 1})
+    if duplicated:
+        raise ValueError(f"项目名重复: {duplicated}")
+    return projects
+
+
+def estimate_bytes(n_points, n_dates):
+    """一个项目生成和成图的内存峰值估计（字节）。"""
+    return n_points * n_dates * BYTES_PER_ROW
+
+
+def plan_memory(project, n_points, n_dates, memory_budget):
+    """
+    确定一个项目的运行方式和需要预留的内存。
+
+    估计不超过内存上限时整体生成，预留 estimate_bytes；否则分块生成（增量项目除外），每块不超过
+    streaming.DEFAULT_MAX_BYTES 和内存上限的一半，预留一块的内存加上读回成图列后成图的内存。
+
+    返回:
+        tuple: (每块的内存上限，整体生成时为 None, 预留的内存（字节）)。
+    """
+    estimate = estimate_bytes(n_points, n_dates)
+    # 增量项目的结果须保持原有文件格式，不改为分块生成
+    if estimate <= memory_budget or project['incremental']:
+        return None, estimate
+    chunk_bytes = min(DEFAULT_MAX_BYTES, memory_budget // 2)
+    charts = project['chart_path'] or project['render_dir']
+    return chunk_bytes, chunk_bytes + (n_points * n_dates * CHART_BYTES_PER_ROW if charts else 0)
+
+
+def ingest_project(project):
+    """
+    子进程中读取一个项目的原始数据。
+
+    返回:
+        tuple: (combined_data, 项目时间, 起止间隔天数, 施工期占比, 耗时(秒))。
+    """
+    started = time.perf_counter()
+    inputs = load_inputs(project['raw_path'], project['start_date'], project['end_date'], project['building_days'])
+    return inputs + (time.perf_counter() - started,)
+
+
+def run_project(project, inputs, cache_dir=None, max_bytes=None):
+    """
+    子进程中生成一个项目的预测结果并写出各文件。
+
+    参数:
+        project (dict): 项目参数，见 load_manifest。
+        inputs (tuple): ingest_project 读出的 (combined_data, 项目时间, 起止间隔天数, 施工期占比)。
+        cache_dir (str): 单位曲线缓存的持久化目录，各项目共用。
+        max_bytes (int): 不为 None 时分块生成，每块的内存上限（字节）。
+
+    返回:
+        dict: 该项目的运行报告，见 instrument.Recorder.report。
+    """
+    combined_data, schedule, total_days, building_time = inputs
+    for key in ('output_path', 'chart_path', 'excel_path', 'screen_path'):
+        if project[key]:
+            Path(project[key]).parent.mkdir(parents=True, exist_ok=True)
+
+    recorder = instrument.Recorder()
+    with instrument.recording(recorder):
+        args = (combined_data, schedule, project['start_date'], total_days, building_time)
+        if max_bytes is not None:
+            # 分块生成，写出时逐块筛查，成图时只读回日期、点名和累计量列
+            frames = iter_network(*args, seed=project['seed'], cache_dir=cache_dir, rules_path=project['rules_path'],
+                                  max_bytes=max_bytes)
+            exceptions = []
+            if project['screen_path']:
+                frames = screen_chunks(frames, exceptions, window_days=project['screen_window_days'])
+            write_store(frames, project['output_path'])
+            if project['screen_path']:
+                exceptions = concat_exceptions(exceptions)
+                with instrument.stage('exceptions', len(exceptions)):
+                    write_exceptions(exceptions, project['screen_path'])
+            result_df = None
+            if project['chart_path'] or project['render_dir']:
+                with instrument.stage('read') as record:
+                    result_df = read_result(project['output_path'], columns=['日期', '点名'] + list(CHART_SHEETS.values()))
+                    record['rows'] = len(result_df)
+        elif project['incremental']:
+            with instrument.stage('update'):
+                incremental.update(*args, project['output_path'], seed=project['seed'], cache_dir=cache_dir,
+                                   rules_path=project['rules_path'])
+            with instrument.stage('read') as record:
+                result_df = read_result(project['output_path'])
+                record['rows'] = len(result_df)
+        else:
+            with instrument.stage('generate', len(combined_data) * len(schedule)):
+                result_df = generate_network(*args, seed=project['seed'], cache_dir=cache_dir,
+                                             rules_path=project['rules_path'])
+            with instrument.stage('write', len(result_df)):
+                write_result(result_df, project['output_path'])
+
+        if result_df is not None:
+            chunked = max_bytes is not None
+            export_results(result_df, project['chart_path'], excel_path=None if chunked else project['excel_path'],
+                           screen_path=None if chunked else project['screen_path'],
+                           screen_window_days=project['screen_window_days'],
+                           render_dir=project['render_dir'], render_format=project['render_format'],
+                           render_workers=1)
+    return recorder.report()
+
+
+def run_projects(projects, workers=None, memory_budget=DEFAULT_MEMORY_BUDGET, cache_dir=None):
+    """
+    在同一个进程池中运行多个项目。
+
+    参数:
+        projects (list): 项目参数列表，见 load_manifest。
+        workers (int): 进程数，默认为 CPU 核数。
+        memory_budget (int): 同时运行的项目估计内存之和的上限（字节）。
+        cache_dir (str): 单位曲线缓存的持久化目录，各项目共用。
+
+    返回:
+        list: 与 projects 顺序对应的汇总字典：name、status、seed、points、dates、estimated_mb、mode、
+              ingest_seconds、wait_seconds、run_seconds、error，完成的项目另含运行报告 'report'。
+    """
+    workers = workers or os.cpu_count()
+    summaries = [{'name': project['name'], 'status': 'pending', 'error': None} for project in projects]
+    # 各项目使用同一种子时结果可复现，未指定时在这里确定，便于记录
+    projects = [dict(project, seed=resolve_seed(project['seed'])) for project in projects]
+    for summary, project in zip(summaries, projects):
+        summary['seed'] = project['seed']
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        started = {}
+        running = {}
+        ready = []
+        used = 0
+        for i, project in enumerate(projects):
+            future = executor.submit(ingest_project, project)
+            running[future] = ('ingest', i, 0)
+            started[future] = time.perf_counter()
+
+        while running:
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                kind, i, reserved = running.pop(future)
+                summary = summaries[i]
+                elapsed = time.perf_counter() - started.pop(future)
+                used -= reserved
+                try:
+                    result = future.result()
+                except Exception as error:
+                    summary.update(status='failed', error=f'{type(error).__name__}: {error}')
+                    summary[f'{kind}_seconds'] = elapsed
+                    continue
+                if kind == 'ingest':
+                    *inputs, seconds = result
+                    combined_data, schedule = inputs[0], inputs[1]
+                    chunk_bytes, reserved = plan_memory(projects[i], len(combined_data), len(schedule), memory_budget)
+                    summary.update(ingest_seconds=seconds, points=len(combined_data), dates=len(schedule),
+                                   estimated_mb=reserved / 2 ** 20)
+                    ready.append((i, tuple(inputs), chunk_bytes, reserved, time.perf_counter()))
+                else:
+                    summary.update(status='done', run_seconds=elapsed, report=result)
+
+            # 按清单顺序提交内存上限以内的项目；没有项目在运行时至少提交一个
+            for item in list(ready):
+                i, inputs, chunk_bytes, reserved, queued = item
+                if running and used + reserved > memory_budget:
+                    continue
+                ready.remove(item)
+                summary = summaries[i]
+                summary.update(status='running', mode='memory' if chunk_bytes is None else 'chunked',
+                               wait_seconds=time.perf_counter() - queued)
+                future = executor.submit(run_project, projects[i], inputs, cache_dir, chunk_bytes)
+                running[future] = ('run', i, reserved)
+                started[future] = time.perf_counter()
+                used += reserved
+    return summaries
+
+
+def format_summary(summaries):
+    """控制台汇总：每个项目一行。"""
+    lines = [f"{'项目':<18s}{'状态':<6s}{'点数':>6s}{'日期数':>7s}{'估计(MB)':>10s}{'读取(s)':>9s}{'等待(s)':>9s}{'运行(s)':>9s}"]
+    for summary in summaries:
+        def number(key, fmt):
+            value = summary.get(key)
+            return '' if value is None else format(value, fmt)
+        lines.append(f"{summary['name']:<20s}{summary['status']:<8s}{number('points', 'd'):>8s}"
+                     f"{number('dates', 'd'):>10s}{number('estimated_mb', '.1f'):>12s}"
+                     f"{number('ingest_seconds', '.2f'):>11s}{number('wait_seconds', '.2f'):>11s}"
+                     f"{number('run_seconds', '.2f'):>11s}")
+        if summary['error']:
+            lines.append(f"    {summary['error']}")
+    return '\n'.join(lines)
+
+
+def write_summary(summaries, path):
+    """写出汇总 JSON，含各项目的阶段耗时。"""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'started': datetime.now().isoformat(timespec='seconds'), 'projects': summaries}, f,
+                  ensure_ascii=False, indent=2, default=str)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='多项目批量生成沉降预测数据和成图数据')
+    parser.add_argument('manifest', nargs='?', default=settings.PROJECTS_MANIFEST, help='项目清单 JSON 文件')
+    parser.add_argument('--workers', type=int, default=settings.PROJECT_WORKERS, help='进程数，默认为 CPU 核数')
+    parser.add_argument('--memory-budget', type=float, default=settings.PROJECT_MEMORY_BUDGET_MB,
+                        help='同时运行的项目估计内存之和的上限(MB)')
+    args = parser.parse_args()
+
+    projects = load_manifest(args.manifest)
+    started = time.perf_counter()
+    summaries = run_projects(projects, workers=args.workers, memory_budget=int(args.memory_budget * 2 ** 20),
+                             cache_dir=settings.CURVE_CACHE_DIR)
+    print(format_summary(summaries))
+    print(f'共 {len(summaries)} 个项目，失败 {sum(s["status"] == "failed" for s in summaries)} 个，'
+          f'总耗时 {time.perf_counter() - started:.1f}s')
+    report = instrument.report_path(settings.REPORT_DIR, 'projects', 'json')
+    if report:
+        write_summary(summaries, report)
+
+
+# 子进程会重新导入本模块，主流程只在直接运行时执行
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""
+速率限制后处理：对全网累计位移矩阵按期计算本次位移并按最大速率截断，重建累计位移。
+
+截断：每期的本次位移取原始曲线相对上一期截断后取值的差，超过 最大速率 * 间隔天数 时按限值移动
+（减去随机调整量），被截掉的位移留到之后速率有余量的期次补上，截断后的曲线始终追赶原始曲线。
+与上一期同一天的记录间隔为 0，本次位移和速率均为 0。
+
+锚定：给出观测总位移和起止间隔天数时，第 t 期的累计位移还限制在
+    总位移 ± 最大速率 * max(起止间隔天数 - 天数, 0)
+的范围内，即按最大速率仍能在结束日期到达总位移。离结束日期较远时该范围很宽，不起作用；
+接近结束日期时范围收窄，曲线被拉向总位移（每期仍不超过限值），结束日期及之后等于观测总位移。
+总位移超出 最大速率 * 起止间隔天数 时无法到达，结束日期的取值为按限值能到达的最接近的值。
+
+每期只依赖上一期的结果和日历天数，与日期网格中之后有哪些日期无关，增量追加与全量生成一致。
+回归检查见 test_rate_clamp.py。
+"""
+import numpy as np
+
+# 确保速率不超过x,y,z的最大值(mm/d)
+MAX_RATES = np.array([1.444823, 1.789352, 1.977057])
+
+
+def clamp_rates(cumulative, days, adjustments=None, max_rates=MAX_RATES, initial=None, totals=None, total_days=None):
+    """
+    计算本次位移和位移速率，将超过最大速率的本次位移调整到限值以内，并重建累计位移。
+
+    本次位移为原始累计位移与上一期截断后累计位移之差；超限时调整为 ±(max_rate * 间隔天数 - 随机调整量)，
+    未补上的部分在之后的期次继续追赶原始曲线。第一期以及与上一期同一天的记录，本次位移和速率均为0。
+    给出 totals 和 total_days 时，第 t 期的累计位移限制在 总位移 ± max_rate * (total_days - 天数) 以内
+    （必要时不做随机调整，按限值移动），结束日期及之后等于总位移；总位移超出全程速率上限时尽量接近。
+
+    参数:
+        cumulative (ndarray): 累计位移，形状 (P, D, 3)。
+        days (ndarray): 各日期距起始日期的天数，形状 (D,)。
+        adjustments (ndarray): 各期随机调整量，形状 (P, D, 3)，仅在超限处使用；None 时不做调整，直接取限值。
+        max_rates (array): 最大速率(mm/d)，形状 (3,) 为各方向统一限值，形状 (P, 3) 为逐点限值。
+        initial (ndarray): 第一期的累计位移，形状 (P, 3)，None 时取 cumulative 的第一期；
+                           增量计算时传入上次结果最后一期的累计位移。
+        totals (ndarray): 各点各方向的观测总位移，形状 (P, 3)，None 时不固定结束日期的取值。
+        total_days (int): 起止间隔天数，与 totals 一起给出。
+
+    返回:
+        tuple: (累计位移, 本次位移, 位移速率)，形状均为 (P, D, 3)。
+    """
+    cumulative = np.asarray(cumulative, dtype=float)
+    days = np.asarray(days)
+    max_rates = np.asarray(max_rates, dtype=float)
+    if max_rates.ndim == 2:
+        max_rates = max_rates[:, None, :]
+
+    interval = np.diff(days, prepend=days[:1])[None, :, None]
+    limit = np.broadcast_to(max_rates * interval, cumulative.shape)
+    # 超限时实际移动的距离
+    moved = limit if adjustments is None else np.maximum(limit - adjustments, 0.0)
+    anchored = totals is not None and total_days is not None
+    if anchored:
+        totals = np.asarray(totals, dtype=float)
+        # 各期到结束日期为止按最大速率最多还能移动的距离
+        reach = np.broadcast_to(max_rates * np.maximum(total_days - days, 0)[None, :, None], cumulative.shape)
+
+    result = np.empty_like(cumulative)
+    result[:, 0] = cumulative[:, 0] if initial is None else np.asarray(initial, dtype=float)
+    for t in range(1, len(days)):
+        previous = result[:, t - 1]
+        wanted = cumulative[:, t]
+        if anchored:
+            wanted = np.clip(wanted, totals - reach[:, t], totals + reach[:, t])
+        step = wanted - previous
+        step = np.where(np.abs(step) > limit[:, t], np.sign(step) * moved[:, t], step)
+        current = previous + step
+        if anchored:
+            # 随机调整后到不了结束日期时按限值移动
+            current = np.clip(np.clip(current, totals - reach[:, t], totals + reach[:, t]),
+                              previous - limit[:, t], previous + limit[:, t])
+        result[:, t] = current
+
+    delta = np.diff(result, axis=1, prepend=result[:, :1, :])
+    rate = np.divide(delta, interval, out=np.zeros_like(delta), where=interval != 0)
+    return result, delta, rate
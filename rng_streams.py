@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+"""
+可复现、可并行的随机数流。
+
+每个监测点由 (种子, 点名) 派生独立的 SeedSequence，再按用途、按方向 spawn 子流:
+    curve:  ModuleB 折点比例的随机偏移
+    noise:  测量噪声
+    adjust: 速率超限时的随机调整量
+随机数只与种子和点名有关，与点的排列、分片方式和进程数无关，同一种子总是得到相同结果。
+
+蒙特卡洛集合（EnsembleStreams）使用各点 SeedSequence 的另一个子流，不影响单次生成的结果。
+"""
+import hashlib
+
+import numpy as np
+
+STREAMS = ('curve', 'noise', 'adjust')
+
+
+def resolve_seed(seed=None):
+    """seed 为 None 时生成一个新的随机种子，返回整数种子，便于记录和传给子进程。"""
+    if seed is None:
+        return np.random.SeedSequence().entropy
+    return int(seed)
+
+
+def point_key(point):
+    """点名的 SHA-256 摘要拆成 8 个 uint32，作为该点的 spawn_key；不同点名实际上不会得到相同的流。"""
+    digest = hashlib.sha256(str(point).encode('utf-8')).digest()
+    return tuple(int(word) for word in np.frombuffer(digest, dtype='<u4'))
+
+
+def point_seed_sequence(seed, point):
+    """由种子和点名派生该点的 SeedSequence。"""
+    return np.random.SeedSequence(seed, spawn_key=point_key(point))
+
+
+class NetworkStreams:
+    """
+    一组监测点的随机数流，每个点、每种用途、每个方向各一个 numpy.random.Generator。
+
+    参数:
+        seed (int): 随机种子，None 时自动生成。
+        points (list): 点名列表。
+    """
+
+    def __init__(self, seed, points):
+        self.seed = resolve_seed(seed)
+        self.points = list(points)
+        self._generators = {purpose: [] for purpose in STREAMS}
+        for point in self.points:
+            for purpose, child in zip(STREAMS, self._point_sequence(point).spawn(len(STREAMS))):
+                self._generators[purpose].append([np.random.Generator(np.random.PCG64(axis))
+                                                  for axis in child.spawn(3)])
+
+    def _point_sequence(self, point):
+        return point_seed_sequence(self.seed, point)
+
+    def _draw(self, purpose, method, size, **kwargs):
+        # 按点、按方向从各自的流中成批抽取，返回形状 (P, 3) + size 的数组
+        out = np.empty((len(self.points), 3) + tuple(size))
+        for i, axes in enumerate(self._generators[purpose]):
+            for axis, generator in enumerate(axes):
+                out[i, axis] = getattr(generator, method)(size=size, **kwargs)
+        return out
+
+    def ratio_jitter(self):
+        """ModuleB 两个比例的随机偏移系数，取值 [-1, 1)，形状 (P, 3, 2)。"""
+        return self._draw('curve', 'uniform', (2,), low=-1.0, high=1.0)
+
+    def noise(self, n_dates):
+        """标准正态噪声，形状 (P, 日期数, 3)。"""
+        return self._draw('noise', 'standard_normal', (n_dates,)).transpose(0, 2, 1)
+
+    def adjustments(self, n_dates):
+        """速率超限时的随机调整量 |N(0.2, 0.2)|，形状 (P, 日期数, 3)。"""
+        return np.abs(self._draw('adjust', 'normal', (n_dates,), loc=0.2, scale=0.2)).transpose(0, 2, 1)
+
+    def get_state(self, purposes=STREAMS):
+        """
+        导出各流当前的位置，可保存为 JSON，之后用 set_state 从该位置继续抽取。
+
+        返回:
+            dict: 点名 -> 用途 -> 三个方向的 bit_generator 状态。
+        """
+        return {
+            point: {purpose: [generator.bit_generator.state for generator in self._generators[purpose][i]]
+                    for purpose in purposes}
+            for i, point in enumerate(self.points)
+        }
+
+    def set_state(self, state):
+        """恢复 get_state 导出的状态；state 中没有的点或用途保持不变。"""
+        for i, point in enumerate(self.points):
+            for purpose, axes in state.get(point, {}).items():
+                for generator, axis_state in zip(self._generators[purpose][i], axes):
+                    generator.bit_generator.state = axis_state
+
+
+class EnsembleStreams(NetworkStreams):
+    """
+    蒙特卡洛集合的随机数流，每次为每个点抽取 n_members 个实现，返回值最前面多出一维实现。
+
+    各点的流从该点 SeedSequence 的第 len(STREAMS) 个子流派生，与 NetworkStreams 的流互不重叠；
+    结果只与种子、点名和实现数有关，与点的分块方式无关。
+
+    参数:
+        seed (int): 随机种子，None 时自动生成。
+        points (list): 点名列表。
+        n_members (int): 实现数 N。
+    """
+
+    def __init__(self, seed, points, n_members):
+        self.n_members = n_members
+        super().__init__(seed, points)
+
+    def _point_sequence(self, point):
+        return point_seed_sequence(self.seed, point).spawn(len(STREAMS) + 1)[-1]
+
+    def ratio_jitter(self):
+        """ModuleB 两个比例的随机偏移系数，形状 (N, P, 3, 2)。"""
+        return self._draw('curve', 'uniform', (self.n_members, 2), low=-1.0, high=1.0).transpose(2, 0, 1, 3)
+
+    def noise(self, n_dates):
+        """标准正态噪声，形状 (N, P, 日期数, 3)。"""
+        return self._draw('noise', 'standard_normal', (self.n_members, n_dates)).transpose(2, 0, 3, 1)
+
+    def adjustments(self, n_dates):
+        """速率超限时的随机调整量，形状 (N, P, 日期数, 3)。"""
+        draws = self._draw('adjust', 'normal', (self.n_members, n_dates), loc=0.2, scale=0.2)
+        return np.abs(draws).transpose(2, 0, 3, 1)
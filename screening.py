@@ -0,0 +1,252 @@
+# -*- coding: utf-8 -*-
+"""
+生成结果的异常筛查：将全网的累计位移、本次位移和速率排成 (点数, 日期数, 3) 的矩阵，一次向量化扫描，
+标出以下异常，连续的异常日期合并为一行，输出紧凑的异常表:
+    速率超限:     单期速率绝对值超过最大速率
+    滑动速率超限: 最近 window_days 天的平均速率绝对值超过最大速率
+    反向位移:     本次位移与总体位移方向相反，且超出测量噪声
+    累计回退:     累计位移从此前的峰值（按总体方向）回退，且超出测量噪声
+    突变:         本次位移偏离前后相邻各期本次位移的中位数，且超出测量噪声
+
+测量噪声的标准差为总位移的 NOISE_RATIO 倍（见 batch_generate.add_noise），
+与噪声有关的判定以相邻两期之差的噪声标准差 sqrt(2) * NOISE_RATIO * |总位移| 为单位；
+速率限制会把超出限值的噪声累积成缓慢的游走，累计回退的阈值因此取得比单期判定宽。
+各点的判定互不相关，分块生成时可以逐块筛查后拼接。
+"""
+import warnings
+
+import numpy as np
+import pandas as pd
+
+import instrument
+import settings
+from batch_generate import AXES, MEASURE_COLUMNS, NOISE_RATIO, point_sort_key
+from rate_clamp import MAX_RATES
+from writers import detect_format, format_dates, read_result, write_result
+
+# 异常表的列
+EXCEPTION_COLUMNS = ['点名', '方向', '检查项', '开始日期', '结束日期', '期数', '最大值', '限值']
+
+CHECKS = ('速率超限', '滑动速率超限', '反向位移', '累计回退', '突变')
+
+# 滑动速率的窗口天数
+DEFAULT_WINDOW_DAYS = 7
+# 各项判定的噪声倍数：超过相邻两期之差噪声标准差的多少倍视为异常
+REVERSAL_SIGMAS = 5
+RETREAT_SIGMAS = 10
+JUMP_SIGMAS = 8
+# 突变判定时与中位数比较的前后期数
+JUMP_NEIGHBORS = 2
+# 突变判定的相对阈值：偏离相邻中位数超过其多少倍（曲线陡峭段本次位移本身较大）
+JUMP_RATIO = 3
+
+
+def _noise_unit(totals):
+    """相邻两期之差的噪声标准差(mm)，形状 (P, 1, 3)。"""
+    return np.sqrt(2) * NOISE_RATIO * np.abs(totals)[:, None, :]
+
+
+def _window_rates(cumulative, days, window_days):
+    """最近 window_days 天的平均速率，窗口起点取不晚于 当天 - window_days 的最后一期；窗口不足时为 NaN。"""
+    start = np.searchsorted(days, days - window_days, side='right') - 1
+    valid = start >= 0
+    start = np.maximum(start, 0)
+    span = np.where(valid, days - days[start], np.nan)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return (cumulative - cumulative[:, start, :]) / span[None, :, None]
+
+
+def _local_median(delta, interval, neighbors):
+    """各期前后 neighbors 期（不含本期、不含间隔为 0 的期）本次位移的中位数。"""
+    values = np.where(interval > 0, delta, np.nan)
+    padded = np.pad(values, ((0, 0), (neighbors, neighbors), (0, 0)), constant_values=np.nan)
+    windows = np.lib.stride_tricks.sliding_window_view(padded, 2 * neighbors + 1, axis=1)
+    windows = np.delete(windows, neighbors, axis=-1)
+    with warnings.catch_warnings():
+        # 首尾和相邻期全为 NaN 时中位数为 NaN，不参与判定
+        warnings.simplefilter('ignore', RuntimeWarning)
+        return np.nanmedian(windows, axis=-1)
+
+
+def screen_arrays(points, dates, cumulative, delta, rate, max_rates=MAX_RATES, window_days=DEFAULT_WINDOW_DAYS):
+    """
+    对一组监测点的结果矩阵做异常筛查。
+
+    参数:
+        points (list): 点名列表，长度 P。
+        dates (Series): 已排序的日期，长度 D。
+        cumulative, delta, rate (ndarray): 累计位移、本次位移、位移速率，形状均为 (P, D, 3)。
+        max_rates (array): 最大速率(mm/d)，形状 (3,) 或 (P, 3)。
+        window_days (int): 滑动速率的窗口天数。
+
+    返回:
+        DataFrame: 异常表，列见 EXCEPTION_COLUMNS，连续的异常日期合并为一行。
+    """
+    dates = pd.to_datetime(pd.Series(dates)).reset_index(drop=True)
+    days = ((dates - dates.iloc[0]).dt.days.to_numpy() if len(dates) else np.zeros(0, dtype=int))
+    interval = np.diff(days, prepend=days[:1])[None, :, None]
+    max_rates = np.asarray(max_rates, dtype=float)
+    max_rates = max_rates[:, None, :] if max_rates.ndim == 2 else max_rates[None, None, :]
+
+    # 总体方向取最后一期累计位移的符号
+    totals = cumulative[:, -1, :] if len(days) else np.zeros((len(points), 3))
+    direction = np.sign(totals)[:, None, :]
+    unit = _noise_unit(totals)
+
+    # 每项检查的 (异常标记, 判定值, 限值)，形状均为 (P, D, 3)
+    limit_rates = np.broadcast_to(max_rates, cumulative.shape)
+    window = _window_rates(cumulative, days, window_days)
+    against = -delta * direction
+    retreat = np.fmax.accumulate(cumulative * direction, axis=1) - cumulative * direction
+    median = _local_median(delta, interval, JUMP_NEIGHBORS)
+    deviation = np.abs(delta - median)
+    reversal_limit = np.broadcast_to(REVERSAL_SIGMAS * unit, cumulative.shape)
+    retreat_limit = np.broadcast_to(RETREAT_SIGMAS * unit, cumulative.shape)
+    jump_limit = np.maximum(JUMP_SIGMAS * unit, JUMP_RATIO * np.abs(median))
+    checks = {
+        '速率超限': (np.abs(rate) > limit_rates * (1 + 1e-9), np.abs(rate), limit_rates),
+        '滑动速率超限': (np.abs(window) > limit_rates * (1 + 1e-9), np.abs(window), limit_rates),
+        '反向位移': ((interval > 0) & (against > reversal_limit), against, reversal_limit),
+        '累计回退': (retreat > retreat_limit, retreat, retreat_limit),
+        '突变': ((interval > 0) & (deviation > jump_limit), deviation, jump_limit),
+    }
+
+    return concat_exceptions([_runs(points, dates, name, *checks[name]) for name in CHECKS])
+
+
+def _runs(points, dates, name, flags, values, limits):
+    """将 (P, D, 3) 的异常标记中连续为真的日期段合并为异常表的行，段内取判定值的最大值。"""
+    n_dates = flags.shape[1]
+    # 展平为 (P * 3) 条长度为 D 的序列，前后补 False 后找出各段的起止
+    series = flags.transpose(0, 2, 1).reshape(-1, n_dates)
+    padded = np.pad(series, ((0, 0), (1, 1)))
+    change = np.diff(padded.astype(np.int8), axis=1)
+    rows, starts = np.nonzero(change == 1)
+    _, stops = np.nonzero(change == -1)
+    if not len(rows):
+        return pd.DataFrame(columns=EXCEPTION_COLUMNS)
+
+    # 各段的最大判定值及其所在期的限值；按行展平后标记为真的位置依次就是各段的各期
+    flat_values = np.where(series, values.transpose(0, 2, 1).reshape(-1, n_dates), -np.inf).reshape(-1)
+    flat_limits = np.broadcast_to(limits, flags.shape).transpose(0, 2, 1).reshape(-1)
+    peak = np.maximum.reduceat(flat_values, rows * n_dates + starts)
+    positions = np.flatnonzero(series.reshape(-1))
+    segment = np.repeat(np.arange(len(rows)), stops - starts)
+    at_peak = flat_values[positions] == peak[segment]
+    _, first = np.unique(segment[at_peak], return_index=True)
+    peak_limits = flat_limits[positions[at_peak][first]]
+
+    date_values = dates.to_numpy().astype('datetime64[s]')
+    return pd.DataFrame({
+        '点名': np.asarray(points, dtype=object)[rows // 3],
+        '方向': np.asarray(AXES, dtype=object)[rows % 3],
+        '检查项': name,
+        '开始日期': date_values[starts],
+        '结束日期': date_values[stops - 1],
+        '期数': stops - starts,
+        '最大值': peak,
+        '限值': peak_limits,
+    })
+
+
+def sort_exceptions(exceptions):
+    """异常表按点名、方向、检查项、开始日期排序。"""
+    if exceptions.empty:
+        return exceptions.reset_index(drop=True)
+    order = exceptions.assign(
+        _point=exceptions['点名'].map(point_sort_key),
+        _axis=exceptions['方向'].map(AXES.index),
+        _check=exceptions['检查项'].map(CHECKS.index),
+    ).sort_values(['_point', '_axis', '_check', '开始日期'], kind='stable').index
+    return exceptions.loc[order].reset_index(drop=True)
+
+
+def frame_arrays(result_df):
+    """
+    将结果表还原为 (P, D, 3) 的矩阵，缺失的 (点, 日期) 为 NaN。
+
+    返回:
+        tuple: (点名列表, 日期序列, 累计位移, 本次位移, 位移速率)。
+    """
+    names = result_df['点名'].astype(str)
+    points = sorted(names.unique(), key=point_sort_key)
+    point_codes = pd.Categorical(names, categories=points).codes
+    date_codes, unique_dates = pd.factorize(pd.to_datetime(result_df['日期']), sort=True)
+
+    # 依次为 本次位移、位移速率、累计位移，同 MEASURE_COLUMNS
+    arrays = np.full((3, len(points), len(unique_dates), 3), np.nan)
+    for axis, name in enumerate(AXES):
+        for k, column in enumerate(MEASURE_COLUMNS[name]):
+            arrays[k, point_codes, date_codes, axis] = result_df[column].to_numpy(float)
+    delta, rate, cumulative = arrays
+    return points, pd.Series(unique_dates), cumulative, delta, rate
+
+
+def screen_frame(result_df, max_rates=MAX_RATES, window_days=DEFAULT_WINDOW_DAYS):
+    """对预测结果表做异常筛查，参数见 screen_arrays。"""
+    points, dates, cumulative, delta, rate = frame_arrays(result_df)
+    return screen_arrays(points, dates, cumulative, delta, rate, max_rates=max_rates, window_days=window_days)
+
+
+def write_exceptions(exceptions, path):
+    """写出异常表；导出 Excel 时日期写为 'YYYY-MM-DD' 字符串。"""
+    if detect_format(path) == 'excel':
+        exceptions = exceptions.assign(开始日期=format_dates(exceptions['开始日期']),
+                                       结束日期=format_dates(exceptions['结束日期']))
+    write_result(exceptions, path)
+
+
+def screen_chunks(frames, exceptions, max_rates=MAX_RATES, window_days=DEFAULT_WINDOW_DAYS):
+    """
+    逐块筛查分块生成的结果（见 streaming），各块原样依次产生。
+
+    参数:
+        frames (iterable): 分块结果，每块包含若干监测点的全部日期。
+        exceptions (list): 各块的异常表依次追加到该列表中。
+        max_rates, window_days: 见 screen_arrays。
+    """
+    for frame in frames:
+        with instrument.stage('screen', len(frame)):
+            exceptions.append(screen_frame(frame, max_rates=max_rates, window_days=window_days))
+        yield frame
+
+
+def concat_exceptions(exceptions):
+    """拼接各块的异常表。"""
+    exceptions = [frame for frame in exceptions if len(frame)]
+    if not exceptions:
+        return pd.DataFrame(columns=EXCEPTION_COLUMNS)
+    return sort_exceptions(pd.concat(exceptions, ignore_index=True))
+
+
+def screen_result(result_df, path, max_rates=MAX_RATES, window_days=DEFAULT_WINDOW_DAYS):
+    """
+    筛查预测结果并写出异常表。
+
+    参数:
+        result_df (DataFrame): 预测结果。
+        path (str): 异常表输出路径（.xlsx/.parquet/.arrow）。
+        max_rates, window_days: 见 screen_arrays。
+
+    返回:
+        DataFrame: 异常表。
+    """
+    with instrument.stage('screen', len(result_df)):
+        exceptions = screen_frame(result_df, max_rates=max_rates, window_days=window_days)
+    with instrument.stage('exceptions', len(exceptions)):
+        write_exceptions(exceptions, path)
+    return exceptions
+
+
+def main():
+    report = instrument.report_path(settings.REPORT_DIR, 'screening', settings.REPORT_FORMAT)
+    with instrument.session(report, trace_memory=settings.TRACE_MEMORY):
+        with instrument.stage('read') as record:
+            result_df = read_result(settings.OUTPUT_PATH)
+            record['rows'] = len(result_df)
+        exceptions = screen_result(result_df, settings.SCREEN_PATH, window_days=settings.SCREEN_WINDOW_DAYS)
+    print(exceptions.groupby('检查项').size().reindex(CHECKS, fill_value=0).to_string())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,414 @@
+# -*- coding: utf-8 -*-
+"""
+常驻的本地预测服务：启动时导入 pandas/numpy/openpyxl 并读取一次原始数据，之后在内存中保留
+合并后的起止两期数据、日期网格、编译后的分配规则、单位曲线缓存和已生成点位的结果，
+按请求生成或透视指定点位、指定日期的数据，免去每次运行脚本的导入和 xlsx 解析开销。
+
+原始数据或分配规则文件的修改时间变化时，下一个请求会重新读取，整体替换为新的快照（见 Snapshot），
+进行中的请求继续使用旧快照。各点的结果只与种子和点名有关（见 rng_streams），因此可以逐点缓存、
+按任意组合拼接；结果缓存按 (种子, 点名) 以 LRU 方式限制条数。未缓存的点成批在线程池中生成，
+生成时持有生成锁；命中缓存的请求不等待生成，各自并行拼接和序列化。
+
+协议为 HTTP/1.1 + JSON，监听 localhost 端口或 Unix 套接字:
+    GET  /health     服务状态
+    POST /generate   {"points": [...], "dates": [...], "start": "2025-01-01", "end": "2025-03-01", "seed": 1}
+    POST /chart      同 /generate，返回各工作表的成图数据
+点名省略时为全部监测点；dates 为日期列表，start/end 为闭区间，均省略时为全部项目时间；
+seed 省略时使用服务启动时确定的种子。
+
+用法:
+    python service.py --port 8765
+    python service.py --unix /tmp/prediction.sock
+    curl -s localhost:8765/generate -d '{"points": ["JC01"], "start": "2025-01-01"}'
+"""
+import argparse
+import asyncio
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from http import HTTPStatus
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import settings
+from batch_generate import build_frame, prepare_network, simulate
+from charts_data import build_chart_tables
+from curve_cache import get_cache
+from curve_rules import DEFAULT_RULES_PATH, CurveRules
+from ingest import combine_epochs, read_epochs, read_schedule
+from rng_streams import resolve_seed
+from writers import DATE_FORMAT, format_dates
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+
+# 请求体大小上限（字节）
+MAX_BODY_BYTES = 1 << 20
+# 结果缓存默认最多保留的 (种子, 点名) 条数
+DEFAULT_RESULT_MAXSIZE = 20000
+
+
+class RequestError(Exception):
+    """请求参数错误，返回给客户端的 HTTP 状态和说明。"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class Snapshot:
+    """
+    一次读取得到的数据及其结果缓存，读取后不再修改；重新读取时整体替换，进行中的请求继续使用旧的快照。
+
+    参数:
+        version (int): 数据版本号。
+        combined_data, schedule, start_date: 同 batch_generate.prepare_network。
+        total_days (int): 起止间隔天数。
+        building_time (float): 施工期占比。
+        rules (CurveRules): 曲线分配规则。
+        cache (CurveCache): 单位曲线缓存，各快照共用。
+        generate_lock (Lock): 生成未缓存点位时持有，各快照共用（单位曲线缓存不是线程安全的）。
+        result_maxsize (int): 结果缓存最多保留的 (种子, 点名) 条数。
+    """
+
+    def __init__(self, version, combined_data, schedule, start_date, total_days, building_time, rules, cache,
+                 generate_lock, result_maxsize=DEFAULT_RESULT_MAXSIZE):
+        self.version = version
+        self.total_days = total_days
+        self.building_time = building_time
+        self.rules = rules
+        self.cache = cache
+        self.points, self.starts, self.totals, self.dates, self.days = prepare_network(
+            combined_data, schedule, start_date)
+        self.index = {point: i for i, point in enumerate(self.points)}
+        self.result_maxsize = result_maxsize
+        # (种子, 点名) -> (累计位移, 本次位移, 位移速率)，形状均为 (D, 3)，按最近使用排序
+        self._results = OrderedDict()
+        self._results_lock = threading.Lock()
+        self._generate_lock = generate_lock
+
+    def select_points(self, points=None):
+        """请求中的点名，按输出顺序排列；None 时为全部监测点。"""
+        if points is None:
+            return list(self.points)
+        if isinstance(points, str) or not isinstance(points, list):
+            raise RequestError(HTTPStatus.BAD_REQUEST, "points 必须是点名列表")
+        unknown = sorted({str(point) for point in points} - self.index.keys())
+        if unknown:
+            raise RequestError(HTTPStatus.NOT_FOUND, f"未知的点名: {unknown}")
+        return sorted({str(point) for point in points}, key=self.index.__getitem__)
+
+    def select_dates(self, dates=None, start=None, end=None):
+        """请求中的日期在日期网格中的下标；都为 None 时为全部项目时间。"""
+        mask = np.ones(len(self.dates), dtype=bool)
+        try:
+            if dates is not None:
+                if isinstance(dates, str) or not isinstance(dates, list):
+                    raise RequestError(HTTPStatus.BAD_REQUEST, "dates 必须是日期列表")
+                mask &= self.dates.isin(pd.to_datetime(pd.Series(dates)).dt.normalize()).to_numpy()
+            if start is not None:
+                mask &= (self.dates >= pd.Timestamp(start).normalize()).to_numpy()
+            if end is not None:
+                mask &= (self.dates <= pd.Timestamp(end).normalize()).to_numpy()
+        except (TypeError, ValueError) as error:
+            raise RequestError(HTTPStatus.BAD_REQUEST, f"无法识别的日期: {error}") from None
+        return np.flatnonzero(mask)
+
+    def cached_results(self):
+        return len(self._results)
+
+    def _lookup(self, points, seed, found):
+        with self._results_lock:
+            for point in points:
+                entry = self._results.get((seed, point))
+                if entry is not None:
+                    self._results.move_to_end((seed, point))
+                    found[point] = entry
+        return [point for point in points if point not in found]
+
+    def results(self, points, seed):
+        """
+        取各点在完整日期网格上的结果。已缓存的点直接取用，不等待其他请求的生成；
+        未缓存的点在生成锁内成批生成，同时请求相同点位的请求只生成一次。
+
+        返回:
+            tuple: (累计位移, 本次位移, 位移速率)，形状均为 (len(points), D, 3)。
+        """
+        found = {}
+        missing = self._lookup(points, seed, found)
+        if missing:
+            with self._generate_lock:
+                # 等待期间其他请求可能已生成了部分点位
+                missing = self._lookup(missing, seed, found)
+                if missing:
+                    totals = self.totals[[self.index[point] for point in missing]]
+                    arrays = simulate(missing, totals, self.days, self.total_days, self.building_time, seed=seed,
+                                      cache=self.cache, rules=self.rules)
+                    with self._results_lock:
+                        for i, point in enumerate(missing):
+                            found[point] = self._results[(seed, point)] = tuple(array[i] for array in arrays)
+                        while len(self._results) > self.result_maxsize:
+                            self._results.popitem(last=False)
+        return tuple(np.stack([found[point][k] for point in points]) for k in range(3))
+
+    def frame(self, points, columns, seed):
+        """指定点位、日期下标的预测结果表，行顺序为先日期、后点名。"""
+        cumulative, delta, rate = self.results(points, seed)
+        starts = self.starts[[self.index[point] for point in points]]
+        return build_frame(points, self.dates.iloc[columns], starts,
+                           cumulative[:, columns], delta[:, columns], rate[:, columns])
+
+
+class Workspace:
+    """
+    服务在内存中保留的数据，按文件修改时间失效。
+
+    参数:
+        raw_path (str): 原始数据文件。
+        start_date, end_date (datetime): 起止日期。
+        building_days (int): 施工期天数。
+        rules_path (str): 曲线分配规则配置文件，None 时使用 curve_rules.json。
+        seed (int): 请求未指定种子时使用的种子，None 时在启动时生成一个。
+        cache_dir (str): 单位曲线缓存的持久化目录。
+        result_maxsize (int): 结果缓存最多保留的 (种子, 点名) 条数。
+    """
+
+    def __init__(self, raw_path, start_date, end_date, building_days, rules_path=None, seed=None, cache_dir=None,
+                 result_maxsize=DEFAULT_RESULT_MAXSIZE):
+        self.raw_path = Path(raw_path)
+        self.rules_path = Path(rules_path) if rules_path else DEFAULT_RULES_PATH
+        self.start_date = start_date
+        self.end_date = end_date
+        self.total_days = (end_date - start_date).days
+        self.building_time = building_days / self.total_days
+        self.seed = resolve_seed(seed)
+        self.cache = get_cache(cache_dir)
+        self.result_maxsize = result_maxsize
+        self.snapshot = None
+        self._mtimes = None
+        self._reload_lock = threading.Lock()
+        self._generate_lock = threading.Lock()
+
+    def _current_mtimes(self):
+        return tuple(os.stat(path).st_mtime_ns for path in (self.raw_path, self.rules_path))
+
+    def is_stale(self):
+        return self._mtimes != self._current_mtimes()
+
+    def reload(self):
+        """重新读取原始数据、项目时间和分配规则，替换为新的快照（结果缓存随之清空）。"""
+        with self._reload_lock:
+            mtimes = self._current_mtimes()
+            if mtimes == self._mtimes:
+                return
+            epochs = read_epochs(self.raw_path, [self.start_date, self.end_date])
+            combined_data = combine_epochs(epochs, self.start_date, self.end_date)
+            schedule = read_schedule(self.raw_path)
+            rules = CurveRules.from_file(self.rules_path)
+            version = self.snapshot.version + 1 if self.snapshot else 1
+            self.snapshot = Snapshot(version, combined_data, schedule, self.start_date, self.total_days,
+                                     self.building_time, rules, self.cache, self._generate_lock,
+                                     result_maxsize=self.result_maxsize)
+            self._mtimes = mtimes
+
+
+def _records(frame):
+    """结果表转为可 JSON 序列化的 (列名, 行列表)，日期格式化为字符串，空值为 None。"""
+    frame = frame.assign(日期=format_dates(frame['日期']), 点名=frame['点名'].astype(str))
+    values = frame.astype(object).where(frame.notna(), None)
+    return list(frame.columns), values.to_numpy().tolist()
+
+
+def _sheets(tables):
+    sheets = {}
+    for sheet, table in tables.items():
+        values = table.astype(object).where(table.notna(), None)
+        sheets[sheet] = {
+            'dates': list(format_dates(pd.Series(table.columns))),
+            'points': list(table.index),
+            'values': values.to_numpy().tolist(),
+        }
+    return sheets
+
+
+class PredictionService:
+    """
+    asyncio HTTP 服务，请求的解析和应答在事件循环中进行，读取文件和生成在线程池中进行。
+
+    参数:
+        workspace (Workspace): 内存中的数据。
+    """
+
+    def __init__(self, workspace):
+        self.workspace = workspace
+        self._reload_lock = None
+
+    async def _ensure_fresh(self):
+        # 文件变化时只由一个请求重新读取，其余请求等待读取完成
+        if not self.workspace.is_stale():
+            return
+        async with self._reload_lock:
+            if self.workspace.is_stale():
+                await asyncio.get_running_loop().run_in_executor(None, self.workspace.reload)
+
+    def _parse_query(self, snapshot, body):
+        points = snapshot.select_points(body.get('points'))
+        columns = snapshot.select_dates(body.get('dates'), body.get('start'), body.get('end'))
+        try:
+            seed = self.workspace.seed if body.get('seed') is None else int(body['seed'])
+        except (TypeError, ValueError):
+            raise RequestError(HTTPStatus.BAD_REQUEST, "seed 必须是整数") from None
+        return points, columns, seed
+
+    def _generate(self, snapshot, body):
+        points, columns, seed = self._parse_query(snapshot, body)
+        names, rows = _records(snapshot.frame(points, columns, seed))
+        return {'seed': seed, 'version': snapshot.version, 'columns': names, 'rows': rows}
+
+    def _chart(self, snapshot, body):
+        points, columns, seed = self._parse_query(snapshot, body)
+        tables = build_chart_tables(snapshot.frame(points, columns, seed))
+        return {'seed': seed, 'version': snapshot.version, 'sheets': _sheets(tables)}
+
+    def _health(self, snapshot, body):
+        dates = snapshot.dates
+        return {
+            'status': 'ok',
+            'version': snapshot.version,
+            'seed': self.workspace.seed,
+            'points': len(snapshot.points),
+            'dates': len(dates),
+            'first_date': dates.iloc[0].strftime(DATE_FORMAT) if len(dates) else None,
+            'last_date': dates.iloc[-1].strftime(DATE_FORMAT) if len(dates) else None,
+            'cached_results': snapshot.cached_results(),
+        }
+
+    async def dispatch(self, method, path, body):
+        routes = {
+            ('GET', '/health'): self._health,
+            ('POST', '/generate'): self._generate,
+            ('POST', '/chart'): self._chart,
+        }
+        handler = routes.get((method, path))
+        if handler is None:
+            raise RequestError(HTTPStatus.NOT_FOUND, f"不支持的请求: {method} {path}")
+        await self._ensure_fresh()
+        # 整个请求使用同一个快照，请求之间只在生成未缓存的点位时互相等待
+        snapshot = self.workspace.snapshot
+        return await asyncio.get_running_loop().run_in_executor(None, handler, snapshot, body)
+
+    async def _read_request(self, reader):
+        request_line = await reader.readline()
+        if not request_line:
+            return None
+        try:
+            method, target, _ = request_line.decode('latin-1').split()
+        except ValueError:
+            raise RequestError(HTTPStatus.BAD_REQUEST, "请求行格式错误") from None
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        if 'transfer-encoding' in headers:
+            # 不支持分块传输，没有 Content-Length 的请求视为没有请求体
+            raise RequestError(HTTPStatus.BAD_REQUEST, "请求体须以 Content-Length 给出长度，不支持 Transfer-Encoding")
+        try:
+            length = int(headers.get('content-length') or 0)
+        except ValueError:
+            length = -1
+        if length < 0:
+            raise RequestError(HTTPStatus.BAD_REQUEST, "Content-Length 必须是非负整数")
+        if length > MAX_BODY_BYTES:
+            raise RequestError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, "请求体过大")
+        body = {}
+        if length:
+            try:
+                body = json.loads(await reader.readexactly(length))
+            except ValueError:
+                raise RequestError(HTTPStatus.BAD_REQUEST, "请求体不是有效的 JSON") from None
+            if not isinstance(body, dict):
+                raise RequestError(HTTPStatus.BAD_REQUEST, "请求体必须是 JSON 对象")
+        keep_alive = headers.get('connection', '').lower() != 'close'
+        return method.upper(), target.split('?', 1)[0], body, keep_alive
+
+    @staticmethod
+    async def _respond(writer, status, payload, keep_alive):
+        content = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        head = (f'HTTP/1.1 {status.value} {status.phrase}\r\n'
+                'Content-Type: application/json; charset=utf-8\r\n'
+                f'Content-Length: {len(content)}\r\n'
+                f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+        writer.write(head.encode('latin-1') + content)
+        await writer.drain()
+
+    async def handle(self, reader, writer):
+        """处理一个连接，支持 keep-alive 连续请求。"""
+        try:
+            while True:
+                started = time.perf_counter()
+                method, path, keep_alive = '-', '-', False
+                try:
+                    request = await self._read_request(reader)
+                    if request is None:
+                        break
+                    method, path, body, keep_alive = request
+                    status, payload = HTTPStatus.OK, await self.dispatch(method, path, body)
+                except RequestError as error:
+                    status, payload = error.status, {'error': str(error)}
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    raise
+                except Exception as error:
+                    # 生成失败（如原始数据格式错误）不影响服务继续运行
+                    status, payload = HTTPStatus.INTERNAL_SERVER_ERROR, {'error': f'{type(error).__name__}: {error}'}
+                await self._respond(writer, status, payload, keep_alive)
+                print(f'{method} {path} {status.value} {(time.perf_counter() - started) * 1000:.1f}ms')
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host=DEFAULT_HOST, port=DEFAULT_PORT, unix_path=None):
+        """读取数据后开始监听，直到被取消。"""
+        self._reload_lock = asyncio.Lock()
+        await asyncio.get_running_loop().run_in_executor(None, self.workspace.reload)
+        if unix_path:
+            server = await asyncio.start_unix_server(self.handle, path=unix_path)
+            address = unix_path
+        else:
+            server = await asyncio.start_server(self.handle, host=host, port=port)
+            address = f'http://{host}:{port}'
+        snapshot = self.workspace.snapshot
+        print(f'预测服务已启动: {address}（{len(snapshot.points)} 个点，{len(snapshot.dates)} 个日期，'
+              f'种子 {self.workspace.seed}）')
+        async with server:
+            await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='常驻的本地沉降预测服务')
+    parser.add_argument('--host', default=settings.SERVICE_HOST, help='监听地址')
+    parser.add_argument('--port', type=int, default=settings.SERVICE_PORT, help='监听端口')
+    parser.add_argument('--unix', default=settings.SERVICE_SOCKET, help='改为监听 Unix 套接字')
+    args = parser.parse_args()
+
+    workspace = Workspace(settings.RAW_PATH, settings.START_DATE, settings.END_DATE, settings.BUILDING_DAYS,
+                          rules_path=settings.CURVE_RULES_PATH, seed=settings.SEED,
+                          cache_dir=settings.CURVE_CACHE_DIR, result_maxsize=settings.SERVICE_RESULT_CACHE_SIZE)
+    try:
+        asyncio.run(PredictionService(workspace).serve(args.host, args.port, args.unix))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""
+花垣项目的运行参数，dataBuild_all.py、charts_data.py 和 pipeline.py 共用。
+"""
+from datetime import datetime
+
+# 原始数据（Sheet1 为观测数据，Sheet2 为项目时间）
+RAW_PATH = './data/花垣沉降原始数据_汇总_0512.xlsx'
+
+# 起始和结束日期
+START_DATE = datetime(2024, 10, 14)
+END_DATE = datetime(2025, 5, 13)
+# 施工期天数
+BUILDING_DAYS = 98
+
+# 监测点曲线分配规则（点名模式、序号范围和曲线参数），None 时使用 curve_rules.json
+CURVE_RULES_PATH = None
+
+# 并行进程数，1 表示单进程生成
+WORKERS = 1
+# 随机种子，设为整数时结果可复现，且与进程数无关
+SEED = None
+# 增量模式：只计算并追加项目时间表中新增的日期（状态保存在结果旁的 .state.json 中）
+INCREMENTAL = False
+# 单位曲线缓存的持久化目录，None 时只在内存中缓存；文件数超过 curve_cache.DEFAULT_MAX_FILES 时淘汰最久未用的
+CURVE_CACHE_DIR = './cache/curves'
+
+# 分块生成：监测点按内存上限分块，每块生成后立即写入按日期分区的 Parquet 目录（OUTPUT_PATH、ENSEMBLE_PATH
+# 写为目录），峰值内存不随监测点数增长；该模式下不导出 Excel（需要全部结果在内存中）
+STREAMING = False
+# 分块生成时每块的内存上限（字节）
+STREAM_MAX_BYTES = 256 * 2 ** 20
+
+# 运行报告（各阶段耗时、行数、内存峰值和曲线模块调用计数）的目录，None 时只在控制台打印摘要
+REPORT_DIR = None
+# 运行报告格式，'json' 或 'csv'
+REPORT_FORMAT = 'json'
+# 是否记录各阶段的内存峰值（tracemalloc，会拖慢运行）
+TRACE_MEMORY = False
+# 生成过程的 cProfile 结果保存路径，None 时不记录
+PROFILE_PATH = None
+
+# 输出文件：列式存储为主；Excel 为可选的最后一步导出，默认不导出，需要时设为路径
+# （如 './output/花垣沉降预测数据_汇总_0512.xlsx'）或在命令行加 --excel
+OUTPUT_PATH = './output/花垣沉降预测数据_汇总_0512.parquet'
+EXCEL_PATH = None
+# 成图数据
+CHART_PATH = './output/花垣沉降_成图数据_0512.xlsx'
+# 成图数据工作簿是否在 Sheet1 附带完整的预测结果（逐行写入，较慢，且受 Excel 1048576 行的上限限制），默认不附带
+CHART_RESULT_SHEET = False
+
+# 曲线图（charts_render.py）：各点各方向的累计位移曲线和总览图的输出目录，None 时不绘制（需要 matplotlib）；
+# 图片格式 'png' 或 'svg'；绘图进程数，None 为 CPU 核数。只重绘数据有变化的图
+RENDER_DIR = None
+RENDER_FORMAT = 'png'
+RENDER_WORKERS = None
+
+# 异常筛查（screening.py）：速率超限、反向位移、累计回退和突变的异常表，None 时不筛查；滑动速率的窗口天数
+SCREEN_PATH = './output/花垣沉降_异常筛查_0512.xlsx'
+SCREEN_WINDOW_DAYS = 7
+
+# 常驻预测服务（service.py）的监听地址和端口；SERVICE_SOCKET 不为 None 时改为监听该 Unix 套接字
+SERVICE_HOST = '127.0.0.1'
+SERVICE_PORT = 8765
+SERVICE_SOCKET = None
+# 预测服务的结果缓存最多保留的 (种子, 点名) 条数，超出时淘汰最久未用的
+SERVICE_RESULT_CACHE_SIZE = 20000
+
+# 多项目批量运行（projects.py）：项目清单 JSON 文件；共用进程池的进程数，None 为 CPU 核数；
+# 同时运行的项目估计内存之和的上限(MB)，单个项目超过上限时改为分块生成
+PROJECTS_MANIFEST = './projects.json'
+PROJECT_WORKERS = None
+PROJECT_MEMORY_BUDGET_MB = 4096
+
+# 曲线标定（calibrate.py）：各点各方向的拟合结果，以及由三方向联合拟合生成的分配规则
+CALIBRATION_PATH = './output/花垣沉降_曲线标定_0512.xlsx'
+CALIBRATED_RULES_PATH = './output/curve_rules_calibrated.json'
+
+# 蒙特卡洛集合（ensemble.py）：每个点的实现数、累计位移分位数和输出路径
+ENSEMBLE_MEMBERS = 1000
+ENSEMBLE_PERCENTILES = (5, 50, 95)
+ENSEMBLE_PATH = './output/花垣沉降预测数据_集合_0512.parquet'
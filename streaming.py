@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+"""
+分块生成：监测点按内存上限分块，每块生成后立即写入按日期分区的 Parquet 目录，
+整网结果不在内存中同时存在，峰值内存只与块大小有关，不随监测点数增长。
+
+各点的随机数流只与种子和点名有关，分块生成的结果与一次性生成一致。
+输出目录为 <path>/日期=YYYY-MM-DD/part-<块号>.parquet，块号按点名顺序递增，
+同一日期分区内按文件名顺序拼接即为点名顺序。结果用 writers.read_result 读取。
+预测结果由 iter_network 分块产生，可逐块筛查（screening.screen_chunks）后交给 write_store，
+见 dataBuild_all.build_streaming 和 projects.run_project。
+"""
+from pathlib import Path
+
+import numpy as np
+
+import instrument
+from batch_generate import build_frame, prepare_network, simulate
+from curve_cache import get_cache
+from curve_rules import load_rules
+from ensemble import DEFAULT_MEMBERS, DEFAULT_PERCENTILES, build_ensemble_frame, chunk_points, simulate_ensemble
+from rate_clamp import MAX_RATES
+from rng_streams import resolve_seed
+from writers import remove_path, replace_path, write_parquet_part
+
+# 每块的内存上限（字节）
+DEFAULT_MAX_BYTES = 256 * 2 ** 20
+
+
+def iter_network(combined_data, dates, start_date, total_days, building_time, seed=None, cache_dir=None,
+                 rules_path=None, max_bytes=DEFAULT_MAX_BYTES):
+    """
+    按监测点分块生成预测结果。
+
+    参数:
+        combined_data, dates, start_date, total_days, building_time, seed, cache_dir, rules_path:
+            同 batch_generate.generate_network。
+        max_bytes (int): 每块的内存上限（字节）。
+
+    返回:
+        generator: 每块一个 DataFrame，块内按日期、点名排序，块按点名顺序依次产生。
+    """
+    # 各块共用同一个种子
+    seed = resolve_seed(seed)
+    points, starts, totals, dates, days = prepare_network(combined_data, dates, start_date)
+    for part in chunk_points(len(points), 1, len(days), max_bytes):
+        cumulative, delta, rate = simulate(points[part], totals[part], days, total_days, building_time, seed=seed,
+                                           cache_dir=cache_dir, rules_path=rules_path)
+        with instrument.stage('frame', (part.stop - part.start) * len(days)):
+            frame = build_frame(points[part], dates, starts[part], cumulative, delta, rate)
+        del cumulative, delta, rate
+        yield frame
+
+
+def iter_ensemble(combined_data, dates, start_date, total_days, building_time, n_members=DEFAULT_MEMBERS,
+                  percentiles=DEFAULT_PERCENTILES, seed=None, cache_dir=None, rules_path=None, max_rates=MAX_RATES,
+                  max_bytes=DEFAULT_MAX_BYTES):
+    """
+    按监测点分块生成蒙特卡洛集合统计，参数同 ensemble.generate_ensemble。
+
+    返回:
+        generator: 每块一个 DataFrame，格式见 ensemble.build_ensemble_frame。
+    """
+    if n_members < 1:
+        raise ValueError("n_members 必须为正整数")
+    seed = resolve_seed(seed)
+    points, _, totals, dates, days = prepare_network(combined_data, dates, start_date)
+    cache, rules = get_cache(cache_dir), load_rules(rules_path)
+    max_rates = np.asarray(max_rates, dtype=float)
+    for part in chunk_points(len(points), n_members, len(days), max_bytes):
+        with instrument.stage('ensemble', (part.stop - part.start) * len(days) * n_members):
+            bands, exceedance = simulate_ensemble(
+                points[part], totals[part], days, total_days, building_time, n_members, seed,
+                percentiles=percentiles, max_rates=max_rates[part] if max_rates.ndim == 2 else max_rates,
+                cache=cache, rules=rules)
+        yield build_ensemble_frame(points[part], dates, bands, exceedance, percentiles)
+
+
+def write_store(frames, path):
+    """
+    将分块结果依次写入按日期分区的 Parquet 目录。
+
+    先写到临时目录，全部写完后再替换原有结果，中途失败时原有结果不受影响。
+
+    参数:
+        frames (iterable): 按点名顺序产生的分块结果。
+        path (str): 输出目录。
+
+    返回:
+        int: 写出的记录数。
+    """
+    path = Path(path)
+    tmp = path.with_name(f'{path.name}.tmp')
+    remove_path(tmp)
+    rows = 0
+    for part, frame in enumerate(frames):
+        with instrument.stage('write', len(frame)):
+            write_parquet_part(frame, tmp, part)
+        rows += len(frame)
+        del frame
+    replace_path(tmp, path)
+    return rows
+
+
+def generate_ensemble_store(combined_data, dates, start_date, total_days, building_time, path,
+                            n_members=DEFAULT_MEMBERS, percentiles=DEFAULT_PERCENTILES, seed=None, cache_dir=None,
+                            rules_path=None, max_rates=MAX_RATES, max_bytes=DEFAULT_MAX_BYTES):
+    """
+    分块生成全网集合统计并写入按日期分区的 Parquet 目录，参数见 iter_ensemble。
+
+    返回:
+        int: 写出的记录数。
+    """
+    return write_store(iter_ensemble(combined_data, dates, start_date, total_days, building_time,
+                                     n_members=n_members, percentiles=percentiles, seed=seed, cache_dir=cache_dir,
+                                     rules_path=rules_path, max_rates=max_rates, max_bytes=max_bytes), path)
+
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""
+rate_clamp.clamp_rates 的回归检查：速率不超限、可到达时结束日期等于观测总位移、同一天的记录本次位移为 0。
+
+运行: python -m pytest -q test_rate_clamp.py
+"""
+import numpy as np
+
+from rate_clamp import MAX_RATES, clamp_rates
+
+TOTAL_DAYS = 120
+# 含同一天的重复记录和结束日期之后的记录
+DAYS = np.array([0, 1, 1, 3, 7, 7, 7, 15, 30, 31, 60, 61, 90, 100, 110, 118, 119, 120, 120, 125])
+# 浮点累加的容差(mm)
+TOLERANCE = 1e-9
+
+
+def _case(n_points=200, seed=0):
+    """原始曲线为带大幅跳变的随机游走；各点总位移在全程速率上限以内。"""
+    rng = np.random.default_rng(seed)
+    reachable = MAX_RATES * TOTAL_DAYS
+    totals = rng.uniform(-0.9, 0.9, (n_points, 3)) * reachable
+    raw = np.cumsum(rng.normal(0, 3, (n_points, len(DAYS), 3)), axis=1)
+    raw[:, 0] = 0
+    adjustments = rng.uniform(0, 0.5, raw.shape)
+    return raw, adjustments, totals
+
+
+def _clamp(raw, adjustments, totals, **kwargs):
+    return clamp_rates(raw, DAYS, adjustments, totals=totals, total_days=TOTAL_DAYS, **kwargs)
+
+
+def test_steps_within_max_rates():
+    raw, adjustments, totals = _case()
+    cumulative, delta, rate = _clamp(raw, adjustments, totals)
+    interval = np.diff(DAYS, prepend=DAYS[:1])[None, :, None]
+    assert np.all(np.abs(delta) <= MAX_RATES * interval + TOLERANCE)
+    assert np.all(np.abs(rate) <= MAX_RATES + TOLERANCE)
+    np.testing.assert_allclose(np.cumsum(delta, axis=1), cumulative - cumulative[:, :1])
+
+
+def test_end_value_equals_observed_total():
+    raw, adjustments, totals = _case(seed=1)
+    cumulative, _, _ = _clamp(raw, adjustments, totals)
+    at_end = DAYS >= TOTAL_DAYS
+    np.testing.assert_allclose(cumulative[:, at_end], np.broadcast_to(totals[:, None], cumulative[:, at_end].shape),
+                               rtol=0, atol=TOLERANCE)
+
+
+def test_unreachable_total_ends_as_close_as_the_limits_allow():
+    raw, adjustments, totals = _case(seed=2)
+    totals[0] = MAX_RATES * TOTAL_DAYS * 1.5
+    cumulative, delta, _ = _clamp(raw, adjustments, totals)
+    interval = np.diff(DAYS, prepend=DAYS[:1])[None, :, None]
+    assert np.all(np.abs(delta) <= MAX_RATES * interval + TOLERANCE)
+    end = np.flatnonzero(DAYS == TOTAL_DAYS)[0]
+    np.testing.assert_allclose(cumulative[0, end], MAX_RATES * TOTAL_DAYS, rtol=0, atol=TOLERANCE)
+
+
+def test_same_day_epochs_have_zero_delta():
+    raw, adjustments, totals = _case(seed=3)
+    cumulative, delta, rate = _clamp(raw, adjustments, totals)
+    same_day = np.diff(DAYS, prepend=DAYS[:1] - 1) == 0
+    assert same_day.sum() == 4
+    assert np.all(delta[:, same_day] == 0)
+    assert np.all(rate[:, same_day] == 0)
+    assert np.all(delta[:, 0] == 0)
+
+
+def test_increment_matches_full_run():
+    raw, adjustments, totals = _case(seed=4)
+    full, _, _ = _clamp(raw, adjustments, totals)
+    split = 9
+    head, _, _ = clamp_rates(raw[:, :split], DAYS[:split], adjustments[:, :split], totals=totals,
+                             total_days=TOTAL_DAYS)
+    # 增量从上一期截断后的取值继续，第一期只作为起点
+    tail_adjustments = np.concatenate([np.zeros_like(adjustments[:, :1]), adjustments[:, split:]], axis=1)
+    tail, _, _ = clamp_rates(raw[:, split - 1:], DAYS[split - 1:], tail_adjustments, initial=head[:, -1],
+                             totals=totals, total_days=TOTAL_DAYS)
+    np.testing.assert_allclose(np.concatenate([head, tail[:, 1:]], axis=1), full, rtol=0, atol=TOLERANCE)
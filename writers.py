@@ -0,0 +1,279 @@
+# -*- coding: utf-8 -*-
+"""
+结果输出：以 Parquet（可按日期或点名分区）和 Arrow IPC 列式格式为主，Excel 为可选导出。
+
+列式输出使用紧凑类型：日期为 date32，点名为分类类型，位移、速率等毫米量为 float32。
+X/Y/Z 坐标保持 float64，float32 只有约 7 位有效数字，不足以保存毫米级坐标。
+日期在内存中始终为 datetime64，只在导出 Excel 和成图数据时格式化为字符串。
+"""
+import re
+import shutil
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+AXES = ('X', 'Y', 'Z')
+
+# 输出列顺序
+COLUMNS_ORDER = [
+    '日期', '点名', 'X', 'X_本次位移(mm)', 'X_位移速率(mm/d)', 'X_累计位移(mm)',
+    'Y', 'Y_本次位移(mm)', 'Y_位移速率(mm/d)', 'Y_累计位移(mm)',
+    'Z', 'Z_本次下沉(mm)', 'Z_沉降速率(mm/d)', 'Z_累计下沉(mm)'
+]
+
+FORMATS = ('parquet', 'arrow', 'excel')
+
+# 导出时的日期格式
+DATE_FORMAT = '%Y-%m-%d'
+
+_SUFFIX_FORMATS = {
+    '.parquet': 'parquet',
+    '.arrow': 'arrow',
+    '.feather': 'arrow',
+    '.ipc': 'arrow',
+    '.xlsx': 'excel',
+}
+
+
+_POINT_NAME = re.compile(r'^(.*?)(\d+)$')
+
+
+def point_sort_key(point):
+    """点名排序键：前缀相同的点按序号数值排序，如 JC2 排在 JC10 之前。"""
+    match = _POINT_NAME.match(point)
+    if match is None:
+        return (point, -1)
+    return (match.group(1), int(match.group(2)))
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError("Parquet/Arrow 输出需要安装 pyarrow") from None
+    return pyarrow
+
+
+def detect_format(path):
+    """根据文件后缀判断输出格式；无后缀的路径视为分区 Parquet 目录。"""
+    suffix = Path(path).suffix.lower()
+    if not suffix:
+        return 'parquet'
+    try:
+        return _SUFFIX_FORMATS[suffix]
+    except KeyError:
+        raise ValueError(f"无法识别的输出格式: {path}") from None
+
+
+def format_dates(dates):
+    """将日期列格式化为 'YYYY-MM-DD' 字符串，只在导出时使用。"""
+    return pd.to_datetime(dates).dt.strftime(DATE_FORMAT)
+
+
+def as_dates(dates):
+    """将读回的日期列（date32、字符串或分区目录名）统一转换为按天的 datetime64。"""
+    if not pd.api.types.is_datetime64_any_dtype(dates):
+        dates = pd.to_datetime(dates.astype(str), format=DATE_FORMAT)
+    return dates.astype('datetime64[s]')
+
+
+def compact_frame(result_df):
+    """转换为紧凑类型：点名为按出现顺序排列的分类类型，坐标以外的浮点列（毫米量、概率）为 float32。"""
+    df = result_df.copy()
+    if not isinstance(df['点名'].dtype, pd.CategoricalDtype):
+        df['点名'] = pd.Categorical(df['点名'], categories=pd.unique(df['点名'].astype(str)))
+    else:
+        df['点名'] = df['点名'].cat.remove_unused_categories()
+    measures = [column for column in df.columns if df[column].dtype.kind == 'f' and column not in AXES]
+    df[measures] = df[measures].astype(np.float32)
+    return df
+
+
+def _to_table(result_df):
+    pa = _import_pyarrow()
+    table = pa.Table.from_pandas(compact_frame(result_df), preserve_index=False)
+    if '日期' in table.column_names:
+        index = table.column_names.index('日期')
+        table = table.set_column(index, '日期', table['日期'].cast(pa.date32()))
+    return table
+
+
+def write_parquet(result_df, path, partition_by=None):
+    """
+    写出 Parquet。
+
+    参数:
+        result_df (DataFrame): 预测结果。
+        path (str): 文件路径；分区时为目录路径。
+        partition_by (str): 分区列，'日期' 或 '点名'，None 时写出单个文件。
+    """
+    pa = _import_pyarrow()
+    table = _to_table(result_df)
+    if partition_by is None:
+        pa.parquet.write_table(table, path)
+    else:
+        if partition_by not in ('日期', '点名'):
+            raise ValueError("partition_by 只能是 '日期' 或 '点名'")
+        pa.parquet.write_to_dataset(table, path, partition_cols=[partition_by])
+
+
+def write_parquet_part(result_df, path, part):
+    """
+    将一块结果写入按日期分区的 Parquet 目录，每个日期一个文件 <path>/日期=YYYY-MM-DD/part-<块号>.parquet。
+
+    块号按点名顺序递增时，同一分区内按文件名顺序拼接即为点名顺序。
+
+    参数:
+        result_df (DataFrame): 一块预测结果，按日期、点名排序。
+        path (str): 分区目录路径。
+        part (int): 块号。
+    """
+    pa = _import_pyarrow()
+    table = _to_table(result_df.drop(columns='日期'))
+    dates = result_df['日期'].to_numpy().astype('datetime64[D]')
+    # 结果按日期排序，各日期的记录是连续的一段
+    bounds = np.concatenate([[0], np.flatnonzero(dates[1:] != dates[:-1]) + 1, [len(dates)]])
+    for start, stop in zip(bounds[:-1], bounds[1:]):
+        directory = Path(path) / f"日期={pd.Timestamp(dates[start]).strftime(DATE_FORMAT)}"
+        directory.mkdir(parents=True, exist_ok=True)
+        pa.parquet.write_table(table.slice(start, stop - start), directory / f'part-{part:05d}.parquet')
+
+
+def write_arrow(result_df, path, partition_by=None):
+    """写出 Arrow IPC 文件，可直接内存映射读取。"""
+    if partition_by is not None:
+        raise ValueError("Arrow IPC 输出不支持分区")
+    pa = _import_pyarrow()
+    table = _to_table(result_df)
+    with pa.OSFile(str(path), 'wb') as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+
+
+def write_excel(result_df, path, partition_by=None):
+    """导出 Excel，日期写为 'YYYY-MM-DD' 字符串。"""
+    if partition_by is not None:
+        raise ValueError("Excel 输出不支持分区")
+    if '日期' in result_df.columns:
+        result_df = result_df.assign(日期=format_dates(result_df['日期']))
+    result_df.to_excel(path, index=False)
+
+
+def remove_path(path):
+    """删除结果文件或分区目录，不存在时忽略。"""
+    path = Path(path)
+    if path.is_dir():
+        shutil.rmtree(path)
+    elif path.exists():
+        path.unlink()
+
+
+def replace_path(tmp, path):
+    """用临时路径上写好的结果替换 path，两者各自为文件或目录均可。"""
+    remove_path(path)
+    Path(tmp).replace(path)
+
+
+WRITERS = {
+    'parquet': write_parquet,
+    'arrow': write_arrow,
+    'excel': write_excel,
+}
+
+
+def write_result(result_df, path, fmt=None, partition_by=None):
+    """
+    按指定格式写出预测结果。
+
+    参数:
+        result_df (DataFrame): 预测结果。
+        path (str): 输出路径。
+        fmt (str): 'parquet'、'arrow' 或 'excel'，None 时按后缀判断。
+        partition_by (str): Parquet 分区列，'日期' 或 '点名'。
+    """
+    fmt = fmt or detect_format(path)
+    if fmt not in WRITERS:
+        raise ValueError(f"不支持的输出格式: {fmt}，可选 {FORMATS}")
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    partitioned = fmt == 'parquet' and partition_by is not None
+    if path.is_dir() or (partitioned and path.exists()):
+        # 已有的分区目录不能原地覆盖（会与原有分区文件混在一起），文件也不能原地改为目录
+        # （如分块生成写出的目录改为单个文件），先写到临时路径再替换
+        tmp = path.with_name(f'{path.stem}.tmp{path.suffix}')
+        remove_path(tmp)
+        WRITERS[fmt](result_df, tmp, partition_by=partition_by)
+        replace_path(tmp, path)
+    else:
+        WRITERS[fmt](result_df, path, partition_by=partition_by)
+
+
+def append_result(new_df, path, fmt=None, partition_by=None):
+    """
+    将新增记录追加到已有结果。
+
+    按日期分区的 Parquet 目录只写出新增日期的分区；其它格式读出原结果、拼接后整体重写。
+
+    参数:
+        new_df (DataFrame): 新增的预测结果，日期均晚于已有结果。
+        path (str): 已有结果的路径，不存在时直接写出。
+        fmt (str): 'parquet'、'arrow' 或 'excel'，None 时按后缀判断。
+        partition_by (str): Parquet 分区列，'日期' 或 '点名'。
+    """
+    if not Path(path).exists():
+        write_result(new_df, path, fmt=fmt, partition_by=partition_by)
+    elif Path(path).is_dir() and partition_by == '日期':
+        write_parquet(new_df, path, partition_by=partition_by)
+    else:
+        fmt = fmt or ('parquet' if Path(path).is_dir() else detect_format(path))
+        old_df = read_result(path, fmt=fmt)
+        # 原结果以内存映射读取，先写到临时路径再替换，避免覆盖仍在映射中的文件
+        path = Path(path)
+        tmp = path.with_name(f'{path.stem}.tmp{path.suffix}')
+        write_result(pd.concat([old_df, new_df[old_df.columns]], ignore_index=True), tmp, fmt=fmt,
+                     partition_by=partition_by)
+        del old_df
+        replace_path(tmp, path)
+
+
+def read_result(path, fmt=None, columns=None):
+    """
+    读取预测结果，Parquet/Arrow 使用内存映射。
+
+    参数:
+        path (str): 结果文件或分区目录。
+        fmt (str): 'parquet'、'arrow' 或 'excel'，None 时按后缀判断。
+        columns (list): 只读取的列，None 时读取全部列。
+
+    返回:
+        DataFrame: 按日期、点名排序的预测结果，日期为 datetime64，点名为按点名顺序排列的分类类型。
+    """
+    fmt = fmt or ('parquet' if Path(path).is_dir() else detect_format(path))
+    if fmt == 'excel':
+        df = pd.read_excel(path, usecols=columns)
+    elif fmt == 'arrow':
+        pa = _import_pyarrow()
+        with pa.memory_map(str(path), 'r') as source:
+            table = pa.ipc.open_file(source).read_all()
+        df = (table.select(columns) if columns else table).to_pandas(date_as_object=False)
+    elif fmt == 'parquet':
+        pa = _import_pyarrow()
+        df = pa.parquet.read_table(path, columns=columns, memory_map=True).to_pandas(date_as_object=False)
+    else:
+        raise ValueError(f"不支持的输出格式: {fmt}，可选 {FORMATS}")
+
+    if '点名' in df.columns:
+        names = df['点名'].astype(str)
+        df['点名'] = pd.Categorical(names, categories=sorted(names.unique(), key=point_sort_key))
+    if '日期' in df.columns:
+        df['日期'] = as_dates(df['日期'])
+        # 分区读取时各分区按目录顺序拼接，这里恢复 日期/点名 顺序
+        if Path(path).is_dir() and '点名' in df.columns:
+            order = np.lexsort((df['点名'].cat.codes.to_numpy(), df['日期'].to_numpy()))
+            df = df.iloc[order].reset_index(drop=True)
+    # 预测结果按 COLUMNS_ORDER 排列，其它结果（如集合统计）的列保持原顺序
+    return df[[column for column in COLUMNS_ORDER if column in df.columns]
+              + [column for column in df.columns if column not in COLUMNS_ORDER]]
+